@@ -1,4 +1,20 @@
 '''Module for testing Daisy'''
 #pylint: disable=import-error, no-name-in-module
+import importlib
+
 from daisypy.test._version import version
-from daisypy.test.compare_dlf_files import *
+
+# Public functions and classes and the modules defining them. The modules are imported on first
+# access, so programs that only run daisy do not pay for importing pandas and pint
+_lazy_functions = {
+    'compare_dlf_files' : 'daisypy.test.compare_dlf_files',
+    'DlfComparator' : 'daisypy.test.compare_dlf_files',
+}
+
+def __getattr__(name):
+    if name in _lazy_functions:
+        return getattr(importlib.import_module(_lazy_functions[name]), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_functions))
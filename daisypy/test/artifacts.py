@@ -0,0 +1,128 @@
+'''Storing the files of failing comparisons
+
+When a file is not identical to its reference, both are stored in the output directory as
+error_<name> and ref_<name>. Copying large dlf files for every failing file can take longer than
+comparing them, so the files can also be linked, compressed or reduced to the rows that differ.
+
+Policies
+  copy: Copy both files
+  link: Hard link both files. Falls back to copying if the output directory is on another file
+    system. A link shares its content with the original, so it must not be edited.
+  gzip: Compress both files while copying them and add .gz to the names
+  zstd: Compress both files while copying them and add .zst to the names. Requires the zstandard
+    package.
+  diff: For dlf files, store the header of each file and the body rows that differ. Rows are kept
+    in file order and are identified by their time columns. Other files are copied.
+'''
+import gzip
+import importlib
+import os
+import shutil
+from itertools import islice, zip_longest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.dlf_reader import HEADER_BODY_SEP
+
+__all__ = [
+    'artifact_policies',
+    'save_artifacts',
+]
+
+artifact_policies = ('copy', 'link', 'gzip', 'zstd', 'diff')
+
+# Size of the blocks read when streaming files
+_BLOCK_SIZE = 1 << 20
+
+def save_artifacts(ref_file_path, new_file_path, out_dir, name, policy='copy'):
+    '''Store a generated file and its reference in out_dir as error_<name> and ref_<name>
+
+    Parameters
+    ----------
+    ref_file_path, new_file_path: str
+      Paths to the reference and the generated file
+
+    out_dir: str
+      Existing directory to store the files in. Files from earlier runs are replaced.
+
+    name: str
+      Name of the file
+
+    policy: str
+      How the files are stored, one of artifact_policies
+
+    Returns
+    -------
+    (ref_path, error_path) with the paths of the stored files
+    '''
+    suffix = {'gzip' : '.gz', 'zstd' : '.zst'}.get(policy, '')
+    ref_path = os.path.join(out_dir, f'ref_{name}{suffix}')
+    error_path = os.path.join(out_dir, f'error_{name}{suffix}')
+    # A file from an earlier run can be a link to the reference, so it is never written through
+    for path in (ref_path, error_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if policy == 'diff' and name.endswith('.dlf'):
+        _save_differing_rows(ref_file_path, new_file_path, ref_path, error_path)
+        return ref_path, error_path
+    store = {
+        'link' : _link,
+        'gzip' : _gzip,
+        'zstd' : _zstd,
+    }.get(policy, shutil.copy)
+    store(ref_file_path, ref_path)
+    store(new_file_path, error_path)
+    return ref_path, error_path
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Another file system or no support for hard links
+        shutil.copy(src, dst)
+
+def _gzip(src, dst):
+    # The lowest level is several times faster than the default and compresses logs almost as well
+    with open(src, 'rb') as infile, gzip.open(dst, 'wb', compresslevel=1) as outfile:
+        shutil.copyfileobj(infile, outfile, _BLOCK_SIZE)
+
+def _zstd(src, dst):
+    zstandard = importlib.import_module('zstandard')
+    compressor = zstandard.ZstdCompressor(threads=-1)
+    with open(src, 'rb') as infile, open(dst, 'wb') as outfile:
+        compressor.copy_stream(infile, outfile, read_size=_BLOCK_SIZE, write_size=_BLOCK_SIZE)
+
+def _save_differing_rows(ref_src, new_src, ref_dst, new_dst):
+    '''Write the header of two dlf files and the rows of their bodies that differ as text'''
+    with open(ref_src, 'rb') as ref_in, open(new_src, 'rb') as new_in, \
+         open(ref_dst, 'wb') as ref_out, open(new_dst, 'wb') as new_out:
+        _copy_header(ref_in, ref_out)
+        _copy_header(new_in, new_out)
+        while True:
+            # Comparing blocks of lines is much faster than comparing each line, and most lines
+            # are usually equal
+            lines1 = ref_in.readlines(_BLOCK_SIZE)
+            if len(lines1) > 0:
+                lines2 = list(islice(new_in, len(lines1)))
+            else:
+                lines2 = new_in.readlines(_BLOCK_SIZE)
+                if len(lines2) == 0:
+                    break
+            if lines1 == lines2:
+                continue
+            for line1, line2 in zip_longest(lines1, lines2):
+                if line1 != line2:
+                    if line1 is not None:
+                        ref_out.write(line1)
+                    if line2 is not None:
+                        new_out.write(line2)
+
+def _copy_header(infile, outfile):
+    # The header ends with the separator followed by a line of column names and a line of units
+    separator = HEADER_BODY_SEP.encode()
+    for line in infile:
+        outfile.write(line)
+        if line.startswith(separator):
+            outfile.writelines(islice(infile, 2))
+            return
@@ -0,0 +1 @@
+'''Benchmarks for the daisy test programs and comparison functions'''
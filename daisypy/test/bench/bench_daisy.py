@@ -0,0 +1,25 @@
+'''Program for running benchmarks of the daisy test programs'''
+import argparse
+import sys
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench import comparators, log, startup
+
+# Benchmark names mapping to modules defining add_arguments(parser) and run(args)
+benchmarks = {
+    'startup' : startup,
+    'log' : log,
+    'compare' : comparators,
+}
+
+def main():
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(description='Benchmark the daisy test programs')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    for name, module in benchmarks.items():
+        module.add_arguments(subparsers.add_parser(name, help=module.__doc__.split('\n')[0]))
+    args = parser.parse_args()
+    return benchmarks[args.benchmark].run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
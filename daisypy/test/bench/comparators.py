@@ -0,0 +1,170 @@
+'''Benchmark the comparison functions on synthetic Daisy output
+
+Each comparison function is timed on a pair of synthetic files. The dlf comparison is also split
+into phases: parsing, header and unit comparison, SML lookup and body comparison. Peak memory is the
+peak of memory allocations traced by tracemalloc during the measurement.
+'''
+import os
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.io.dlf import read_dlf
+from daisypy.test.bench.synthetic import write_dlf, write_daisy_log, write_gnuplot, write_txt
+from daisypy.test.compare_dlf_files import (
+    compare_dlf_files, _compare_headers, _compare_units, _compare_bodies, _sml_thresholds,
+    default_header_lines_to_skip
+)
+from daisypy.test.compare_log_files import compare_log_files
+from daisypy.test.compare_gnuplot_files import compare_gnuplot_files
+from daisypy.test.compare_txt_files import compare_txt_files
+from daisypy.test.result import ComparisonResult
+from daisypy.test.sml import load_smallest_meaningful_level, _load_smallest_meaningful_level
+from daisypy.test.units import get_daisy_ureg, dlf_unit_to_pint_unit, conversion_factor
+
+__all__ = [
+    'bench_comparators',
+    'measure',
+]
+
+def add_arguments(parser):
+    '''Add arguments for the comparator benchmark to parser'''
+    parser.add_argument('--rows', type=int, default=100_000, help='Rows in the dlf files')
+    parser.add_argument('--columns', type=int, default=20, help='Value columns in the dlf files')
+    parser.add_argument('--depth-columns', type=int, default=0,
+                        help='Depth columns ("M @ <depth>") in the dlf files')
+    parser.add_argument('--component', type=str, default='Soil chemical',
+                        help='Component of the dlf files. Determines column names, units and SMLs')
+    parser.add_argument('--chemical', type=str, default=None, help='Chemical of the dlf files')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Also benchmark chunked dlf comparison with this chunk size')
+    parser.add_argument('--log-lines', type=int, default=100_000, help='Lines in the log files')
+    parser.add_argument('--gnuplot-blocks', type=int, default=10,
+                        help='Data blocks in the gnuplot files')
+    parser.add_argument('--gnuplot-rows', type=int, default=10_000,
+                        help='Rows in each gnuplot data block')
+    parser.add_argument('--txt-lines', type=int, default=100_000, help='Lines in the txt files')
+    parser.add_argument('--change-every', type=int, default=1000,
+                        help='Change a value in every change-every row/line of the second file')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to repeat each measurement. The fastest is reported')
+
+def run(args):
+    '''Run the comparator benchmark and print the results'''
+    results = bench_comparators(args)
+    print(f'{"comparator":<28} {"phase":<20} {"time [s]":>10} {"peak [MiB]":>11}')
+    for comparator, phase, seconds, peak in results:
+        print(f'{comparator:<28} {phase:<20} {seconds:>10.4f} {peak / 2**20:>11.1f}')
+    return 0
+
+def measure(function, repeat=1):
+    '''Measure the run time and peak memory of calling function
+
+    Parameters
+    ----------
+    function: callable
+      Function taking no arguments
+
+    repeat: int
+      Number of calls. The fastest call is reported.
+
+    Returns
+    -------
+    (result of the last call, seconds, peak memory in bytes)
+    '''
+    best = float('inf')
+    peak = 0
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return result, best, peak
+
+def bench_comparators(args):
+    '''Write synthetic files and measure the comparison functions
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+      Arguments as defined in add_arguments
+
+    Returns
+    -------
+    list of (comparator, phase, seconds, peak memory in bytes)
+    '''
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir, warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        paths = {}
+        for seed in (0, 1):
+            paths[('.dlf', seed)] = os.path.join(tmpdir, f'{seed}.dlf')
+            write_dlf(paths[('.dlf', seed)], args.rows, args.columns, args.depth_columns,
+                      args.component, args.chemical, seed, args.change_every)
+            paths[('.log', seed)] = os.path.join(tmpdir, f'{seed}.log')
+            write_daisy_log(paths[('.log', seed)], args.log_lines, seed, args.change_every)
+            paths[('.gnuplot', seed)] = os.path.join(tmpdir, f'{seed}.gnuplot')
+            write_gnuplot(paths[('.gnuplot', seed)], args.gnuplot_blocks, args.gnuplot_rows,
+                          seed, args.change_every)
+            paths[('.txt', seed)] = os.path.join(tmpdir, f'{seed}.txt')
+            write_txt(paths[('.txt', seed)], args.txt_lines, seed, args.change_every)
+
+        dlf1, dlf2 = paths[('.dlf', 0)], paths[('.dlf', 1)]
+        results += _bench_dlf_phases(dlf1, dlf2, args.repeat)
+        comparators = [
+            ('compare_dlf_files', '.dlf', compare_dlf_files, {}),
+            ('compare_log_files', '.log', compare_log_files, {}),
+            ('compare_gnuplot_files', '.gnuplot', compare_gnuplot_files, {}),
+            ('compare_txt_files', '.txt', compare_txt_files, {}),
+        ]
+        if args.chunk_size is not None:
+            comparators.insert(1, ('compare_dlf_files chunked', '.dlf', compare_dlf_files,
+                                   {'chunk_size' : args.chunk_size}))
+        for name, file_type, function, kwargs in comparators:
+            path1, path2 = paths[(file_type, 0)], paths[(file_type, 1)]
+            _, seconds, peak = measure(
+                lambda f=function, p1=path1, p2=path2, kw=kwargs: f(p1, p2, **kw), args.repeat
+            )
+            results.append((name, 'total', seconds, peak))
+    return results
+
+def _bench_dlf_phases(path1, path2, repeat):
+    results = []
+    (dlf1, dlf2), seconds, peak = measure(lambda: (read_dlf(path1), read_dlf(path2)), repeat)
+    results.append(('compare_dlf_files', 'parse', seconds, peak))
+
+    _, seconds, peak = measure(
+        lambda: (_compare_headers(dlf1.header, dlf2.header, default_header_lines_to_skip),
+                 _compare_units(dlf1.units, dlf2.units)),
+        repeat
+    )
+    results.append(('compare_dlf_files', 'header/units', seconds, peak))
+
+    def sml_lookup():
+        # Clear caches so we measure the cost of a first lookup in a process
+        _load_smallest_meaningful_level.cache_clear()
+        dlf_unit_to_pint_unit.cache_clear()
+        conversion_factor.cache_clear()
+        sml_map = load_smallest_meaningful_level(dlf1.header, get_daisy_ureg())
+        return _sml_thresholds(list(dlf1.body.columns), dlf1.units, sml_map, 1e-8)
+    _, seconds, peak = measure(sml_lookup, repeat)
+    results.append(('compare_dlf_files', 'SML lookup', seconds, peak))
+
+    _, seconds, peak = measure(
+        lambda: _compare_bodies(dlf1.body, dlf2.body, dlf1.units, dlf1.header, 1e-8, 0.001,
+                                False, ComparisonResult()),
+        repeat
+    )
+    results.append(('compare_dlf_files', 'body', seconds, peak))
+    return results
@@ -0,0 +1,134 @@
+'''Benchmark compare_log_files on a synthetic daisy.log
+
+The benchmark compares against a copy of the original line comparison, which recompiled patterns and
+parsed each differing line several times, to show the speedup of the current implementation.
+'''
+import os
+import re
+import tempfile
+import time
+from itertools import zip_longest, dropwhile
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.compare_log_files import (
+    compare_log_files, default_lines_to_skip, DEFAULT_STRIP_TOKENS
+)
+from daisypy.test.bench.synthetic import write_daisy_log
+
+__all__ = [
+    'bench_log',
+]
+
+def add_arguments(parser):
+    '''Add arguments for the log benchmark to parser'''
+    parser.add_argument('--lines', type=int, default=1_000_000,
+                        help='Number of lines in the synthetic log')
+    parser.add_argument('--change-every', type=int, default=100,
+                        help='''Change the numbers in every change-every group of six lines of the
+                        second log''')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='Do not run the original implementation for comparison')
+
+def run(args):
+    '''Run the log benchmark and print the results'''
+    results = bench_log(args.lines, args.change_every, not args.no_baseline)
+    for name, seconds, counts in results:
+        print(f'{name:<20} {seconds:>8.3f} s', 'errors, not similar, not identical:', *counts)
+    if len(results) == 2:
+        print(f'Speedup: {results[1][1] / results[0][1]:.2f}x')
+    return 0
+
+def bench_log(lines, change_every=100, baseline=True):
+    '''Time compare_log_files on two synthetic logs
+
+    Parameters
+    ----------
+    lines: int
+      Number of lines in each log
+
+    change_every: int
+      See bench.synthetic.write_daisy_log
+
+    baseline: bool
+      If True, also time the original implementation
+
+    Returns
+    -------
+    list of (name, seconds, (number of errors, not similar, not identical))
+    '''
+    functions = [('compare_log_files', compare_log_files)]
+    if baseline:
+        functions.append(('baseline', _baseline_compare_log_files))
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path1 = os.path.join(tmpdir, 'daisy1.log')
+        path2 = os.path.join(tmpdir, 'daisy2.log')
+        write_daisy_log(path1, lines, seed=0, change_every=change_every)
+        write_daisy_log(path2, lines, seed=1, change_every=change_every)
+        for name, function in functions:
+            start = time.perf_counter()
+            result = function(path1, path2)
+            seconds = time.perf_counter() - start
+            results.append((name, seconds, tuple(len(r) for r in result)))
+    return results
+
+def _baseline_compare_log_files(path1, path2,
+                                skip_lines=default_lines_to_skip,
+                                strip_tokens=DEFAULT_STRIP_TOKENS,
+                                abs_tol=1e-8,
+                                rel_tol=1e-2):
+    # pylint: disable=too-many-arguments, too-many-locals
+    def program_not_ready(s):
+        return not s.startswith("Storing 'daisy.log'")
+    def keep(s):
+        s = s.strip(strip_tokens)
+        return not any((s.startswith(token) for token in skip_lines))
+    errors = []
+    not_identical = []
+    not_similar = []
+    with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
+        log1 = filter(keep, dropwhile(program_not_ready, file1))
+        log2 = filter(keep, dropwhile(program_not_ready, file2))
+        for line1, line2 in zip_longest(log1, log2, fillvalue=''):
+            err, not_sim, not_id = _baseline_compare_lines(line1, line2, abs_tol, rel_tol)
+            errors += err
+            not_similar += not_sim
+            not_identical += not_id
+    return errors, not_similar, not_identical
+
+def _baseline_compare_lines(line1, line2, abs_tol, rel_tol):
+    # Frozen copy of the original implementation, so it duplicates parts of compare_log_files
+    # pylint: disable=duplicate-code
+    line1 = line1.strip()
+    line2 = line2.strip()
+    errors = []
+    not_identical = []
+    not_similar = []
+    good = True
+    if line1 != line2 and not all((c in {'-', '='} for c in line1 + line2)):
+        not_identical.append(f'"{line1}" | "{line2}"')
+        num_pattern = re.compile(r'-?\d*\.?\d+(?:[eE][+-]?\d+)?')
+        numbers1 = re.findall(num_pattern, line1)
+        numbers2 = re.findall(num_pattern, line2)
+        if len(numbers1) != len(numbers2):
+            not_similar.append(f'"{line1}" | "{line2}"')
+            good = False
+        else:
+            for n1, n2 in zip(numbers1, numbers2):
+                x, y = float(n1), float(n2)
+                d = x - y
+                if abs(d) > abs_tol:
+                    if x == 0 or y == 0 or max(abs(d/x), abs(d/y)) > rel_tol:
+                        not_similar.append(f'"{x}" != "{y}" in\n\t{line1}\n\t{line2}')
+                        good = False
+        if good:
+            multi_space_pattern = re.compile(r"\s{2,}")
+            s1 = re.sub(num_pattern, '', line1).strip()
+            s1 = re.sub(multi_space_pattern, " ", s1)
+            s1 = re.sub("-nan", "nan", s1)
+            s2 = re.sub(num_pattern, '', line2).strip()
+            s2 = re.sub(multi_space_pattern, " ", s2)
+            s2 = re.sub("-nan", "nan", s2)
+            if s1 != s2:
+                not_similar.append(f'"{s1}" | "{s2}"')
+    return errors, not_similar, not_identical
@@ -0,0 +1,94 @@
+'''Benchmark startup time of the test programs
+
+check_daisy and test_daisy are run thousands of times in CI, so their startup time matters. Heavy
+modules (pandas, pint and the unit registry) are only imported when a file is compared. The budgets
+below are the median times we allow.
+'''
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+__all__ = [
+    'import_budgets',
+    'command_budgets',
+    'bench_startup',
+]
+
+# Seconds allowed for importing a module, excluding interpreter startup
+import_budgets = {
+    'daisypy.test' : 0.1,
+    'daisypy.test.check_daisy' : 0.1,
+    'daisypy.test.test_daisy' : 0.1,
+    'daisypy.test.client' : 0.1,
+}
+
+# Seconds allowed for running a command, including interpreter startup
+command_budgets = {
+    'check_daisy --help' : 0.3,
+    'check_daisy' : 0.3,
+    'test_daisy --help' : 0.3,
+}
+
+def add_arguments(parser):
+    '''Add arguments for the startup benchmark to parser'''
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times to repeat each measurement. The median is reported')
+
+def run(args):
+    '''Run the startup benchmark and print the results. Returns 1 if a budget is exceeded.'''
+    status = 0
+    print(f'{"name":<40} {"median [s]":>10} {"budget [s]":>10}')
+    for name, median, budget in bench_startup(args.repeat):
+        exceeded = median > budget
+        print(f'{name:<40} {median:>10.3f} {budget:>10.3f}', 'EXCEEDED' if exceeded else '')
+        status |= int(exceeded)
+    return status
+
+def bench_startup(repeat=5):
+    '''Measure import time of the modules in import_budgets and the run time of the commands in
+    command_budgets. Each measurement is done in a fresh interpreter.
+
+    Parameters
+    ----------
+    repeat: int
+      Number of times to repeat each measurement
+
+    Returns
+    -------
+    list of (name, median time in seconds, budget in seconds)
+    '''
+    results = []
+    for module, budget in import_budgets.items():
+        code = ('import time; t = time.perf_counter(); '
+                f'import {module}; print(time.perf_counter() - t)')
+        times = [
+            float(subprocess.run([sys.executable, '-c', code], check=True, capture_output=True,
+                                 text=True).stdout)
+            for _ in range(repeat)
+        ]
+        results.append((f'import {module}', statistics.median(times), budget))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # A no-op stand-in for the daisy binary, so we only measure our own overhead
+        daisy_binary = shutil.which('true') or sys.executable
+        program = os.path.join(tmpdir, 'empty.dai')
+        with open(program, 'w', encoding='utf-8'):
+            pass
+        commands = {
+            'check_daisy --help' : ['daisypy.test.check_daisy', '--help'],
+            'check_daisy' : ['daisypy.test.check_daisy', daisy_binary, program],
+            'test_daisy --help' : ['daisypy.test.test_daisy', '--help'],
+        }
+        for name, budget in command_budgets.items():
+            times = []
+            for _ in range(repeat):
+                code = ('import subprocess, sys, time; t = time.perf_counter(); '
+                        f'subprocess.run([sys.executable, "-m", *{commands[name]!r}], '
+                        'capture_output=True); print(time.perf_counter() - t)')
+                times.append(float(subprocess.run([sys.executable, '-c', code], check=True,
+                                                  capture_output=True, text=True).stdout))
+            results.append((name, statistics.median(times), budget))
+    return results
@@ -0,0 +1,213 @@
+'''Synthetic Daisy output for benchmarks
+
+Files written with seed 0 are references. Files written with another seed differ from the
+reference in the same way as output from a new Daisy version, i.e. run specific values such as
+times differ and a few values change slightly or a lot depending on change_every.
+'''
+import os
+import random
+import tomllib
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.sml import sml_paths
+from daisypy.test.dlf_reader import HEADER_BODY_SEP
+
+__all__ = [
+    'write_dlf',
+    'write_daisy_log',
+    'write_gnuplot',
+    'write_txt',
+]
+
+def write_dlf(path, rows, columns=20, depth_columns=0, component='Soil chemical', chemical=None,
+              seed=0, change_every=1000):
+    '''Write a synthetic dlf file with hourly values.
+
+    Column names and units are taken from the SML definitions of the component. Depth columns are
+    named "M @ <depth>" and use the "M @" SML definition if the component has one, e.g. for
+    component "Chemical Content" and chemical "colloid".
+
+    Parameters
+    ----------
+    path: str
+      Path to write the dlf file to
+
+    rows: int
+      Number of rows
+
+    columns: int
+      Number of columns that are not time or depth columns. If there are more columns than SML
+      definitions, the remaining columns have no SML.
+
+    depth_columns: int
+      Number of depth columns
+
+    component, chemical: str
+      Component and chemical written to the header. chemical is only written if not None.
+
+    seed: int
+      Files written with different seeds differ in run specific header values and in the values
+      controlled by change_every
+
+    change_every: int
+      If > 0 and seed is not 0, every change_every row has a value that is changed by less than the
+      identity threshold, and every 10 * change_every row has a value that is not similar.
+    '''
+    # pylint: disable=too-many-arguments, too-many-locals
+    sml = _load_sml_definition(component, chemical)
+    scalar = [(k, v.split(maxsplit=1)[1]) for k, v in sml.items() if not k.endswith('@')]
+    names, units = [], []
+    for i in range(columns):
+        if i < len(scalar):
+            names.append(scalar[i][0])
+            units.append(scalar[i][1])
+        else:
+            names.append(f'Value-{i}')
+            units.append('kg/ha')
+    depth_unit = sml['M @'].split(maxsplit=1)[1] if 'M @' in sml else 'g/cm^3'
+    for i in range(depth_columns):
+        names.append(f'M @ -{5 * i}')
+        units.append(depth_unit)
+
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write(f'dlf-0.0 -- {component}\n\n')
+        outfile.write(f'VERSION: 7.0.{seed}\n')
+        outfile.write(f'RUN: {rng.randrange(100000)}\n')
+        outfile.write(f'SIMFILE: /tmp/run-{seed}/test.dai\n')
+        if chemical is not None:
+            outfile.write(f'CHEMICAL: {chemical}\n')
+        outfile.write(f'\n{HEADER_BODY_SEP}\n')
+        outfile.write('\t'.join(['year', 'month', 'mday', 'hour'] + names) + '\n')
+        outfile.write('\t'.join(['', '', '', ''] + units) + '\n')
+        n = len(names)
+        for row in range(rows):
+            day = row // 24
+            time = [2000 + day // 336, 1 + (day // 28) % 12, 1 + day % 28, row % 24]
+            values = [((row * 7919 + col * 104729) % 100003) / 1000.0 for col in range(n)]
+            if change_every > 0 and seed != 0 and row % change_every == 0:
+                col = row % n
+                values[col] += 1e-7 if row % (10 * change_every) else 1e3
+            outfile.write('\t'.join(map(str, time + values)) + '\n')
+
+def _load_sml_definition(component, chemical):
+    names = [component] if chemical is None else [f'{component} {chemical}', component]
+    for name in names:
+        if name in sml_paths:
+            path = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                sml_paths[name])
+            with open(path, 'rb') as infile:
+                return tomllib.load(infile)
+    return {}
+
+def write_daisy_log(path, lines, seed=0, change_every=100):
+    '''Write a synthetic daisy.log with lines similar to those written by Daisy.
+
+    Parameters
+    ----------
+    path: str
+      Path to write the log to
+
+    lines: int
+      Number of lines after the "Storing 'daisy.log'" line
+
+    seed: int
+      Seed for the values that differ between runs, e.g. times and directories. Files written with
+      different seeds are similar apart from the changes controlled by change_every
+
+    change_every: int
+      The lines are written in groups of six, three of which have numbers. If > 0, the numbers of
+      every change_every group are slightly different when seed is not 0, and the numbers of every
+      100 * change_every group are not similar.
+    '''
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write('Daisy crop/soil simulation version 7.0.7\n')
+        outfile.write(f"Storing 'daisy.log' in '/tmp/run-{seed}'\n")
+        for i in range(lines):
+            group, kind = divmod(i, 6)
+            value = ((i * 7919) % 10007) / 7.0
+            # Only change values that are written, i.e. of kind 1, 2 and 5
+            if change_every > 0 and seed != 0 and group % change_every == 0:
+                value *= 1.0001 if group % (100 * change_every) else 1.5
+            if kind == 0:
+                outfile.write(f'Time: {rng.randrange(1000)}s\n')
+            elif kind == 1:
+                outfile.write(f'  Fertilizer {value} kg N/ha applied at depth {-i % 50} cm\n')
+            elif kind == 2:
+                outfile.write(f'Water balance: input {value:.4f} mm, output {value:.4f} mm, '
+                              f'error -nan\n')
+            elif kind == 3:
+                outfile.write('====================================\n')
+            elif kind == 4:
+                outfile.write(f'*** In directory /tmp/run-{seed}\n')
+            else:
+                outfile.write(f'Harvest of spring barley: {value} kg DM/ha  {value / 40} kg N/ha\n')
+
+def write_gnuplot(path, blocks, rows, seed=0, change_every=100):
+    '''Write a synthetic gnuplot file with inline data blocks, like the files written by Daisy.
+
+    Parameters
+    ----------
+    path: str
+      Path to write the gnuplot file to
+
+    blocks: int
+      Number of data blocks. Every other block is a named block and the rest are inline plot data.
+
+    rows: int
+      Number of rows in each data block
+
+    seed: int
+      Files written with different seeds differ in the output file name and the values controlled
+      by change_every
+
+    change_every: int
+      If > 0 and seed is not 0, every change_every data row is formatted differently and every
+      100 * change_every data row has a value that is not similar.
+    '''
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write('set terminal pngcairo\n')
+        outfile.write(f"set output 'plot-{seed}.png'\n")
+        outfile.write('set xdata time\nset timefmt "%Y-%m-%dT%H"\n')
+        for block in range(blocks):
+            named = block % 2 == 0
+            if named:
+                outfile.write(f'$data{block} << EOD\n')
+            else:
+                outfile.write(f"plot '-' using 1:2 title \"block {block}\" with lines\n")
+            for row in range(rows):
+                value = ((row * 7919 + block * 104729) % 100003) / 1000.0
+                if change_every > 0 and seed != 0 and row % change_every == 0:
+                    if row % (100 * change_every):
+                        outfile.write(f'{row} {value:.6e}\n')
+                        continue
+                    value += 1e3
+                outfile.write(f'{row} {value}\n')
+            if named:
+                outfile.write('EOD\n')
+                outfile.write(f"plot $data{block} using 1:2 title \"block {block}\" with lines\n")
+            else:
+                outfile.write('e\n')
+
+def write_txt(path, lines, seed=0, change_every=100):
+    '''Write a synthetic text file with lines of numbers.
+
+    Parameters
+    ----------
+    path: str
+      Path to write the text file to
+
+    lines: int
+      Number of lines
+
+    seed: int
+      Files written with different seeds differ in the values controlled by change_every
+
+    change_every: int
+      If > 0 and seed is not 0, every change_every line is different.
+    '''
+    with open(path, 'w', encoding='utf-8') as outfile:
+        for i in range(lines):
+            changed = change_every > 0 and seed != 0 and i % change_every == 0
+            outfile.write(f'{i}\t{(i * 7919) % 100003 + changed}\n')
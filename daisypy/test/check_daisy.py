@@ -1,8 +1,8 @@
 '''Program for running daisy tests'''
 import argparse
-import subprocess
+import importlib
+import os
 import sys
-import tempfile
 
 def main():
     # pylint: disable=missing-function-docstring, duplicate-code
@@ -10,18 +10,74 @@ def main():
         description='Run daisy programs and check that they dont fail'
     )
     parser.add_argument('daisy_binary', type=str, help='Name of or path to the daisy binary')
-    parser.add_argument('program', type=str, help='Path to the .dai file to run')
+    parser.add_argument('programs', type=str, nargs='+', help='''Paths to the .dai files to run.
+    Directories are searched recursively for .dai files''')
     parser.add_argument('--path', type=str, help='Add to path when running daisy', default='.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of programs to run in parallel')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Stop daisy if a program runs for more than this many seconds')
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help='Limit the memory of each daisy process to this many bytes')
+    parser.add_argument('--durations', type=str, default=None, help='''Record the duration of each
+    program in this json file and start the programs that took longest in earlier runs first''')
     args = parser.parse_args()
 
+    programs = collect_programs(args.programs)
+    if len(programs) == 0:
+        print('ERROR: No programs found', file=sys.stderr)
+        return 1
+    # asyncio is slow to import, so the scheduler is imported when it is used
+    scheduler = importlib.import_module('daisypy.test.scheduler')
+    history = None if args.durations is None else scheduler.DurationHistory(args.durations)
+    # The output of a single program is shown as it is written, after the command line. The output
+    # of several programs is shown with their command line when they finish.
+    capture_output = len(programs) > 1
+    results = scheduler.run_programs(args.daisy_binary, programs, args.path, args.jobs,
+                                     args.timeout, args.memory_limit, history,
+                                     on_done=lambda result: print_run(result, capture_output),
+                                     capture_output=capture_output,
+                                     on_start=None if capture_output else print_command)
+    if history is not None:
+        history.save()
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        daisy_args = [args.daisy_binary, '-q', '-d', tmpdir, '-D', args.path, args.program]
-        print(' '.join(daisy_args))
-        result = subprocess.run(daisy_args, check=False)
-        if result.returncode != 0:
-            print('ERROR: Daisy execution failed', file=sys.stderr)
-        return result.returncode
+    failed = [result for result in results if result.returncode != 0]
+    if len(programs) > 1:
+        print(f'{len(programs) - len(failed)} of {len(programs)} programs succeeded')
+        if len(failed) > 0:
+            print('Failed:', *(result.program for result in failed), sep='\n\t')
+    if len(failed) > 0:
+        return 1 if failed[0].timed_out else failed[0].returncode
+    return 0
+
+def collect_programs(paths):
+    '''Expand directories in paths to the .dai files below them, in sorted order'''
+    programs = []
+    for path in paths:
+        if not os.path.isdir(path):
+            programs.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            programs += [os.path.join(root, name) for name in sorted(files)
+                         if name.endswith('.dai')]
+    return programs
+
+def print_command(_program, daisy_args):
+    '''Print the command line used to run a program'''
+    print(' '.join(daisy_args), flush=True)
+
+def print_run(result, print_output):
+    '''Print the outcome of a daisypy.test.scheduler.DaisyRun. If print_output is True, the command
+    line and, for failed runs, the captured output from daisy are also printed.'''
+    if print_output:
+        print(' '.join(result.args), f'({result.seconds:.1f} s)', flush=True)
+    if result.timed_out:
+        print(f'ERROR: Daisy was stopped after {result.seconds:.1f} s', file=sys.stderr)
+    elif result.returncode != 0:
+        print('ERROR: Daisy execution failed', file=sys.stderr)
+    if print_output and result.returncode != 0 and not result.timed_out:
+        print(result.stdout, result.stderr, sep='', end='', file=sys.stderr, flush=True)
 
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,75 @@
+'''Client for the comparison server in daisypy.test.server
+
+Only uses the standard library, so comparing through the server does not import pandas or pint.
+'''
+import json
+import os
+import socket
+import warnings
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ColumnStats, ComparisonResult, MessageList
+
+__all__ = [
+    'compare_remote',
+    'request',
+]
+
+def compare_remote(socket_path, file_type, path1, path2, **options):
+    '''Compare two files on the server listening on socket_path
+
+    Warnings given by the server during the comparison are given again in the calling process.
+
+    Parameters
+    ----------
+    socket_path: str
+      Path to the Unix socket of the server
+
+    file_type: str
+      File extension, e.g. '.dlf'
+
+    path1, path2: str
+      Paths to the files. Relative paths are made absolute before they are sent.
+
+    options: dict
+      Keyword arguments to the comparison function. Values must be json serializable.
+
+    Returns
+    -------
+    daisypy.test.result.ComparisonResult
+    '''
+    response = request(socket_path, {
+        'op' : 'compare',
+        'file_type' : file_type,
+        'path1' : os.path.abspath(path1),
+        'path2' : os.path.abspath(path2),
+        'options' : options,
+    })
+    for message in response['warnings']:
+        warnings.warn(message)
+    result = ComparisonResult()
+    result.errors, result.not_similar, result.not_identical = (
+        MessageList.from_messages(response['result'][kind]['messages'],
+                                  response['result'][kind]['count'])
+        for kind in ('errors', 'not_similar', 'not_identical')
+    )
+    result.column_stats = [ColumnStats(*stats) for stats in response['column_stats']]
+    return result
+
+def request(socket_path, message):
+    '''Send a request to the server and return the response
+
+    Raises
+    ------
+    OSError if the server cannot be reached. RuntimeError if the server could not handle the
+    request.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as infile:
+            response = json.loads(infile.readline())
+    if not response['ok']:
+        raise RuntimeError(response['error'])
+    return response
@@ -1,27 +1,52 @@
 '''Compare two dlf files using smallest meaningfull levels'''
+import fnmatch
 import warnings
+from collections import deque
+from itertools import zip_longest
 
+import numpy as np
+import pandas as pd
 from pint.errors import UndefinedUnitError, DimensionalityError
 
-from daisypy.io.dlf import read_dlf
 #pylint: disable=import-error, no-name-in-module
-from daisypy.test.units import daisy_ureg, dlf_unit_to_pint_unit
-from daisypy.test.sml import load_smallest_meaningful_level
+from daisypy.test.units import get_daisy_ureg, dlf_unit_to_pint_unit
+from daisypy.test.sml import load_smallest_meaningful_level, sml_conversion_factor
+from daisypy.test.dlf_reader import read_dlf_body, read_dlf_header, default_header_lines_to_skip
+from daisypy.test.dlf_cache import read_dlf_cached
+from daisypy.test.result import ColumnStats, ComparisonResult
 
 __all__ = [
-    'compare_dlf_files'
+    'compare_dlf_files',
+    'DlfComparator',
+    'IncrementalDlfComparison',
+    'time_columns',
 ]
 
-default_header_lines_to_skip = frozenset(
-    ('VERSION', 'RUN', 'SIMFILE', 'SIM', 'dlf-def-location', 'info')
-)
+# Columns identifying the time of a row, from most to least significant, and the number of values
+# each can take. Rows are aligned on the ones present in both files.
+time_columns = {
+    'year' : None,
+    'month' : 13,
+    'mday' : 32,
+    'hour' : 24,
+    'minute' : 60,
+    'second' : 60,
+    'microsecond' : 1000000,
+}
 
 def compare_dlf_files(path1, path2,
                       skip_header=default_header_lines_to_skip,
                       precision=1e-8,
-                      sml_identity_threshold=0.001):
-    '''Compare two dlf files and return a triple of errors, parts that are not "similar" and parts
-    that are not "identical".
+                      sml_identity_threshold=0.001,
+                      chunk_size=None,
+                      max_messages=None,
+                      verdict_only=False,
+                      align_time=False,
+                      columns=None,
+                      sml_only=False,
+                      locate_rows=False):
+    '''Compare two dlf files and return errors, parts that are not "similar" and parts that are not
+    "identical".
 
     Identity is defined as:
     Header elements and units are identical if they compare equal using standard python equality
@@ -52,36 +77,431 @@ def compare_dlf_files(path1, path2,
     sml_identity_threshold: float
       Consider two values identical if their difference is less than sml_identity_threshold * sml
 
+    chunk_size: int
+      If not None, read and compare the bodies in chunks of this many rows, so memory use is bounded
+      by the chunk size instead of the file size. The result is the same as when comparing the full
+      bodies.
+
+    max_messages: int
+      Keep at most this many messages of each kind. The columns with the largest differences
+      relative to their SML are kept. None means no limit.
+
+    verdict_only: bool
+      If True, only report the first column that is not similar and do not report columns that are
+      only not identical. With chunk_size, reading stops at the first chunk that is not similar.
+
+    align_time: bool
+      If True, match rows on the time columns instead of on their position, so files covering
+      different periods can be compared. Rows whose time is only in one file are reported as not
+      similar ranges, and the rows in both files are compared as usual. Rows must be ordered by
+      time. chunk_size is ignored.
+
+    columns: list of str
+      If not None, only compare columns matching one of these names or fnmatch patterns, e.g.
+      'M @ *'. Other columns are not parsed.
+
+    sml_only: bool
+      If True, only compare columns with an SML definition. Other columns are not parsed.
+
+    locate_rows: bool
+      If True, also find the first row where each column is not similar and the number of such
+      rows, and store them in the column statistics of the result. All rows are checked in the
+      same pass that finds the largest differences.
+
     Returns
     -------
-    (errors, not_similar, not_identical)
-      errors: list of str
-      not_similar: list of str
-      not_identical: list of str
+    daisypy.test.result.ComparisonResult, which unpacks to (errors, not_similar, not_identical)
 
     Notes
     -----
     Units are only compared if headers are similar.
-    Bodies are only compared if units are similar.
+    Bodies are only compared if units are similar, and are not read otherwise.
+    path1 is read through the cache enabled with daisypy.test.dlf_cache.set_dlf_cache_dir, so it
+    should be the reference file. The cache is not used when chunk_size is given.
+    '''
+    # pylint: disable=too-many-arguments, too-many-locals
+    result = ComparisonResult(max_messages)
+    # Headers and units are compared before reading the bodies, which are not needed if they differ
+    with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
+        headers = _check_headers(file1, file2, path1, skip_header, columns, sml_only, align_time,
+                                 result)
+        if headers is None:
+            return result
+        header1, names, units1, selected = headers
+        if chunk_size is not None and not align_time:
+            return _compare_bodies_chunked(file1, file2, header1, names, units1, selected,
+                                           precision, sml_identity_threshold, chunk_size,
+                                           verdict_only, locate_rows, result)
+        body2 = read_dlf_body(file2, names, selected)
+    body1 = read_dlf_cached(path1, selected).body
+
+    compare_bodies = _compare_aligned_bodies if align_time else _compare_bodies
+    compare_bodies(body1,
+                   body2,
+                   units1,
+                   header1,
+                   precision,
+                   sml_identity_threshold,
+                   verdict_only,
+                   result,
+                   locate_rows)
+    return result
+
+class DlfComparator:
+    '''Compare many pairs of dlf files with the same settings
+
+    SML definitions, unit conversions and the unit registry are shared between all comparisons in a
+    process, so only the first comparison of a component pays for loading them.
+
+    Parameters
+    ----------
+    skip_header, precision, sml_identity_threshold, chunk_size, max_messages, verdict_only,
+    align_time, columns, sml_only, locate_rows:
+      As for compare_dlf_files
     '''
-    dlf1 = read_dlf(path1)
-    dlf2 = read_dlf(path2)
+    def __init__(self,
+                 skip_header=default_header_lines_to_skip,
+                 precision=1e-8,
+                 sml_identity_threshold=0.001,
+                 chunk_size=None,
+                 max_messages=None,
+                 verdict_only=False,
+                 align_time=False,
+                 columns=None,
+                 sml_only=False,
+                 locate_rows=False):
+        # pylint: disable=too-many-arguments
+        self.options = {
+            'skip_header' : skip_header,
+            'precision' : precision,
+            'sml_identity_threshold' : sml_identity_threshold,
+            'chunk_size' : chunk_size,
+            'max_messages' : max_messages,
+            'verdict_only' : verdict_only,
+            'align_time' : align_time,
+            'columns' : columns,
+            'sml_only' : sml_only,
+            'locate_rows' : locate_rows,
+        }
+
+    def compare(self, path1, path2):
+        '''Compare two dlf files
+
+        Returns
+        -------
+        daisypy.test.result.ComparisonResult
+        '''
+        return compare_dlf_files(path1, path2, **self.options)
+
+    def compare_many(self, pairs, executor=None, max_pending=64):
+        '''Compare pairs of dlf files
+
+        Parameters
+        ----------
+        pairs: iterable of (path1, path2)
+          Files to compare. Can be a generator, it is consumed as results are produced.
+
+        executor: concurrent.futures.Executor
+          If not None, compare pairs on this executor. Otherwise compare them one at a time in the
+          calling thread.
+
+        max_pending: int
+          Maximum number of comparisons submitted to executor but not yet yielded
+
+        Yields
+        ------
+        (path1, path2, result) in the order of pairs. result is a
+        daisypy.test.result.ComparisonResult. Exceptions while comparing a pair are reported as
+        errors in its result.
+        '''
+        if executor is None:
+            for path1, path2 in pairs:
+                yield path1, path2, _compare_pair(self, path1, path2)
+            return
+        pending = deque()
+        try:
+            for path1, path2 in pairs:
+                pending.append((path1, path2, executor.submit(_compare_pair, self, path1, path2)))
+                if len(pending) >= max_pending:
+                    path1, path2, future = pending.popleft()
+                    yield path1, path2, future.result()
+            while len(pending) > 0:
+                path1, path2, future = pending.popleft()
+                yield path1, path2, future.result()
+        finally:
+            # If the caller stops early, do not run the remaining comparisons
+            for _, _, future in pending:
+                future.cancel()
+
+def _compare_pair(comparator, path1, path2):
+    try:
+        return comparator.compare(path1, path2)
+    except Exception as e: # pylint: disable=broad-exception-caught
+        result = ComparisonResult(comparator.options['max_messages'])
+        result.errors.append(f'Exception while comparing: {e}')
+        return result
 
-    diff_headers = _compare_headers(dlf1.header, dlf2.header, skip_header)
+def _select_columns(names, header, columns, sml_only, align_time):
+    '''Names of the columns to compare in file order, or None to compare all columns'''
+    if columns is None and not sml_only:
+        return None
+    selected = names
+    if columns is not None:
+        selected = [name for name in selected
+                    if name in columns or any(fnmatch.fnmatchcase(name, pattern)
+                                              for pattern in columns)]
+    if sml_only:
+        sml_map = load_smallest_meaningful_level(header, get_daisy_ureg())
+        selected = [name for name in selected if _has_sml(name, sml_map)]
+    if align_time:
+        # Rows are matched on the time columns
+        selected = [name for name in names if name in selected or name in time_columns]
+    return selected
+
+def _has_sml(name, sml_map):
+    # Depth logged values, e.g. M @ -100, use the SML of M @
+    parts = name.split('@', maxsplit=1)
+    return name in sml_map or (len(parts) == 2 and parts[0] + '@' in sml_map)
+
+def _check_headers(file1, file2, path1, skip_header, columns, sml_only, align_time, result):
+    '''Read and compare the headers of two dlf files and select the columns to compare
+
+    Returns
+    -------
+    (header1, names, units1, selected) with the header, column names and units of the first file
+    and the result of _select_columns, or None if the bodies should not be compared. In that case
+    the reason is added to result, unless both files have no columns.
+    '''
+    # pylint: disable=too-many-arguments, too-many-locals
+    header1, names, units1 = read_dlf_header(file1)
+    header2, names2, units2 = read_dlf_header(file2)
+
+    diff_headers = _compare_headers(header1, header2, skip_header)
     if len(diff_headers) > 0:
-        return [], diff_headers, []
+        result.not_similar.extend(diff_headers)
+        return None
 
-    diff_units = _compare_units(dlf1.units, dlf2.units)
+    diff_units = _compare_units(units1, units2)
     if len(diff_units) > 0:
-        return [], diff_units, []
+        result.not_similar.extend(diff_units)
+        return None
 
+    # Both bodies are parsed with the names from the first file
+    diff_order = _compare_column_order(names, names2)
+    if diff_order is not None:
+        result.errors.append(diff_order)
+        return None
 
-    return _compare_bodies(dlf1.body,
-                           dlf2.body,
-                           dlf1.units,
-                           dlf1.header,
-                           precision,
-                           sml_identity_threshold)
+    if len(names) == 0:
+        # No body in either file
+        return None
+
+    selected = _select_columns(names, header1, columns, sml_only, align_time)
+    if selected is not None and len(selected) == 0:
+        # Usually a misspelled pattern, which must not pass silently
+        result.errors.append(f'No columns selected in {path1}')
+        return None
+    return header1, names, units1, selected
+
+def _compare_bodies_chunked(file1, file2, header1, names, units1, selected, precision,
+                            sml_identity_threshold, chunk_size, verdict_only, locate_rows, result):
+    '''Compare the bodies of two files positioned after their headers in chunks of chunk_size
+    rows'''
+    # pylint: disable=too-many-arguments, too-many-locals
+    compared = names if selected is None else selected
+    thresholds = None
+    if locate_rows:
+        thresholds = _quiet_thresholds(compared, units1, header1, precision)
+    deltas = _RunningMaxDelta(compared, thresholds)
+    try:
+        chunks1 = pd.read_csv(file1, sep='\t', names=names, usecols=selected,
+                              chunksize=chunk_size)
+        chunks2 = pd.read_csv(file2, sep='\t', names=names, usecols=selected,
+                              chunksize=chunk_size)
+        for chunk1, chunk2 in zip_longest(chunks1, chunks2):
+            # If one body is longer, compare against an empty chunk, so we get the same error
+            # as when comparing the full bodies
+            if chunk1 is None:
+                chunk1 = chunk2.iloc[:0]
+            if chunk2 is None:
+                chunk2 = chunk1.iloc[:0]
+            deltas.update(chunk1, chunk2)
+            if verdict_only and deltas.any_not_similar(units1, header1, precision):
+                break
+    except ValueError as e:
+        result.errors.append(e)
+        return result
+
+    deltas.classify(units1, header1, precision, sml_identity_threshold, verdict_only, result)
+    return result
+
+class _RunningMaxDelta:
+    '''Running maximum of the absolute difference in each column of bodies compared in chunks
+
+    If thresholds is given, rows where a column differs by more than its threshold are also
+    located, see _max_abs_deltas.
+    '''
+    def __init__(self, columns, thresholds=None):
+        self.columns = columns
+        self.col_idx = {col : i for i, col in enumerate(columns)}
+        self.seen = np.zeros(len(columns), dtype=bool)
+        self.max_delta = np.full(len(columns), np.nan)
+        self.values1 = np.full(len(columns), np.nan)
+        self.values2 = np.full(len(columns), np.nan)
+        self.rows = np.full(len(columns), -1)
+        self._thresholds = thresholds
+        self.locate_rows = thresholds is not None
+        self.first_rows = np.full(len(columns), -1)
+        self.row_counts = np.zeros(len(columns), dtype=int)
+
+    def update(self, chunk1, chunk2):
+        '''Compare two chunks with the same index. Raises ValueError like DataFrame.compare.'''
+        diff = chunk1.compare(chunk2)
+        if len(diff) == 0:
+            return
+        idx = np.array([self.col_idx[col] for col in diff.columns.levels[0]])
+        thresholds = self._thresholds[idx] if self.locate_rows else None
+        _, delta, v1, v2, rows, located = _max_abs_deltas(diff, thresholds)
+        if located is not None:
+            # Chunks are compared in order, so the first row is from the first chunk with one
+            first_rows, counts = located
+            self.first_rows[idx] = np.where(self.first_rows[idx] < 0, first_rows,
+                                            self.first_rows[idx])
+            self.row_counts[idx] += counts
+        # Only replace on strictly larger differences to keep the first occurrence of the
+        # maximum. NaN differences are replaced by anything.
+        update = ~self.seen[idx] | (delta > self.max_delta[idx]) | np.isnan(self.max_delta[idx])
+        idx, delta, v1, v2 = idx[update], delta[update], v1[update], v2[update]
+        self.seen[idx] = True
+        self.max_delta[idx] = delta
+        self.values1[idx] = v1
+        self.values2[idx] = v2
+        self.rows[idx] = rows[update]
+
+    def any_not_similar(self, units, header, precision):
+        '''Check if a difference seen so far is not similar'''
+        if not self.seen.any():
+            return False
+        if self._thresholds is None:
+            self._thresholds = _quiet_thresholds(self.columns, units, header, precision)
+        with np.errstate(invalid='ignore'):
+            return bool(np.any(self.max_delta > self._thresholds))
+
+    def classify(self, units, header, precision, sml_identity_threshold, verdict_only, result):
+        '''Add messages for the differences seen so far to result'''
+        # pylint: disable=too-many-arguments
+        seen = self.seen
+        if seen.any():
+            located = None
+            if self.locate_rows:
+                located = (self.first_rows[seen], self.row_counts[seen])
+            _classify_deltas([col for col, s in zip(self.columns, seen) if s],
+                             self.max_delta[seen],
+                             self.values1[seen],
+                             self.values2[seen],
+                             self.rows[seen],
+                             located,
+                             units,
+                             header,
+                             precision,
+                             sml_identity_threshold,
+                             verdict_only,
+                             result)
+        return result
+
+class IncrementalDlfComparison:
+    '''Compare a dlf file against a reference while the file is being written
+
+    Rows are added as they are written. The running maximum difference of each column is kept, so
+    failing() can be checked after each update, and comparison_result() gives the same messages as
+    compare_dlf_files would give for the rows seen so far.
+
+    Parameters
+    ----------
+    ref_path: str
+      Path to reference file. It is read through the cache enabled with
+      daisypy.test.dlf_cache.set_dlf_cache_dir.
+
+    skip_header, precision, sml_identity_threshold, columns, sml_only:
+      As for compare_dlf_files
+    '''
+    def __init__(self, ref_path,
+                 skip_header=default_header_lines_to_skip,
+                 precision=1e-8,
+                 sml_identity_threshold=0.001,
+                 columns=None,
+                 sml_only=False):
+        # pylint: disable=too-many-arguments
+        self.reference = read_dlf_cached(ref_path)
+        self.columns = _select_columns(list(self.reference.body.columns), self.reference.header,
+                                       columns, sml_only, False)
+        if self.columns is not None:
+            self.reference = self.reference._replace(body=self.reference.body[self.columns])
+        self.skip_header = skip_header
+        self.precision = precision
+        self.sml_identity_threshold = sml_identity_threshold
+        self.rows = 0
+        self._result = ComparisonResult()
+        if self.columns is not None and len(self.columns) == 0:
+            self._result.errors.append(f'No columns selected in {ref_path}')
+        self._deltas = None
+
+    def set_header(self, header, units):
+        '''Compare the header and units of the new file. Rows are only compared if they are
+        similar.'''
+        diff = _compare_headers(self.reference.header, header, self.skip_header)
+        if len(diff) == 0:
+            diff = _compare_units(self.reference.units, units)
+        if len(diff) > 0:
+            self._result.not_similar.extend(diff)
+        else:
+            self._deltas = _RunningMaxDelta(list(self.reference.body.columns))
+
+    def add_rows(self, rows):
+        '''Compare the next rows of the new file
+
+        Parameters
+        ----------
+        rows: pandas.DataFrame
+          Rows following the rows already added, parsed like the body of the file
+        '''
+        if self._deltas is None or len(self._result.errors) > 0:
+            return
+        rows = rows.set_axis(pd.RangeIndex(self.rows, self.rows + len(rows)))
+        if self.columns is not None:
+            rows = rows[self.columns]
+        reference = self.reference.body.iloc[self.rows:self.rows + len(rows)]
+        try:
+            # If the new file is longer than the reference, the indices differ and we get the same
+            # error as when comparing the full bodies
+            self._deltas.update(reference, rows)
+        except ValueError as e:
+            self._result.errors.append(e)
+        self.rows += len(rows)
+
+    def failing(self):
+        '''Check if there are errors or differences that are not similar in the rows seen so far'''
+        if len(self._result.errors) > 0 or len(self._result.not_similar) > 0:
+            return True
+        if self._deltas is None:
+            return False
+        return self._deltas.any_not_similar(self.reference.units, self.reference.header,
+                                            self.precision)
+
+    def comparison_result(self, max_messages=None):
+        '''Messages for the rows seen so far
+
+        Returns
+        -------
+        daisypy.test.result.ComparisonResult
+        '''
+        result = ComparisonResult(max_messages)
+        result.errors.extend(self._result.errors)
+        result.not_similar.extend(self._result.not_similar)
+        if len(result.errors) == 0 and self._deltas is not None:
+            self._deltas.classify(self.reference.units, self.reference.header, self.precision,
+                                  self.sml_identity_threshold, False, result)
+        return result
 
 def _compare_headers(h1, h2, skip_header):
     diff = []
@@ -105,57 +525,300 @@ def _compare_units(u1, u2):
             diff.append((k, u1[k], u2[k]))
     return diff
 
-def _compare_bodies(b1, b2, units, header, precision, sml_identity_threshold):
+def _compare_column_order(c1, c2):
+    '''Describe the first difference in the order of the columns, or return None if the order is
+    the same. Units are compared first, so the files have the same column names.'''
+    if len(c1) != len(c2):
+        return f'Number of columns differ: {len(c1)} != {len(c2)}'
+    for i, (name1, name2) in enumerate(zip(c1, c2)):
+        if name1 != name2:
+            return f'Columns in different order. Column {i}: {name1} != {name2}'
+    return None
+
+def _compare_bodies(b1, b2, units, header, precision, sml_identity_threshold, verdict_only,
+                    result, locate_rows=False):
     # pylint: disable=too-many-arguments
-    not_similar = []
-    not_identical = []
-    errors = []
     try:
         diff = b1.compare(b2)
         if len(diff) > 0:
             # Not identical according to pandas.Dataframe.compare
-            sml_map = load_smallest_meaningful_level(header, daisy_ureg)
-            if len(sml_map) == 0:
-                warnings.warn('No SML definitions loaded.')
-            for col in diff.columns.levels[0]:
-                abs_delta = (diff[col]['self'] - diff[col]['other']).abs()
-                max_abs_delta_idx = abs_delta.argmax()
-                delta = abs_delta.iloc[max_abs_delta_idx]
+            thresholds = None
+            if locate_rows:
+                thresholds = _quiet_thresholds(list(diff.columns.levels[0]), units, header,
+                                               precision)
+            columns, max_delta, values1, values2, rows, located = _max_abs_deltas(diff, thresholds)
+            _classify_deltas(columns,
+                             max_delta,
+                             values1,
+                             values2,
+                             rows,
+                             located,
+                             units,
+                             header,
+                             precision,
+                             sml_identity_threshold,
+                             verdict_only,
+                             result)
+    except ValueError as e:
+        result.errors.append(e)
+    return result
+
+def _compare_aligned_bodies(b1, b2, units, header, precision, sml_identity_threshold,
+                            verdict_only, result, locate_rows=False):
+    # pylint: disable=too-many-arguments, too-many-locals
+    names = [col for col in time_columns if col in b1.columns and col in b2.columns]
+    if len(names) == 0:
+        result.errors.append('No time columns to align rows on')
+        return result
+    try:
+        key1 = _time_keys(b1, names)
+        key2 = _time_keys(b2, names)
+    except ValueError as e:
+        result.errors.append(e)
+        return result
+
+    # Both keys are sorted, so a binary search finds the matching row in the other file
+    pos = np.searchsorted(key2, key1)
+    if len(key2) > 0:
+        matched1 = key2[np.minimum(pos, len(key2) - 1)] == key1
+    else:
+        matched1 = np.zeros(len(key1), dtype=bool)
+    idx1 = np.flatnonzero(matched1)
+    idx2 = pos[idx1]
+    matched2 = np.zeros(len(key2), dtype=bool)
+    matched2[idx2] = True
+    for label, body, matched in (('first', b1, matched1), ('second', b2, matched2)):
+        for start, end in _runs(~matched):
+            rows = end - start + 1
+            # Missing periods are kept before any column differences when messages are limited
+            result.not_similar.append(
+                f'Only in {label} file: {_format_time(body, names, start)} to '
+                f'{_format_time(body, names, end)} ({rows} row{"s" if rows > 1 else ""})',
+                priority=np.inf
+            )
+    if verdict_only and len(result.not_similar) > 0:
+        return result
+    # Matched rows are labelled by their row in the first file, so differences are located there
+    return _compare_bodies(b1.iloc[idx1],
+                           b2.iloc[idx2].set_axis(b1.index[idx1]),
+                           units,
+                           header,
+                           precision,
+                           sml_identity_threshold,
+                           verdict_only,
+                           result,
+                           locate_rows)
+
+def _time_keys(body, names):
+    '''Encode the time columns of each row as one integer that is ordered like the times.
+
+    Raises ValueError if the times are not integers in range or the rows are not ordered by time
+    with unique times.
+    '''
+    values = body[names].to_numpy(dtype=float)
+    if not np.all(np.isfinite(values)) or not np.all(values == np.round(values)):
+        raise ValueError(f'Time columns {", ".join(names)} must be integers')
+    values = values.astype(np.int64)
+    keys = values[:, 0].copy()
+    for i, name in enumerate(names[1:], start=1):
+        base = time_columns[name]
+        if np.any((values[:, i] < 0) | (values[:, i] >= base)):
+            raise ValueError(f'Time column {name} out of range')
+        keys = keys * base + values[:, i]
+    if np.any(np.diff(keys) <= 0):
+        raise ValueError('Rows are not ordered by time with unique times')
+    return keys
+
+def _runs(mask):
+    '''(first, last) index of each run of consecutive True values in mask'''
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > 1)
+    return zip(np.r_[idx[0], idx[breaks + 1]], np.r_[idx[breaks], idx[-1]])
+
+def _format_time(body, names, row):
+    # The values are checked to be integers by _time_keys
+    time = {name : int(value) for name, value in zip(names, body[names].iloc[row])}
+    if all(name in time for name in ('year', 'month', 'mday')):
+        text = f"{time['year']:04d}-{time['month']:02d}-{time['mday']:02d}"
+        if 'hour' in time:
+            text += f"T{time['hour']:02d}"
+            if 'minute' in time:
+                text += f":{time['minute']:02d}"
+                if 'second' in time:
+                    text += f":{time['second']:02d}"
+        return text
+    return ' '.join(f'{name}={value}' for name, value in time.items())
+
+def _max_abs_deltas(diff, thresholds=None):
+    '''Find the largest absolute difference in each column of a frame from DataFrame.compare
+
+    Parameters
+    ----------
+    diff: pandas.DataFrame
+      Result of DataFrame.compare
+
+    thresholds: numpy.ndarray
+      If not None, the threshold for not similar differences in each column of diff. Rows where a
+      column differs by more than its threshold are located in the same pass.
+
+    Returns
+    -------
+    (columns, max_delta, values1, values2, rows, located)
+      columns: list of column names
+      max_delta: numpy.ndarray with the largest absolute difference in each column
+      values1, values2: numpy.ndarray with the compared values in the row with the largest
+        difference
+      rows: numpy.ndarray with the index label of the row with the largest difference
+      located: None if thresholds is None. Otherwise (first_rows, counts) with the index label of
+        the first row exceeding the threshold in each column, or -1 if there is none, and the
+        number of rows exceeding the threshold.
+    '''
+    columns = list(diff.columns.levels[0])
+    values1 = diff.xs('self', axis=1, level=1)[columns].to_numpy(dtype=float)
+    values2 = diff.xs('other', axis=1, level=1)[columns].to_numpy(dtype=float)
+    abs_delta = np.abs(values1 - values2)
+    # Rows where a column is equal are NaN. Use the first occurrence of the max like argmax
+    idx = np.where(np.isnan(abs_delta), -np.inf, abs_delta).argmax(axis=0)
+    col_idx = np.arange(len(columns))
+    index = diff.index.to_numpy()
+    located = None
+    if thresholds is not None:
+        # Equal values and thresholds that could not be converted are NaN and never exceed
+        with np.errstate(invalid='ignore'):
+            exceeding = abs_delta > thresholds
+        counts = exceeding.sum(axis=0)
+        located = (np.where(counts > 0, index[exceeding.argmax(axis=0)], -1), counts)
+    return (columns,
+            abs_delta[idx, col_idx],
+            values1[idx, col_idx],
+            values2[idx, col_idx],
+            index[idx],
+            located)
+
+def _classify_deltas(columns, max_delta, values1, values2, rows, located, units, header,
+                     precision, sml_identity_threshold, verdict_only, result):
+    '''Classify the largest difference in each column as similar, not identical or not similar and
+    add messages and column statistics to result. located is as returned by _max_abs_deltas.'''
+    # pylint: disable=too-many-arguments, too-many-locals
+    sml_map = load_smallest_meaningful_level(header, get_daisy_ureg())
+    if len(sml_map) == 0:
+        warnings.warn('No SML definitions loaded.')
+    errors, smls, thresholds = _sml_thresholds(columns, units, sml_map, precision)
+    result.errors.extend(errors)
+    # A single comparison for all columns. Columns with errors have NaN thresholds and never fail
+    with np.errstate(invalid='ignore', divide='ignore'):
+        not_identical_mask = max_delta > sml_identity_threshold * thresholds
+        not_similar_mask = max_delta > thresholds
+        # Messages are prioritized by the size of the difference relative to the threshold
+        priorities = max_delta / thresholds
+        # thresholds is the SML divided by the conversion factor from the column unit to the SML
+        sml_deltas = priorities * np.array([np.nan if sml is None else sml.magnitude
+                                            for sml in smls])
+    _add_column_stats(columns, max_delta, units, smls, sml_deltas, rows, located, result)
+    if verdict_only:
+        # Only the first column that is not similar is reported
+        failing = np.flatnonzero(not_similar_mask)[:1]
+    else:
+        failing = np.flatnonzero(not_identical_mask)
+    for i in failing:
+        messages = result.not_similar if not_similar_mask[i] else result.not_identical
+        priority = float(priorities[i])
+        if not messages.accepts(priority):
+            # Converting the difference to the SML unit is expensive, so only build kept messages
+            messages.drop()
+            continue
+        col = columns[i]
+        sml = smls[i]
+        if sml is None:
+            delta = max_delta[i]
+            msg = f'[{col}]: {values1[i]} | {values2[i]} | {delta} | {precision}'
+        else:
+            delta = (max_delta[i] * dlf_unit_to_pint_unit(units[col], get_daisy_ureg())).to(sml)
+            msg = f'[{col}]: {values1[i]} | {values2[i]} | {delta} | {sml}'
+        messages.append(msg, priority)
+    return result
+
+def _add_column_stats(columns, max_delta, units, smls, sml_deltas, rows, located, result):
+    # pylint: disable=too-many-arguments
+    # Plain python values, so the statistics can be stored as json
+    if located is None:
+        first_rows = counts = [None] * len(columns)
+    else:
+        first_rows, counts = (values.tolist() for values in located)
+    for col, delta, sml, sml_delta, row, first_row, count in zip(
+            columns, max_delta.tolist(), smls, sml_deltas.tolist(), rows.tolist(), first_rows,
+            counts):
+        result.column_stats.append(ColumnStats(
+            col,
+            delta,
+            units[col],
+            None if sml is None or np.isnan(sml_delta) else sml_delta,
+            None if sml is None else str(sml),
+            row,
+            first_row,
+            count
+        ))
+
+def _quiet_thresholds(columns, units, header, precision):
+    '''Thresholds from _sml_thresholds without errors or warnings. They are reported when the
+    differences are classified.'''
+    sml_map = load_smallest_meaningful_level(header, get_daisy_ureg())
+    return _sml_thresholds(columns, units, sml_map, precision, quiet=True)[2]
+
+def _sml_thresholds(columns, units, sml_map, precision, quiet=False):
+    '''Find the SML of each column and express it in the units used for the column.
+
+    Columns without an SML are warned about unless quiet is True. Warning filters are global, so
+    they are not changed here, as comparisons can run in threads.
+
+    Returns
+    -------
+    (errors, smls, thresholds)
+      errors: list of str
+      smls: list with the SML of each column or None if the column has no SML
+      thresholds: numpy.ndarray with the SML of each column in the units of the column. precision if
+        the column has no SML and NaN if the SML could not be converted.
+    '''
+    errors = []
+    smls = []
+    thresholds = np.empty(len(columns))
+    # Unit conversion is done once for each pair of dlf unit and SML. Conversion errors are stored
+    # as the start of the error message
+    converted = {}
+    for i, col in enumerate(columns):
+        try:
+            try:
+                sml = sml_map[col]
+            except KeyError:
+                # Check if we have depth logged values, e.g. M @ -100
+                parts = col.split("@", maxsplit=1)
+                if len(parts) == 2:
+                    sml = sml_map[parts[0] + "@"]
+                else:
+                    raise
+            key = (units[col], str(sml))
+            if key not in converted:
                 try:
-                    try:
-                        sml = sml_map[col]
-                    except KeyError:
-                        # Check if we have depth logged values, e.g. M @ -100
-                        parts = col.split("@", maxsplit=1)
-                        if len(parts) == 2:
-                            sml = sml_map[parts[0] + "@"]
-                        else:
-                            raise
-                    delta_u = (delta * dlf_unit_to_pint_unit(units[col], daisy_ureg)).to(sml)
-                    if delta_u > sml_identity_threshold * sml:
-                        row = diff[col].iloc[max_abs_delta_idx]
-                        msg = f'[{col}]: {row["self"]} | {row["other"]} | {delta_u} | {sml}'
-                        if delta_u > sml:
-                            not_similar.append(msg)
-                        else:
-                            not_identical.append(msg)
-                except KeyError:
-                    # We dont have an SML
-                    warnings.warn(f'No SML for {col}')
-                    if delta > sml_identity_threshold * precision:
-                        row = diff[col].iloc[max_abs_delta_idx]
-                        msg = f'[{col}]: {row["self"]} | {row["other"]} | {delta} | {precision}'
-                        if delta > precision:
-                            not_similar.append(msg)
-                        else:
-                            not_identical.append(msg)
+                    factor = sml_conversion_factor(units[col], sml, get_daisy_ureg())
+                    converted[key] = sml.magnitude / factor
                 except UndefinedUnitError:
-                    errors.append(f'Unknown unit {units[col]} for {col}')
+                    converted[key] = f'Unknown unit {units[col]} for'
                 except AttributeError:
-                    errors.append(f'Unit conversion error {units[col]} for {col}')
+                    converted[key] = f'Unit conversion error {units[col]} for'
                 except DimensionalityError:
-                    errors.append(f'Unit mismatch {units[col]} !~ {sml_map[col]} for {col}')
-    except ValueError as e:
-        errors.append(e)
-
-    return errors, not_similar, not_identical
+                    converted[key] = f'Unit mismatch {units[col]} !~ {sml} for'
+            if isinstance(converted[key], str):
+                errors.append(f'{converted[key]} {col}')
+                thresholds[i] = np.nan
+            else:
+                thresholds[i] = converted[key]
+            smls.append(sml)
+        except KeyError:
+            # We dont have an SML
+            if not quiet:
+                warnings.warn(f'No SML for {col}')
+            thresholds[i] = precision
+            smls.append(None)
+    return errors, smls, thresholds
@@ -1,7 +1,18 @@
 # pylint: disable=duplicate-code
-'''Compare two dlf files using smallest meaningfull levels'''
+'''Compare two gnuplot files
+
+Command lines are compared as text. Inline data, i.e. named blocks ($name << EOD ... EOD) and data
+following a plot command reading from '-' (terminated by a line with e), is parsed into arrays and
+compared numerically, so a value written with another format is not a difference.
+'''
+import re
 from itertools import zip_longest
 
+import numpy as np
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ComparisonResult
+
 __all__ = [
     'compare_gnuplot_files'
 ]
@@ -12,45 +23,242 @@ default_lines_to_skip = frozenset(
 
 DEFAULT_STRIP_TOKENS = None
 
+# Start of a named data block, e.g. $data << EOD
+_named_block = re.compile(r'^\s*\$(\w+)\s*<<\s*(\S+)\s*$')
+# Plot commands and the inline data they read
+_plot_command = re.compile(r'^\s*(?:plot|splot|replot)\b')
+_inline_data = re.compile(r'''(['"])-\1''')
+# Blank lines separating data sets within a block
+_blank_lines = re.compile(r'\n(?:[ \t\r]*\n)+')
+
 def compare_gnuplot_files(path1,
                           path2,
                           skip_lines=default_lines_to_skip,
                           strip_tokens=DEFAULT_STRIP_TOKENS,
+                          max_messages=None,
+                          verdict_only=False,
+                          precision=1e-8,
+                          relative_precision=1e-6,
                           **_):
     '''Compare two gnuplot files
 
+    Command lines are similar if they are equal. Values in data blocks are compared as numbers if
+    they are numbers in both files and as text otherwise. Numbers are identical if they are equal
+    and similar if abs(value1 - value2) <= precision + relative_precision * abs(value1).
+
     Parameters
     ----------
     path1, path2 : str
       Paths to gnuplot files
 
     skip_lines: set of str
-      Skip lines that begin with one of the strings in skip_lines
+      Skip command lines that begin with one of the strings in skip_lines
 
     strip_tokens: str
       Tokens to strip from strings before matching against skip_lines
 
+    max_messages: int
+      Keep at most this many messages of each kind. None means no limit.
+
+    verdict_only: bool
+      If True, stop at the first difference that is not similar and do not report differences that
+      are only not identical.
+
+    precision: float
+      Absolute tolerance when comparing numbers in data blocks
+
+    relative_precision: float
+      Tolerance relative to the value in path1 when comparing numbers in data blocks
+
     Returns
     -------
-    (errors, not_similar, not_identical)
-      errors: list of str
-      not_similar: list of str
-      not_identical: list of str
+    daisypy.test.result.ComparisonResult, which unpacks to (errors, not_similar, not_identical)
     '''
-    errors = []
-    not_identical = []
-    not_similar = []
+    # pylint: disable=too-many-arguments
+    result = ComparisonResult(max_messages)
     keep = _drop_lines_starting_with(skip_lines, strip_tokens)
     try:
         with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
-            log1 = filter(keep, file1)
-            log2 = filter(keep, file2)
-            for line1, line2 in zip_longest(log1, log2):
-                if line1 != line2:
-                    not_similar.append(f'{line1} != {line2}')
+            text1 = file1.read()
+            text2 = file2.read()
     except OSError as e:
-        errors.append(e)
-    return errors, not_similar, not_identical
+        result.errors.append(e)
+        return result
+    for part1, part2 in zip_longest(_split_parts(text1, keep), _split_parts(text2, keep)):
+        if part1 is None or part2 is None or part1[0] != part2[0] or part1[0] == 'command':
+            if part1 is None or part2 is None or part1[2] != part2[2]:
+                result.not_similar.append(f'{_describe(part1)} != {_describe(part2)}')
+        else:
+            if (part1[4] is None) != (part2[4] is None):
+                # One of the files ended before the end of the block
+                result.not_similar.append(
+                    f'{_describe(part1)} terminator: {part1[4]} != {part2[4]}'
+                )
+            if part1[3] != part2[3]:
+                # Blocks are named by the preceding command lines, which are already compared
+                _compare_blocks(part1, part2, precision, relative_precision, verdict_only, result)
+        if verdict_only and len(result.not_similar) > 0:
+            break
+    return result
+
+def _split_parts(text, keep):
+    '''Split the text of a gnuplot file into command lines and data blocks
+
+    Yields
+    ------
+    ('command', line number, line) or ('data', line number, name, block text, terminator)
+      terminator is None if the file ends before the terminator of the block
+    '''
+    pos = 0
+    lineno = 0
+    # Terminators of the data blocks following the last command
+    pending = []
+    while pos < len(text):
+        if len(pending) > 0:
+            name, terminator = pending.pop(0)
+            end, next_pos, found = _find_terminator(text, pos, terminator)
+            block = text[pos:end]
+            pos = next_pos
+            yield 'data', lineno + 1, name, block, terminator if found else None
+            lineno += block.count('\n') + 1
+            continue
+        end = text.find('\n', pos)
+        end = len(text) if end < 0 else end
+        line = text[pos:end].rstrip('\r')
+        pos = end + 1
+        lineno += 1
+        if not keep(line):
+            continue
+        yield 'command', lineno, line
+        match = _named_block.match(line)
+        if match is not None:
+            pending.append((f'${match.group(1)}', match.group(2)))
+        elif _plot_command.match(line):
+            pending += [("'-'", 'e')] * len(_inline_data.findall(line))
+
+def _find_terminator(text, pos, terminator):
+    '''Find the line ending the data block starting at pos
+
+    Returns
+    -------
+    (end, next_pos, found)
+      end: End of the data block
+      next_pos: Start of the line after the terminator
+      found: False if the text ends without the terminator, in which case end and next_pos are the
+        end of the text
+    '''
+    # Searching for the terminator is much faster than iterating over the lines. A single scan that
+    # allows surrounding whitespace finds the first terminator, also when it has trailing whitespace
+    match = re.compile(rf'^[ \t]*{re.escape(terminator)}[ \t\r]*$', re.MULTILINE).search(text, pos)
+    if match is None:
+        return len(text), len(text), False
+    return match.start(), match.end() + 1, True
+
+def _describe(part):
+    if part is None:
+        return None
+    if part[0] == 'command':
+        return part[2]
+    return f'{part[2]} (line {part[1]})'
+
+def _compare_blocks(block1, block2, precision, relative_precision, verdict_only, result):
+    '''Compare the values in two data blocks and add messages to result'''
+    # pylint: disable=too-many-arguments, too-many-locals
+    name = _describe(block1)
+    values1 = _parse_block(block1[3])
+    values2 = _parse_block(block2[3])
+    if values1 is None or values2 is None:
+        # Rows with different number of values. Compare as text
+        for row, (line1, line2) in enumerate(zip_longest(block1[3].splitlines(),
+                                                         block2[3].splitlines())):
+            if line1 != line2:
+                result.not_similar.append(f'{name} row {row}: {line1} != {line2}')
+                if verdict_only:
+                    return
+        return
+    (sets1, table1), (sets2, table2) = values1, values2
+    if sets1 != sets2 or table1.shape != table2.shape:
+        result.not_similar.append(
+            f'{name}: {len(sets1)} data sets with {sets1} rows of {table1.shape[1]} values != '
+            f'{len(sets2)} data sets with {sets2} rows of {table2.shape[1]} values'
+        )
+        return
+    for col in range(table1.shape[1]):
+        numbers1 = _as_numbers(table1[:, col])
+        numbers2 = _as_numbers(table2[:, col])
+        if numbers1 is None or numbers2 is None:
+            differ = np.flatnonzero(table1[:, col] != table2[:, col])
+            if len(differ) > 0:
+                row = differ[0]
+                others = '' if len(differ) == 1 else f' and {len(differ) - 1} other rows'
+                result.not_similar.append(
+                    f'{name} column {col + 1} row {row}: {table1[row, col]} != '
+                    f'{table2[row, col]}{others}'
+                )
+        else:
+            _compare_numbers(name, col, numbers1, numbers2, precision, relative_precision,
+                             verdict_only, result)
+        if verdict_only and len(result.not_similar) > 0:
+            return
+
+def _parse_block(block):
+    '''Parse the values in a data block
+
+    Returns
+    -------
+    (rows, values) or None if the rows do not have the same number of values
+      rows: list with the number of rows in each data set. Data sets are separated by blank lines
+      values: numpy.ndarray with a row for each line and a column for each value. The values are
+        float if they are all numbers and str otherwise.
+    '''
+    block = block.strip('\n')
+    # Splitting the whole block at once is much faster than splitting each line
+    tokens = block.split()
+    if len(tokens) == 0:
+        return [], np.empty((0, 0))
+    columns = len(block.split('\n', maxsplit=1)[0].split())
+    rows = [block.count('\n') + 1]
+    if len(tokens) != rows[0] * columns:
+        # Blank lines or rows with a different number of values
+        rows = [data_set.count('\n') + 1 for data_set in _blank_lines.split(block)]
+        if columns == 0 or len(tokens) != sum(rows) * columns:
+            return None
+    try:
+        # Most blocks only contain numbers, which are parsed in a single call
+        return rows, np.array(tokens, dtype=float).reshape(-1, columns)
+    except ValueError:
+        return rows, np.array(tokens, dtype=object).reshape(-1, columns)
+
+def _as_numbers(values):
+    '''Convert a column of values to float or return None if they are not all numbers'''
+    if values.dtype == float:
+        return values
+    try:
+        return values.astype(float)
+    except ValueError:
+        return None
+
+def _compare_numbers(name, col, numbers1, numbers2, precision, relative_precision, verdict_only,
+                     result):
+    '''Compare a column of numbers and add a message for the largest difference to result'''
+    # pylint: disable=too-many-arguments
+    with np.errstate(invalid='ignore', divide='ignore'):
+        equal = (numbers1 == numbers2) | (np.isnan(numbers1) & np.isnan(numbers2))
+        if equal.all():
+            return
+        # Differences involving NaN or inf are never similar
+        delta = np.where(equal, 0.0, np.abs(numbers1 - numbers2))
+        delta[np.isnan(delta)] = np.inf
+        threshold = precision + relative_precision * np.abs(numbers1)
+        ratio = np.where(equal, 0.0, delta / threshold)
+        ratio[np.isnan(ratio)] = np.inf
+    row = int(np.argmax(ratio))
+    message = (f'{name} column {col + 1} row {row}: {numbers1[row]} | {numbers2[row]} | '
+               f'{delta[row]} | {threshold[row]}')
+    if ratio[row] > 1:
+        result.not_similar.append(message, float(ratio[row]))
+    elif not verdict_only:
+        result.not_identical.append(message, float(ratio[row]))
 
 def _drop_lines_starting_with(drop_tokens, strip_tokens):
     def keep(s):
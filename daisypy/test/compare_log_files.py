@@ -1,10 +1,13 @@
 '''Compare two log files using smallest meaningfull levels'''
-import math
 import re
 from itertools import zip_longest, dropwhile
 
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ComparisonResult, MessageList
+
 __all__ = [
-    'compare_log_files'
+    'compare_log_files',
+    'log_files_identical',
 ]
 
 default_lines_to_skip = frozenset(
@@ -31,12 +34,18 @@ default_lines_to_skip = frozenset(
 
 DEFAULT_STRIP_TOKENS = ' \t\n*'
 
-# pylint: disable=too-many-locals ; I don't think code gets clearer by rewriting with fewer locals
+# Numbers in a line. The group makes re.split return the text between numbers and the numbers, so a
+# line is tokenized in a single pass
+num_pattern = re.compile(r'(-?\d*\.?\d+(?:[eE][+-]?\d+)?)')
+multi_space_pattern = re.compile(r'\s{2,}')
+
 def compare_log_files(path1, path2,
                       skip_lines=default_lines_to_skip,
                       strip_tokens=DEFAULT_STRIP_TOKENS,
                       abs_tol=1e-8,
                       rel_tol=1e-2, # This is set low, because we mostly have summary numbers
+                      max_messages=None,
+                      verdict_only=False,
                       **_):
     '''Compare two Daisy log files
 
@@ -57,78 +66,120 @@ def compare_log_files(path1, path2,
     rel_tol: float
       Consider two numbers x, y equal if max(abs((x-y)/x), abs((x-y)/y)) < rel_tol
 
+    max_messages: int
+      Keep at most this many messages of each kind. None means no limit.
+
+    verdict_only: bool
+      If True, stop at the first difference that is not similar and do not report differences that
+      are only not identical.
+
     Returns
     -------
-    (errors, not_similar, not_identical)
-      errors: list of str
-      not_similar: list of str
-      not_identical: list of str
+    daisypy.test.result.ComparisonResult, which unpacks to (errors, not_similar, not_identical)
     '''
-    def program_not_ready(s):
-        return not s.startswith("Storing 'daisy.log'")
-
-    errors = []
-    not_identical = []
-    not_similar = []
-    diff = []
+    # pylint: disable=too-many-arguments
+    result = ComparisonResult(max_messages)
+    # In verdict only mode messages about differences that are only not identical are discarded
+    not_identical = MessageList(0) if verdict_only else result.not_identical
     keep = _drop_lines_starting_with(skip_lines, strip_tokens)
     try:
         with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
-            log1 = filter(keep, dropwhile(program_not_ready, file1))
-            log2 = filter(keep, dropwhile(program_not_ready, file2))
+            log1 = filter(keep, dropwhile(_program_not_ready, file1))
+            log2 = filter(keep, dropwhile(_program_not_ready, file2))
             for line1, line2 in zip_longest(log1, log2, fillvalue=''):
-                err, not_sim, not_id = _compare_lines(line1, line2, abs_tol, rel_tol)
-                errors += err
-                not_similar += not_sim
-                not_identical += not_id
+                _compare_lines(line1, line2, abs_tol, rel_tol, result.not_similar, not_identical)
+                if verdict_only and len(result.not_similar) > 0:
+                    break
     except OSError as e:
-        errors.append(e)
-    return errors, not_similar, not_identical
+        result.errors.append(e)
+    return result
+
+def log_files_identical(path1, path2,
+                        skip_lines=default_lines_to_skip,
+                        strip_tokens=DEFAULT_STRIP_TOKENS):
+    '''Check if two Daisy log files are identical, i.e. compare_log_files would not find any
+    differences. This is much faster than compare_log_files, because the lines are not parsed.
+
+    Parameters
+    ----------
+    path1, path2 : str
+      Paths to log files
+
+    skip_lines: set of str
+      Skip lines that begin with one of the strings in skip_lines
+
+    strip_tokens: str
+      Tokens to strip from strings before matching against skip_lines
 
-def _compare_lines(line1, line2, abs_tol, rel_tol):
+    Returns
+    -------
+    True if the files are identical. False if they might differ.
+    '''
+    keep = _drop_lines_starting_with(skip_lines, strip_tokens)
+    with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
+        log1 = filter(keep, dropwhile(_program_not_ready, file1))
+        log2 = filter(keep, dropwhile(_program_not_ready, file2))
+        for line1, line2 in zip_longest(log1, log2):
+            if line1 is None or line2 is None or line1.strip() != line2.strip():
+                return False
+    return True
+
+def _program_not_ready(s):
+    return not s.startswith("Storing 'daisy.log'")
+
+def _compare_lines(line1, line2, abs_tol, rel_tol, not_similar, not_identical):
+    # pylint: disable=too-many-arguments
     line1 = line1.strip()
     line2 = line2.strip()
-    errors = []
-    not_identical = []
-    not_similar = []
-    good = True
     # If the lines are only - and = we ignore them
-    if line1 != line2 and not all((c in {'-', '='} for c in line1 + line2)):
+    if line1 == line2 or (line1 + line2).strip('-=') == '':
+        return
+    # Messages are only formatted if they are kept, since a broken run can differ on every line
+    if not_identical.accepts():
         not_identical.append(f'"{line1}" | "{line2}"')
+    else:
+        not_identical.drop()
 
-        # Check the numbers
-        num_pattern = re.compile(r'-?\d*\.?\d+(?:[eE][+-]?\d+)?')
-        numbers1 = re.findall(num_pattern, line1)
-        numbers2 = re.findall(num_pattern, line2)
-        if len(numbers1) != len(numbers2):
+    # Tokens alternate between text and numbers, starting and ending with text
+    tokens1 = num_pattern.split(line1)
+    tokens2 = num_pattern.split(line2)
+    if len(tokens1) != len(tokens2):
+        if not_similar.accepts():
             not_similar.append(f'"{line1}" | "{line2}"')
-            good = False
         else:
-            for n1, n2 in zip(numbers1, numbers2):
-                x, y = float(n1), float(n2)
-                d = x - y
-                if abs(d) > abs_tol:
-                    if x == 0 or y == 0 or max(abs(d/x), abs(d/y)) > rel_tol:
-                        not_similar.append(f'"{x}" != "{y}" in\n\t{line1}\n\t{line2}')
-                        good = False
-        if good:
-            # If the numbers are good, check the rest of the string
-            # We remove all the numbers, replace consecutive whitespace with a single space and make
-            # -nan into nan
-            multi_space_pattern = re.compile(r"\s{2,}")
-            neg_nan_pattern = "-nan"
-            s1 = re.sub(num_pattern, '', line1).strip()
-            s1 = re.sub(multi_space_pattern, " ", s1)
-            s1 = re.sub(neg_nan_pattern, "nan", s1)
-            s2 = re.sub(num_pattern, '', line2).strip()
-            s2 = re.sub(multi_space_pattern, " ", s2)
-            s2 = re.sub(neg_nan_pattern, "nan", s2)
-            if s1 != s2:
+            not_similar.drop()
+        return
+    good = True
+    for n1, n2 in zip(tokens1[1::2], tokens2[1::2]):
+        if n1 == n2:
+            continue
+        x, y = float(n1), float(n2)
+        d = x - y
+        if abs(d) > abs_tol:
+            if x == 0 or y == 0 or max(abs(d/x), abs(d/y)) > rel_tol:
+                if not_similar.accepts():
+                    not_similar.append(f'"{x}" != "{y}" in\n\t{line1}\n\t{line2}')
+                else:
+                    not_similar.drop()
+                good = False
+    if good:
+        # If the numbers are good, check the rest of the string
+        s1 = _skeleton(tokens1)
+        s2 = _skeleton(tokens2)
+        if s1 != s2:
+            if not_similar.accepts():
                 not_similar.append(f'"{s1}" | "{s2}"')
-    return errors, not_similar, not_identical
+            else:
+                not_similar.drop()
+
+def _skeleton(tokens):
+    # The text of a line without numbers, with consecutive whitespace replaced by a single space and
+    # -nan made into nan
+    s = multi_space_pattern.sub(' ', ''.join(tokens[::2]).strip())
+    return s.replace('-nan', 'nan')
 
 def _drop_lines_starting_with(drop_tokens, strip_tokens):
+    drop_tokens = tuple(drop_tokens)
     def keep(s):
-        s = s.strip(strip_tokens)
-        return not any((s.startswith(token) for token in drop_tokens))
+        return not s.strip(strip_tokens).startswith(drop_tokens)
     return keep
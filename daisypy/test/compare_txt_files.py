@@ -1,35 +1,46 @@
-'''Compare two txt files'''
-from itertools import zip_longest, dropwhile
-
-__all__ = [
-    'compare_txt_files'
-]
-
-DEFAULT_STRIP_TOKENS = ' \t\n*'
-
-def compare_txt_files(path1, path2, **_):
-    '''Compare two Daisy log files
-
-    Parameters
-    ----------
-    path1, path2 : str
-      Paths to txt files
-
-    Returns
-    -------
-    (errors, not_identical)
-      errors: list of str
-      not_similar: list of str
-      not_identical: list of str
-    '''
-    errors = []
-    not_identical = []
-    not_similar = []
-    try:
-        with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
-            for line1, line2 in zip_longest(file1, file2):
-                if line1 != line2:
-                    not_similar.append(f'{line1} != {line2}')
-    except OSError as e:
-        errors.append(e)
-    return errors, not_similar, not_identical
\ No newline at end of file
+'''Compare two txt files'''
+from itertools import zip_longest, dropwhile
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ComparisonResult
+
+__all__ = [
+    'compare_txt_files'
+]
+
+DEFAULT_STRIP_TOKENS = ' \t\n*'
+
+def compare_txt_files(path1, path2, max_messages=None, verdict_only=False, **_):
+    '''Compare two Daisy log files
+
+    Parameters
+    ----------
+    path1, path2 : str
+      Paths to txt files
+
+    max_messages: int
+      Keep at most this many messages of each kind. None means no limit.
+
+    verdict_only: bool
+      If True, stop at the first difference that is not similar and do not report differences that
+      are only not identical.
+
+    Returns
+    -------
+    daisypy.test.result.ComparisonResult, which unpacks to (errors, not_similar, not_identical)
+    '''
+    result = ComparisonResult(max_messages)
+    try:
+        with open(path1, encoding='locale') as file1, open(path2, encoding='locale') as file2:
+            for line1, line2 in zip_longest(file1, file2):
+                if line1 != line2:
+                    # Messages are only formatted if they are kept
+                    if result.not_similar.accepts():
+                        result.not_similar.append(f'{line1} != {line2}')
+                    else:
+                        result.not_similar.drop()
+                    if verdict_only:
+                        break
+    except OSError as e:
+        result.errors.append(e)
+    return result
\ No newline at end of file
@@ -0,0 +1,134 @@
+'''Binary cache of parsed dlf files
+
+Reference files rarely change, but parsing them from text is a large part of comparing a dlf file.
+When enabled with set_dlf_cache_dir, the first read of a file stores the header and units as json
+and the body as a .npy file with one contiguous float64 array per column. Later reads memory map the
+body instead of parsing the text. An entry is invalidated when the size or modification time of the
+file changes, or when the version of pandas changes.
+
+Only bodies where every column is float64, or int64 that is exact as float64, are stored. Other
+files are always parsed from text.
+'''
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from daisypy.io.dlf import Dlf, read_dlf
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.dlf_reader import read_dlf_body, read_dlf_header
+from daisypy.test.files import atomic_write
+
+__all__ = [
+    'set_dlf_cache_dir',
+    'read_dlf_cached',
+]
+
+# Incremented when the layout of cache entries changes
+FORMAT_VERSION = 1
+
+# Directory of the on-disk cache. The cache is disabled if None
+_CACHE_DIR = None
+
+def set_dlf_cache_dir(cache_dir):
+    '''Enable an on-disk cache of parsed dlf files
+
+    Parameters
+    ----------
+    cache_dir: str
+      Directory to store the cache in. If None the on-disk cache is disabled.
+    '''
+    global _CACHE_DIR # pylint: disable=global-statement
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    _CACHE_DIR = cache_dir
+
+def read_dlf_cached(path, columns=None):
+    '''Read a dlf file, using the on-disk cache if enabled with set_dlf_cache_dir
+
+    Parameters
+    ----------
+    path : str
+      Path to daisy log file
+
+    columns: list of str
+      If not None, the body only contains these columns, in the order of the file. Without the
+      cache only these columns are parsed. With the cache the full file is parsed and stored on the
+      first read, and later reads only copy these columns from the memory map.
+
+    Returns
+    -------
+    daisypy.io.dlf.Dlf object. The body is read only if it is memory mapped from the cache.
+    '''
+    if _CACHE_DIR is None:
+        if columns is None:
+            return read_dlf(path)
+        with open(path, encoding='locale') as infile:
+            header, names, units = read_dlf_header(infile)
+            return Dlf(header, units, read_dlf_body(infile, names, columns))
+    dlf = _read_dlf_cached(path)
+    if columns is None:
+        return dlf
+    selected = set(columns)
+    return dlf._replace(body=dlf.body[[col for col in dlf.body.columns if col in selected]])
+
+def _read_dlf_cached(path):
+    stat = os.stat(path)
+    source = {
+        'format' : FORMAT_VERSION,
+        'pandas' : pd.__version__,
+        'size' : stat.st_size,
+        'mtime_ns' : stat.st_mtime_ns,
+    }
+    base = os.path.join(_CACHE_DIR, hashlib.sha256(os.path.realpath(path).encode()).hexdigest())
+    dlf = _load(base, source)
+    if dlf is None:
+        dlf = read_dlf(path)
+        _store(base, source, dlf)
+    return dlf
+
+def _load(base, source):
+    try:
+        with open(f'{base}.json', encoding='utf-8') as infile:
+            meta = json.load(infile)
+        if meta['source'] != source:
+            return None
+        columns = meta['columns']
+        values = np.load(f'{base}.npy', mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+    if values.shape != (len(columns), meta['rows']):
+        return None
+    # Rows of values are the columns of the body, so the frame can use the memory map directly
+    body = pd.DataFrame(values.T, columns=columns, copy=False)
+    int_columns = [col for col, dtype in zip(columns, meta['dtypes']) if dtype == 'int64']
+    if len(int_columns) > 0:
+        body = body.astype({col : 'int64' for col in int_columns})
+    return Dlf(meta['header'], meta['units'], body)
+
+def _store(base, source, dlf):
+    body = dlf.body
+    if len(body.columns) == 0 or body.columns.has_duplicates:
+        return
+    dtypes = [str(dtype) for dtype in body.dtypes]
+    if any(dtype not in ('float64', 'int64') for dtype in dtypes):
+        return
+    values = np.ascontiguousarray(body.to_numpy(dtype=np.float64).T)
+    for i, dtype in enumerate(dtypes):
+        if dtype == 'int64' and not np.array_equal(values[i].astype(np.int64), body.iloc[:, i]):
+            return
+    meta = {
+        'source' : source,
+        'header' : dlf.header,
+        'units' : dlf.units,
+        'columns' : list(body.columns),
+        'dtypes' : dtypes,
+        'rows' : len(body),
+    }
+    # The body is replaced first, so a stale json never describes a new body
+    with atomic_write(f'{base}.npy', 'wb', suffix='.npy') as outfile:
+        np.save(outfile, values)
+    with atomic_write(f'{base}.json') as outfile:
+        json.dump(meta, outfile)
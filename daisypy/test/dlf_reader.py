@@ -0,0 +1,93 @@
+'''Incremental reading of Daisy log files
+
+daisypy.io.dlf.read_dlf reads a complete file into memory. The functions here parse the header in
+the same way, but leave it to the caller how the body is read, e.g. in chunks.
+'''
+import importlib
+import re
+
+__all__ = [
+    'HEADER_BODY_SEP',
+    'default_header_lines_to_skip',
+    'read_dlf_header',
+    'read_dlf_body',
+]
+
+HEADER_BODY_SEP = '--------------------'
+
+# Header keys that are not compared by default, because they change between runs
+default_header_lines_to_skip = frozenset(
+    ('VERSION', 'RUN', 'SIMFILE', 'SIM', 'dlf-def-location', 'info')
+)
+
+def read_dlf_header(infile):
+    '''Read the header, column names and units of a dlf file.
+
+    Parameters
+    ----------
+    infile: file-like
+      dlf file opened in text mode and positioned at the start of the file. On return infile is
+      positioned at the first line of the body.
+
+    Returns
+    -------
+    (header, columns, units)
+      header: dict with information describing the log, as in daisypy.io.dlf.Dlf.header
+      columns: list of column names
+      units: dict mapping column names to units, as in daisypy.io.dlf.Dlf.units
+    '''
+    header = {}
+    for row in infile:
+        if row.startswith(HEADER_BODY_SEP):
+            break
+        row = row.strip()
+        if len(row) > 0:
+            if row[:3] == 'dlf':
+                header['info'] = row
+                match = re.match(r'dlf-([0-9]+\.[0-9]+) -- ([^\(]+)(?:\((.*)\))?', row).groups()
+                header['dlf-version'] = match[0]
+                header['dlf-component'] = match[1].strip()
+                header['dlf-def-location'] = match[2] if len(match) == 3 else 'builtin'
+            else:
+                sep_idx = row.find(':')
+                k = row[:sep_idx].strip()
+                v = row[(sep_idx+1):].strip()
+                if k in header:
+                    if isinstance(header[k], list):
+                        header[k].append(v)
+                    else:
+                        header[k] = [header[k], v]
+                else:
+                    header[k] = v
+    try:
+        columns = next(infile).strip('\n').split('\t')
+        units = dict(zip(columns, next(infile).strip('\n').split('\t')))
+    except StopIteration:
+        columns = []
+        units = {}
+    return header, columns, units
+
+def read_dlf_body(infile, columns, usecols=None):
+    '''Read the body of a dlf file like daisypy.io.dlf.read_dlf
+
+    Parameters
+    ----------
+    infile: file-like
+      dlf file positioned at the first line of the body, e.g. by read_dlf_header
+
+    columns: list of str
+      Column names as returned by read_dlf_header
+
+    usecols: list of str
+      If not None, only parse these columns. The other columns are skipped without converting their
+      values, which is much faster for wide files.
+
+    Returns
+    -------
+    pandas.DataFrame
+    '''
+    # The header constants are used when test_daisy starts, so pandas is imported when it is needed
+    pd = importlib.import_module('pandas')
+    if len(columns) == 0:
+        return pd.DataFrame()
+    return pd.read_csv(infile, sep='\t', names=columns, usecols=usecols)
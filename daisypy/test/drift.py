@@ -0,0 +1,222 @@
+'''History of differences across runs
+
+A run of test_daisy only reports whether differences are within the SML. To follow slow drift the
+largest difference in each column of each dlf file can be appended to an SQLite database at the end
+of every run. All rows of a run are inserted in a single transaction, so recording adds little to
+the run time. The daisy_drift command shows how the differences in each column develop across runs.
+
+Tables
+  runs(id, time, label, program, reference_dir)
+  files(run, file, errors, not_similar, not_identical)
+    One row for each compared file with the number of messages of each kind
+  column_stats(run, file, name, max_delta, unit, sml_delta, sml, row)
+    One row for each column with differences, see daisypy.test.result.ColumnStats
+'''
+import argparse
+import fnmatch
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+__all__ = [
+    'DriftStore',
+    'print_trends',
+]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    label TEXT,
+    program TEXT NOT NULL,
+    reference_dir TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    file TEXT NOT NULL,
+    errors INTEGER NOT NULL,
+    not_similar INTEGER NOT NULL,
+    not_identical INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS column_stats (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    file TEXT NOT NULL,
+    name TEXT NOT NULL,
+    max_delta REAL,
+    unit TEXT,
+    sml_delta REAL,
+    sml TEXT,
+    row INTEGER
+);
+CREATE INDEX IF NOT EXISTS column_stats_run ON column_stats (run, file);
+'''
+
+def main():
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(
+        description='Show how differences in dlf columns develop across runs of test_daisy'
+    )
+    parser.add_argument('db', type=str, help='Database written by test_daisy --drift-db')
+    parser.add_argument('--program', type=str, default=None,
+                        help='Only show runs of programs matching this pattern')
+    parser.add_argument('--file', type=str, default=None,
+                        help='Only show files matching this pattern')
+    parser.add_argument('--column', type=str, default=None,
+                        help='Only show columns matching this pattern')
+    parser.add_argument('--runs', type=int, default=10, help='Show the last RUNS runs')
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        print(f'ERROR: {args.db} does not exist', file=sys.stderr)
+        return 1
+    with DriftStore(args.db) as store:
+        for program, runs, trends in store.trends(args.program, args.file, args.column, args.runs):
+            print_trends(program, runs, trends)
+    return 0
+
+class DriftStore:
+    '''Append-only store of the differences found in each run
+
+    Can be used as a context manager that closes the database on exit.
+
+    Parameters
+    ----------
+    path: str
+      Path to the SQLite database. It is created if it does not exist. Several processes can
+      write to the same database.
+    '''
+    def __init__(self, path):
+        # Runs in a suite finish at about the same time, so wait for other writers
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        '''Close the database'''
+        self._connection.close()
+
+    def add_run(self, program, reference_dir, results, label=None):
+        '''Record the results of a run
+
+        Parameters
+        ----------
+        program, reference_dir: str
+          The program and reference directory of the run. Trends are shown for each program.
+
+        results: iterable of (str, daisypy.test.result.ComparisonResult)
+          Relative path and result of each compared file
+
+        label: str
+          Optional label of the run, e.g. the version of daisy
+
+        Returns
+        -------
+        Id of the run
+        '''
+        files = []
+        column_stats = []
+        for rel_path, result in results:
+            files.append((rel_path, *(len(messages) for messages in result)))
+            column_stats += [
+                (rel_path, stats.column, stats.max_delta, stats.unit, stats.sml_delta, stats.sml,
+                 stats.row)
+                for stats in getattr(result, 'column_stats', [])
+            ]
+        time = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self._connection:
+            run = self._connection.execute(
+                'INSERT INTO runs (time, label, program, reference_dir) VALUES (?, ?, ?, ?)',
+                (time, label, os.path.abspath(program), os.path.abspath(reference_dir))
+            ).lastrowid
+            self._connection.executemany(
+                'INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                ((run, *row) for row in files)
+            )
+            self._connection.executemany(
+                'INSERT INTO column_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((run, *row) for row in column_stats)
+            )
+        return run
+
+    def trends(self, program=None, file=None, column=None, max_runs=10):
+        '''Differences in each column across the last runs of each program
+
+        Parameters
+        ----------
+        program, file, column: str
+          Only include programs, files and columns matching these fnmatch patterns
+
+        max_runs: int
+          Number of runs to include for each program
+
+        Returns
+        -------
+        Iterator over (program, runs, trends) for each program
+          runs: list of (id, time, label) ordered from oldest to newest
+          trends: dict mapping (file, column) to a list with an entry for each run. The entry is
+            None if the file was not compared in the run, 0 if the column had no differences and
+            otherwise the largest difference in the unit of the SML if available. Only columns
+            with differences in at least one of the runs are included.
+          Columns are named "column [unit]" or "column [SML sml]" if the SML is used.
+        '''
+        programs = [
+            row[0] for row in self._connection.execute(
+                'SELECT DISTINCT program FROM runs ORDER BY program'
+            )
+        ]
+        for prog in programs:
+            if program is not None and not fnmatch.fnmatch(prog, program):
+                continue
+            runs = self._connection.execute(
+                'SELECT id, time, label FROM runs WHERE program = ? ORDER BY id DESC LIMIT ?',
+                (prog, max_runs)
+            ).fetchall()[::-1]
+            run_idx = {run[0] : i for i, run in enumerate(runs)}
+            placeholders = ', '.join('?' * len(runs))
+            compared = {}
+            for run, rel_path in self._connection.execute(
+                    f'SELECT run, file FROM files WHERE run IN ({placeholders})', list(run_idx)
+            ):
+                compared.setdefault(rel_path, set()).add(run_idx[run])
+            trends = {}
+            for run, rel_path, name, max_delta, unit, sml_delta, sml in self._connection.execute(
+                    'SELECT run, file, name, max_delta, unit, sml_delta, sml FROM column_stats '
+                    f'WHERE run IN ({placeholders}) ORDER BY file, name, run', list(run_idx)
+            ):
+                if file is not None and not fnmatch.fnmatch(rel_path, file):
+                    continue
+                if column is not None and not fnmatch.fnmatch(name, column):
+                    continue
+                if sml_delta is None:
+                    key = (rel_path, f'{name} [{unit}]')
+                else:
+                    key = (rel_path, f'{name} [SML {sml}]')
+                if key not in trends:
+                    trends[key] = [0 if i in compared[rel_path] else None
+                                   for i in range(len(runs))]
+                trends[key][run_idx[run]] = max_delta if sml_delta is None else sml_delta
+            yield prog, runs, trends
+
+def print_trends(program, runs, trends, out=None):
+    '''Print the result of DriftStore.trends for a program'''
+    out = sys.stdout if out is None else out
+    print(f'== {program} ==', file=out)
+    for i, (run, time, label) in enumerate(runs):
+        print(f'  {i}: run {run} at {time}' + ('' if label is None else f' ({label})'), file=out)
+    last_file = None
+    for (rel_path, column), values in trends.items():
+        if rel_path != last_file:
+            print(rel_path, file=out)
+            last_file = rel_path
+        formatted = ' | '.join('-' if value is None else f'{value:.4g}' for value in values)
+        print(f'\t{column}: {formatted}', file=out)
+    print(file=out)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+'''File helpers shared by the caches'''
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+__all__ = [
+    'atomic_write',
+    'evict_least_recently_used',
+    'file_digest',
+]
+
+def file_digest(path):
+    '''sha256 of the content of a file as a hex string'''
+    with open(path, 'rb') as infile:
+        return hashlib.file_digest(infile, 'sha256').hexdigest()
+
+@contextmanager
+def atomic_write(path, mode='w', suffix=''):
+    '''Write to a temporary file in the directory of path, which replaces path when the block exits
+
+    Readers never see a partially written file, and concurrent writers never leave one behind. If
+    the block raises, the temporary file is deleted and path is left unchanged.
+
+    Parameters
+    ----------
+    path: str
+      Path to write to
+
+    mode: str
+      'w' for text written as utf-8 or 'wb' for bytes
+
+    suffix: str
+      Suffix of the temporary file
+
+    Yields
+    ------
+    The temporary file opened with mode
+    '''
+    outfile = tempfile.NamedTemporaryFile(mode, encoding=None if 'b' in mode else 'utf-8',
+                                          dir=os.path.dirname(os.path.abspath(path)),
+                                          suffix=suffix, delete=False)
+    try:
+        with outfile:
+            yield outfile
+        os.replace(outfile.name, path)
+    except BaseException:
+        try:
+            os.remove(outfile.name)
+        except FileNotFoundError:
+            pass
+        raise
+
+def evict_least_recently_used(entries, max_bytes, remove, max_age_s=None):
+    '''Remove cache entries not used for max_age_s, then the least recently used entries until
+    the kept entries are below 90% of max_bytes, so the next entries do not trigger an eviction
+
+    Parameters
+    ----------
+    entries: iterable of (path, size, last use)
+      Entries of the cache. Last use is a time as returned by time.time()
+
+    max_bytes: int
+      Maximum size of the cache
+
+    remove: callable
+      Called with the path of each evicted entry, e.g. os.remove. OSError is ignored, since another
+      process may have removed the entry.
+
+    max_age_s: float
+      Evict entries that have not been used for this many seconds. None means no age limit.
+
+    Returns
+    -------
+    Total size of the kept entries
+    '''
+    now = time.time()
+    target = 0.9 * max_bytes
+    size = 0
+    full = False
+    for path, entry_size, last_use in sorted(entries, key=lambda entry: entry[2], reverse=True):
+        too_old = max_age_s is not None and now - last_use > max_age_s
+        full = full or size + entry_size > target
+        if too_old or full:
+            try:
+                remove(path)
+            except OSError:
+                pass
+        else:
+            size += entry_size
+    return size
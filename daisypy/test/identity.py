@@ -0,0 +1,98 @@
+'''Fast check for files that are identical for testing purposes
+
+Most generated files are identical to their reference apart from lines that are skipped by the
+comparison functions, e.g. the version in dlf headers. The functions here detect this by comparing
+raw bytes in large blocks, only falling back to line filtering for log files. They never report
+files as identical if the comparison functions could find a difference, but may report files as
+different when the comparison functions would not, in which case the files must be compared as
+usual.
+'''
+import mmap
+import os
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.dlf_reader import HEADER_BODY_SEP, default_header_lines_to_skip
+from daisypy.test.compare_log_files import log_files_identical
+
+__all__ = [
+    'files_identical',
+]
+
+BLOCK_SIZE = 1 << 24
+
+def files_identical(path1, path2, file_type):
+    '''Check if two files are identical when compared with the default settings of the comparison
+    function for file_type.
+
+    Parameters
+    ----------
+    path1, path2 : str
+      Paths to files
+
+    file_type: str
+      File extension, e.g. '.dlf'
+
+    Returns
+    -------
+    True if the files are identical. False if they might differ, or if they could not be read, in
+    which case the comparison function reports the error.
+    '''
+    try:
+        if file_type == '.dlf':
+            return _dlf_files_identical(path1, path2)
+        if _bytes_identical(path1, 0, path2, 0):
+            return True
+        if file_type == '.log':
+            return log_files_identical(path1, path2)
+    except (OSError, ValueError):
+        # E.g. unreadable files or log files that are not valid text
+        pass
+    return False
+
+def _dlf_files_identical(path1, path2):
+    with open(path1, 'rb') as file1, open(path2, 'rb') as file2:
+        header1 = _read_dlf_header_lines(file1)
+        header2 = _read_dlf_header_lines(file2)
+        if header1 != header2:
+            return False
+        return _bytes_identical(path1, file1.tell(), path2, file2.tell())
+
+def _read_dlf_header_lines(infile):
+    # Header lines that are not skipped. Keys are found the same way as in read_dlf_header
+    sep = HEADER_BODY_SEP.encode()
+    lines = []
+    for row in infile:
+        if row.startswith(sep):
+            break
+        row = row.strip()
+        if len(row) == 0:
+            continue
+        if b'\r' in row:
+            # A line break when read as text. Never skip it, so we do not need to split it
+            lines.append(row)
+            continue
+        if row[:3] == b'dlf':
+            # The info line also defines dlf-version and dlf-component, so it is only skipped if
+            # dlf-def-location and info are both skipped and the rest is unchanged
+            lines.append(row.split(b'(', maxsplit=1)[0].strip())
+            continue
+        key = row[:row.find(b':')].strip().decode('utf-8', errors='surrogateescape')
+        if key not in default_header_lines_to_skip:
+            lines.append(row)
+    return lines
+
+def _bytes_identical(path1, offset1, path2, offset2):
+    size1 = os.path.getsize(path1) - offset1
+    size2 = os.path.getsize(path2) - offset2
+    if size1 != size2:
+        return False
+    if size1 == 0:
+        return True
+    with open(path1, 'rb') as file1, open(path2, 'rb') as file2, \
+         mmap.mmap(file1.fileno(), 0, access=mmap.ACCESS_READ) as mm1, \
+         mmap.mmap(file2.fileno(), 0, access=mmap.ACCESS_READ) as mm2:
+        for start in range(0, size1, BLOCK_SIZE):
+            end = min(start + BLOCK_SIZE, size1)
+            if mm1[offset1 + start:offset1 + end] != mm2[offset2 + start:offset2 + end]:
+                return False
+    return True
@@ -0,0 +1,126 @@
+'''Bounded collection of comparison messages
+
+A badly broken run can differ on millions of lines. The comparison functions collect messages in a
+MessageList, which keeps at most max_messages messages and counts the rest, so memory use does not
+depend on the number of differences. Messages can be given a priority, in which case the messages
+with the highest priority are kept instead of the first ones, e.g. the columns with the largest
+differences.
+'''
+import heapq
+from collections import namedtuple
+
+__all__ = [
+    'ColumnStats',
+    'MessageList',
+    'ComparisonResult',
+]
+
+ColumnStats = namedtuple('ColumnStats',
+                         ['column', 'max_delta', 'unit', 'sml_delta', 'sml', 'row',
+                          'first_not_similar_row', 'not_similar_rows'],
+                         defaults=[None, None])
+ColumnStats.__doc__ = '''Largest difference in a column of a dlf file
+
+column: Name of the column
+max_delta: Largest absolute difference in the unit of the column
+unit: Unit of the column
+sml_delta: max_delta converted to the unit of the SML. None if the column has no SML.
+sml: The SML as a string or None
+row: Row of the reference file with the largest difference
+first_not_similar_row: First row of the reference file where the difference is larger than the SML,
+  or -1 if there is no such row. None unless rows were located, see compare_dlf_files.
+not_similar_rows: Number of rows where the difference is larger than the SML. None unless rows
+  were located.
+'''
+
+class MessageList:
+    '''List of messages that keeps at most max_messages messages
+
+    len() is the total number of messages appended. Iterating gives the kept messages in the order
+    they were appended.
+
+    Parameters
+    ----------
+    max_messages: int
+      Maximum number of messages to keep. None means no limit.
+    '''
+    def __init__(self, max_messages=None):
+        self.max_messages = max_messages
+        self.count = 0
+        # Min-heap of (priority, -sequence number, message). Among equal priorities the latest
+        # message is smallest, so the first messages are kept
+        self._heap = []
+
+    @classmethod
+    def from_messages(cls, messages, count=None, max_messages=None):
+        '''Create a list from kept messages and the total count, e.g. from a cached result'''
+        result = cls(max_messages)
+        for message in messages:
+            result.append(message)
+        if count is not None:
+            result.count = max(count, result.count)
+        return result
+
+    def append(self, message, priority=0.0):
+        '''Add a message. If the list is full, the message with the lowest priority is dropped.'''
+        self.count += 1
+        item = (priority, -self.count, message)
+        if self.max_messages is None or len(self._heap) < self.max_messages:
+            heapq.heappush(self._heap, item)
+        elif self.max_messages > 0:
+            heapq.heappushpop(self._heap, item)
+
+    def accepts(self, priority=0.0):
+        '''Check if a message with this priority would be kept. Used to avoid building messages
+        that are dropped anyway.'''
+        if self.max_messages is None or len(self._heap) < self.max_messages:
+            return True
+        return self.max_messages > 0 and priority > self._heap[0][0]
+
+    def drop(self):
+        '''Count a message without keeping it'''
+        self.count += 1
+
+    def extend(self, messages):
+        '''Add messages with the default priority'''
+        for message in messages:
+            self.append(message)
+
+    @property
+    def dropped(self):
+        '''Number of messages that were not kept'''
+        return self.count - len(self._heap)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (message for _, _, message in sorted(self._heap, key=lambda item: -item[1]))
+
+    def __repr__(self):
+        return f'MessageList({list(self)!r}, count={self.count})'
+
+class ComparisonResult:
+    '''Result of comparing two files
+
+    Unpacks to (errors, not_similar, not_identical) like the tuples returned by earlier versions of
+    the comparison functions. dlf comparisons also fill column_stats with a ColumnStats for each
+    column with differences, also when the differences are below the identity threshold.
+
+    Parameters
+    ----------
+    max_messages: int
+      Maximum number of messages to keep of each kind. None means no limit.
+    '''
+    def __init__(self, max_messages=None):
+        self.errors = MessageList(max_messages)
+        self.not_similar = MessageList(max_messages)
+        self.not_identical = MessageList(max_messages)
+        self.column_stats = []
+
+    def __iter__(self):
+        return iter((self.errors, self.not_similar, self.not_identical))
+
+    def __repr__(self):
+        return (f'ComparisonResult(errors={self.errors!r}, not_similar={self.not_similar!r}, '
+                f'not_identical={self.not_identical!r})')
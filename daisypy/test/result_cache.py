@@ -0,0 +1,140 @@
+'''Cache of comparison results keyed by the content of the compared files
+
+When neither a reference file nor the generated file changed since the last run, comparing them
+again gives the same result. Results are stored as json files named by a hash of the content of both
+files, the comparison function, its options and the version of the SML definitions. The least
+recently used results are evicted when the cache grows beyond its size limit.
+'''
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test._version import version
+from daisypy.test.files import atomic_write, evict_least_recently_used, file_digest
+from daisypy.test.result import ColumnStats, ComparisonResult, MessageList
+
+__all__ = [
+    'ResultCache',
+    'get_result_cache',
+]
+
+class ResultCache:
+    '''Cache of comparison results
+
+    Parameters
+    ----------
+    cache_dir: str
+      Directory to store results in. Can be shared between processes.
+
+    max_bytes: int
+      Maximum size of the cache. When exceeded, the least recently used results are evicted.
+    '''
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, path1, path2, comparator, options, sml_version):
+        '''Compute the cache key of a comparison
+
+        Parameters
+        ----------
+        path1, path2: str
+          Paths to the compared files
+
+        comparator: str
+          Name of the comparison function
+
+        options: dict
+          Options passed to the comparison function
+
+        sml_version: str
+          Version of the SML definitions
+
+        Returns
+        -------
+        str
+        '''
+        # pylint: disable=too-many-arguments
+        parts = [
+            version,
+            file_digest(path1),
+            file_digest(path2),
+            comparator,
+            json.dumps(options, sort_keys=True, default=str),
+            sml_version,
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        '''Get a stored result
+
+        Returns
+        -------
+        daisypy.test.result.ComparisonResult or None if key is not in the cache
+        '''
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as infile:
+                result = json.load(infile)
+            # Mark as recently used
+            os.utime(path)
+            cached = ComparisonResult()
+            cached.errors, cached.not_similar, cached.not_identical = (
+                MessageList.from_messages(result[kind]['messages'], result[kind]['count'])
+                for kind in ('errors', 'not_similar', 'not_identical')
+            )
+            cached.column_stats = [ColumnStats(*stats) for stats in result['column_stats']]
+            return cached
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, key, errors, not_similar, not_identical, column_stats=()):
+        '''Store a result. Messages are stored as strings together with the total number of
+        messages, which is larger if messages were dropped.'''
+        # pylint: disable=too-many-arguments
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        result = {
+            kind : {'messages' : [str(msg) for msg in messages], 'count' : len(messages)}
+            for kind, messages in (('errors', errors),
+                                   ('not_similar', not_similar),
+                                   ('not_identical', not_identical))
+        }
+        result['column_stats'] = list(column_stats)
+        with atomic_write(path) as outfile:
+            json.dump(result, outfile)
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._size = evict_least_recently_used(self._entries(), self.max_bytes, os.remove)
+
+    def _entries(self):
+        # (path, size, last use) of all results
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+@lru_cache(maxsize=None)
+def get_result_cache(cache_dir, max_bytes):
+    '''Get the result cache for a directory. The same object is returned for the same arguments, so
+    the cache size is tracked once per process.'''
+    return ResultCache(cache_dir, max_bytes)
@@ -0,0 +1,169 @@
+'''Cache of daisy output keyed by the daisy binary, the program and its inputs
+
+Running a daisy program takes minutes, while comparing its output takes seconds. When neither the
+daisy binary, the program nor the files it reads changed since the last run, the output from that
+run is reused. Outputs are stored as directories named by a hash of the content of the binary, the
+program and the input files. The least recently used outputs are evicted when the cache grows beyond
+its size limit or when they are older than the age limit.
+
+Input files are found by looking for quoted strings in the program that name existing files,
+relative to the current directory or one of the directories in the daisy path. Included .dai files
+are searched recursively. Files that are only found by daisy in other ways, e.g. in the daisy
+library directory, are not part of the key.
+'''
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.files import evict_least_recently_used, file_digest
+
+__all__ = [
+    'RunCache',
+]
+
+# Quoted strings in a daisy program. Escaped quotes are allowed inside strings
+string_pattern = re.compile(rb'"((?:[^"\\]|\\.)*)"')
+
+class RunCache:
+    '''Cache of daisy output directories
+
+    Parameters
+    ----------
+    cache_dir: str
+      Directory to store output in. Can be shared between processes.
+
+    max_bytes: int
+      Maximum size of the cache. When exceeded, the least recently used outputs are evicted.
+
+    max_age_s: float
+      Outputs that have not been used for this many seconds are evicted. None means no age limit.
+    '''
+    def __init__(self, cache_dir, max_bytes, max_age_s=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, daisy_args, program, search_path):
+        '''Compute the cache key of a daisy run
+
+        Parameters
+        ----------
+        daisy_args: list of str
+          Command line used to run daisy, without the output directory. The first element is the
+          daisy binary.
+
+        program: str
+          Path to the .dai file
+
+        search_path: str
+          Daisy path as passed to daisy with -D
+
+        Returns
+        -------
+        str
+        '''
+        binary = shutil.which(daisy_args[0]) or daisy_args[0]
+        parts = [
+            json.dumps(daisy_args),
+            file_digest(binary),
+            os.environ.get('DAISYHOME', ''),
+        ]
+        for path in program_inputs(program, search_path):
+            parts.append(f'{path} {file_digest(path)}')
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        '''Get a stored output
+
+        Returns
+        -------
+        (output directory, stdout, stderr) or None if key is not in the cache
+        '''
+        entry_dir = self._path(key)
+        try:
+            with open(os.path.join(entry_dir, 'run.json'), encoding='utf-8') as infile:
+                run = json.load(infile)
+            # Mark as recently used
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            return None
+        return os.path.join(entry_dir, 'output'), run['stdout'], run['stderr']
+
+    def put(self, key, output_dir, stdout=None, stderr=None):
+        '''Store a copy of output_dir. stdout and stderr are the captured output from daisy, if
+        any.'''
+        entry_dir = self._path(key)
+        if os.path.exists(entry_dir):
+            return
+        # Copy to a temporary directory and rename, so readers never see a partial output
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            shutil.copytree(output_dir, os.path.join(tmp_dir, 'output'))
+            with open(os.path.join(tmp_dir, 'run.json'), 'w', encoding='utf-8') as outfile:
+                json.dump({'stdout' : stdout, 'stderr' : stderr}, outfile)
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same output first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        evict_least_recently_used(self._entries(), self.max_bytes,
+                                  functools.partial(shutil.rmtree, ignore_errors=True),
+                                  self.max_age_s)
+
+    def _entries(self):
+        # (path, size, last use) of all outputs
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            try:
+                last_use = entry.stat().st_mtime
+                size = 0
+                for root, _, files in os.walk(entry.path):
+                    size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+            except OSError:
+                continue
+            yield entry.path, size, last_use
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+def program_inputs(program, search_path):
+    '''Find the files read by a daisy program
+
+    Parameters
+    ----------
+    program: str
+      Path to the .dai file
+
+    search_path: str
+      Daisy path as passed to daisy with -D. Directories are separated by os.pathsep.
+
+    Returns
+    -------
+    Sorted list of paths, including program
+    '''
+    directories = ['.'] + [d for d in search_path.split(os.pathsep) if d not in ('', '.')]
+    found = set()
+    todo = [os.path.normpath(program)]
+    while len(todo) > 0:
+        path = todo.pop()
+        if path in found:
+            continue
+        found.add(path)
+        if not path.endswith('.dai'):
+            continue
+        with open(path, 'rb') as infile:
+            content = infile.read()
+        for match in string_pattern.finditer(content):
+            name = match.group(1).decode('utf-8', errors='surrogateescape')
+            for directory in directories:
+                candidate = os.path.normpath(os.path.join(directory, name))
+                if os.path.isfile(candidate):
+                    todo.append(candidate)
+                    break
+    return sorted(found)
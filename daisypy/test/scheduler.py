@@ -0,0 +1,209 @@
+'''Run many daisy programs concurrently
+
+Programs are run as subprocesses from an asyncio event loop, at most jobs at a time and each with
+its own temporary output directory. Runs can be limited in time and memory. The wall time of a batch
+is often dominated by the slowest programs, so when a history of durations is given, the programs
+expected to take longest are started first and the history is updated with the new durations.
+'''
+import asyncio
+import json
+import locale
+import math
+import os
+import resource
+import signal
+import tempfile
+import time
+from collections import namedtuple
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.files import atomic_write
+
+__all__ = [
+    'DaisyRun',
+    'DurationHistory',
+    'kill_group',
+    'limit_memory',
+    'run_programs',
+]
+
+DaisyRun = namedtuple('DaisyRun',
+                      ['program', 'args', 'returncode', 'seconds', 'stdout', 'stderr', 'timed_out'])
+DaisyRun.__doc__ = '''Result of running a daisy program
+
+program: Path to the program
+args: Command line used to run daisy
+returncode: Exit status of daisy. Negative if daisy was killed by a signal, e.g. on timeout.
+seconds: Wall time of the run
+stdout, stderr: Output from daisy as str, or None if it was not captured
+timed_out: True if daisy was killed because it ran for too long
+'''
+
+class DurationHistory:
+    '''Durations of earlier runs, stored as json
+
+    Parameters
+    ----------
+    path: str
+      Path to the json file. It is created by save if it does not exist.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.durations = _load_durations(path)
+        self._recorded = {}
+
+    def order(self, items, key=os.path.abspath):
+        '''Sort items by expected duration, longest first. Items without a recorded duration come
+        first in their original order, since they might be long.
+
+        Parameters
+        ----------
+        items: iterable
+
+        key: callable
+          Maps an item to the key its duration is recorded under
+
+        Returns
+        -------
+        list
+        '''
+        return sorted(items, key=lambda item: -self.durations.get(key(item), math.inf))
+
+    def record(self, key, seconds):
+        '''Record the duration of a run'''
+        self.durations[key] = seconds
+        self._recorded[key] = seconds
+
+    def save(self):
+        '''Write the durations recorded since loading to the file, keeping durations recorded by
+        others in the meantime'''
+        durations = _load_durations(self.path)
+        durations.update(self._recorded)
+        with atomic_write(self.path) as outfile:
+            json.dump(durations, outfile, indent=1, sort_keys=True)
+
+def _load_durations(path):
+    try:
+        with open(path, encoding='utf-8') as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+def limit_memory(pid, max_bytes):
+    '''Limit the address space of a running process to max_bytes. Does nothing if max_bytes is None.
+
+    This is used instead of a preexec_fn, which is unsafe when the parent runs threads. The limit is
+    set just after the process is started, so it does not apply to what the process allocated
+    before that.'''
+    if max_bytes is None:
+        return
+    try:
+        resource.prlimit(pid, resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except ProcessLookupError:
+        pass
+
+def run_programs(daisy_binary, programs, path='.', jobs=None, timeout=None, memory_limit=None,
+                 history=None, on_done=None, capture_output=True, on_start=None):
+    '''Run daisy programs concurrently
+
+    Parameters
+    ----------
+    daisy_binary: str
+      Name of or path to the daisy binary
+
+    programs: list of str
+      Paths to the .dai files to run
+
+    path: str
+      Added to the daisy path with -D
+
+    jobs: int
+      Maximum number of programs to run at the same time. Default is the number of CPUs.
+
+    timeout: float
+      Kill daisy if a program runs for more than this many seconds
+
+    memory_limit: int
+      Limit the address space of each daisy process to this many bytes
+
+    history: DurationHistory
+      If not None, programs are started in order of expected duration, longest first, and the
+      durations are recorded. The caller must save the history.
+
+    on_done: callable
+      Called with the DaisyRun of each program as it finishes
+
+    capture_output: bool
+      If True the output from daisy is captured instead of being inherited
+
+    on_start: callable
+      Called with the program and the daisy command line just before daisy is started
+
+    Returns
+    -------
+    list of DaisyRun in the order of programs
+    '''
+    # pylint: disable=too-many-arguments
+    return asyncio.run(_run_programs(daisy_binary, programs, path, jobs, timeout, memory_limit,
+                                     history, on_done, capture_output, on_start))
+
+async def _run_programs(daisy_binary, programs, path, jobs, timeout, memory_limit, history,
+                        on_done, capture_output, on_start):
+    # pylint: disable=too-many-arguments
+    slots = asyncio.Semaphore(os.cpu_count() if jobs is None else jobs)
+
+    async def run(program):
+        async with slots:
+            result = await _run_program(daisy_binary, program, path, timeout, memory_limit,
+                                        capture_output, on_start)
+        if history is not None:
+            history.record(os.path.abspath(program), result.seconds)
+        if on_done is not None:
+            on_done(result)
+        return result
+
+    ordered = programs if history is None else history.order(programs)
+    # Tasks acquire the semaphore in the order they are created
+    results = await asyncio.gather(*(run(program) for program in ordered))
+    by_program = dict(zip(ordered, results))
+    return [by_program[program] for program in programs]
+
+async def _run_program(daisy_binary, program, path, timeout, memory_limit, capture_output,
+                       on_start):
+    # pylint: disable=too-many-arguments
+    pipe = asyncio.subprocess.PIPE if capture_output else None
+    with tempfile.TemporaryDirectory() as tmpdir:
+        args = [daisy_binary, '-q', '-d', tmpdir, '-D', path, program]
+        if on_start is not None:
+            on_start(program, args)
+        start = time.monotonic()
+        # Daisy runs in its own process group, so processes it spawns are killed with it
+        proc = await asyncio.create_subprocess_exec(*args, stdout=pipe, stderr=pipe,
+                                                    start_new_session=True)
+        limit_memory(proc.pid, memory_limit)
+        timed_out = False
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill_group(proc)
+            stdout, stderr = None, None
+            await proc.wait()
+        finally:
+            # Also stop daisy if we are cancelled, e.g. by KeyboardInterrupt
+            if proc.returncode is None:
+                kill_group(proc)
+        seconds = time.monotonic() - start
+    return DaisyRun(program, args, proc.returncode, seconds, _decode(stdout), _decode(stderr),
+                    timed_out)
+
+def kill_group(proc, sig=signal.SIGKILL):
+    '''Send sig to the process group of proc, which must be started with start_new_session=True,
+    so processes started by daisy are stopped too'''
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+def _decode(output):
+    return None if output is None else output.decode(locale.getencoding(), errors='replace')
@@ -0,0 +1,178 @@
+'''Long-lived comparison server
+
+Importing pandas and pint, building the unit registry and loading SML definitions takes much longer
+than comparing a typical file. The server does this once and then compares files on request from
+test_daisy --server, which does not import any of it.
+
+The protocol is one json object per line over a Unix socket. A request is
+  {"op" : "compare", "file_type" : ".dlf", "path1" : ..., "path2" : ..., "options" : {...}}
+  {"op" : "ping"}
+  {"op" : "shutdown"}
+and the response is
+  {"ok" : true, "result" : {"errors" : {"messages" : [...], "count" : n}, ...},
+   "column_stats" : [...], "warnings" : [...]}
+  {"ok" : false, "error" : "..."}
+Paths must be absolute, since the server does not share the working directory of the client.
+'''
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import warnings
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.test_daisy import compare_functions, get_compare_function
+from daisypy.test.sml import (
+    load_smallest_meaningful_level, set_sml_cache_dir, sml_paths
+)
+from daisypy.test.dlf_cache import set_dlf_cache_dir
+from daisypy.test.units import get_daisy_ureg
+
+__all__ = [
+    'serve',
+]
+
+def main():
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(
+        description='Serve file comparisons over a Unix socket for test_daisy --server'
+    )
+    parser.add_argument('socket', type=str, help='Path to the Unix socket to listen on')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Maximum number of comparisons to run at the same time')
+    parser.add_argument('--sml-cache-dir', type=str, default=None,
+                        help='Cache parsed SML definitions and unit conversions in this directory')
+    parser.add_argument('--dlf-cache-dir', type=str, default=None, help='''Store parsed reference
+    dlf files in a binary format in this directory''')
+    parser.add_argument('--shutdown', action='store_true',
+                        help='Ask the server listening on socket to shut down and exit')
+    args = parser.parse_args()
+
+    if args.shutdown:
+        # pylint: disable=import-outside-toplevel
+        from daisypy.test.client import request
+        request(args.socket, {'op' : 'shutdown'})
+        return 0
+    set_sml_cache_dir(args.sml_cache_dir)
+    set_dlf_cache_dir(args.dlf_cache_dir)
+    return serve(args.socket, args.jobs)
+
+def serve(socket_path, jobs):
+    '''Serve comparisons until a shutdown request, SIGTERM or SIGINT. Comparisons in progress are
+    finished before returning.
+
+    Parameters
+    ----------
+    socket_path: str
+      Path to the Unix socket to listen on
+
+    jobs: int
+      Maximum number of comparisons to run at the same time. Further requests wait.
+
+    Returns
+    -------
+    Exit status
+    '''
+    if os.path.exists(socket_path):
+        if _server_running(socket_path):
+            print(f'ERROR: A server is already listening on {socket_path}', file=sys.stderr)
+            return 1
+        # Left behind by a server that did not shut down cleanly
+        os.remove(socket_path)
+    _warm_up()
+    # Warnings are returned to the client with each result, so every warning must be shown
+    warnings.simplefilter('always')
+    warnings.showwarning = _show_warning
+    server = _Server(socket_path, _Handler)
+    server.slots = threading.BoundedSemaphore(jobs)
+
+    def stop(*_):
+        # shutdown waits for serve_forever to return, so it cannot be called from its thread
+        threading.Thread(target=server.shutdown).start()
+    server.stop = stop
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f'Listening on {socket_path}', flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        # Waits for requests in progress
+        server.server_close()
+        os.remove(socket_path)
+    return 0
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = False
+    block_on_close = True
+    slots = None
+    stop = None
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            response = self._respond(json.loads(self.rfile.readline()))
+        except Exception as e: # pylint: disable=broad-exception-caught
+            response = {'ok' : False, 'error' : f'{type(e).__name__}: {e}'}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    def _respond(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok' : True}
+        if op == 'shutdown':
+            self.server.stop()
+            return {'ok' : True}
+        if op != 'compare':
+            raise ValueError(f'Unknown op {op}')
+        with self.server.slots:
+            _local.warnings = []
+            try:
+                compare = get_compare_function(request['file_type'])
+                result = compare(request['path1'], request['path2'], **request['options'])
+                shown = _local.warnings
+            finally:
+                _local.warnings = None
+        return {
+            'ok' : True,
+            'result' : {
+                kind : {'messages' : [str(msg) for msg in messages], 'count' : len(messages)}
+                for kind, messages in zip(('errors', 'not_similar', 'not_identical'), result)
+            },
+            'column_stats' : result.column_stats,
+            'warnings' : shown,
+        }
+
+# Warnings shown while handling a request in the current thread
+_local = threading.local()
+
+def _show_warning(message, category, *_):
+    shown = getattr(_local, 'warnings', None)
+    if shown is None:
+        print(category.__name__, message, file=sys.stderr)
+    else:
+        shown.append(str(message))
+
+def _warm_up():
+    # Import the comparison modules and load all SML definitions
+    for file_type in compare_functions:
+        get_compare_function(file_type)
+    ureg = get_daisy_ureg()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for name in sml_paths:
+            load_smallest_meaningful_level({'dlf-component' : name}, ureg)
+
+def _server_running(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+if __name__ == '__main__':
+    sys.exit(main())
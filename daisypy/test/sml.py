@@ -1,12 +1,25 @@
 '''Smallest meaningful levels (SMLs) are used during testing. Differences less than 1 SML are
 considered irrelevant for testing purposes.'''
+import hashlib
+import json
 import os
 import tomllib
+from functools import lru_cache
 
 import pint
 
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.units import (
+    conversion_factor, dlf_unit_redefinitions, unit_registry
+)
+from daisypy.test.timing import timings
+from daisypy.test.files import atomic_write
+
 __all__ = [
-    'load_smallest_meaningful_level'
+    'load_smallest_meaningful_level',
+    'sml_conversion_factor',
+    'set_sml_cache_dir',
+    'sml_definition_version',
 ]
 
 
@@ -54,9 +67,32 @@ sml_paths = {
     'Colloids' : 'sml-definitions/colloids.toml',
 }
 
+# Directory of the on-disk cache. The cache is disabled if None
+_CACHE_DIR = None
+SML_CACHE_FILE_NAME = 'sml-cache.json'
+
+def set_sml_cache_dir(cache_dir):
+    '''Enable an on-disk cache of parsed SML definitions and unit conversion factors
+
+    The cache is shared between processes and runs. SML definitions are invalidated when the
+    definition file is modified and conversion factors are invalidated when the unit definitions
+    in daisypy.test.units change.
+
+    Parameters
+    ----------
+    cache_dir: str
+      Directory to store the cache in. If None the on-disk cache is disabled.
+    '''
+    global _CACHE_DIR # pylint: disable=global-statement
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    _CACHE_DIR = cache_dir
+
 def load_smallest_meaningful_level(header, ureg):
     '''Load smallest meaningful level (SML) definition.
 
+    Definitions are cached in memory, and on disk if enabled with set_sml_cache_dir.
+
     Parameters
     ----------
     header: dict
@@ -70,14 +106,100 @@ def load_smallest_meaningful_level(header, ureg):
     if 'chemical' in header['dlf-component'].lower() and 'CHEMICAL' in header:
         names.append(f"{header['dlf-component']} {header['CHEMICAL']}")
     names.append(header['dlf-component'])
+    return dict(_load_smallest_meaningful_level(tuple(names), ureg))
+
+def sml_conversion_factor(unit, sml, ureg):
+    '''Find the factor that converts values in a dlf unit to the units of an SML
+
+    Factors are cached in memory, and on disk if enabled with set_sml_cache_dir.
+
+    Parameters
+    ----------
+    unit: str
+      dlf unit specification
+
+    sml: pint.Quantity
+      SML as returned from load_smallest_meaningful_level
+
+    Returns
+    -------
+    float
+    '''
+    return _sml_conversion_factor(unit, str(sml.units), ureg)
+
+@lru_cache(maxsize=None)
+def _sml_conversion_factor(unit, sml_unit, ureg):
+    if _CACHE_DIR is None:
+        return conversion_factor(unit, sml_unit, ureg)
+    key = f'{unit}|{sml_unit}'
+    version = _unit_registry_version()
+    factors = _read_cache().get('conversion', {}).get(version, {})
+    if key not in factors:
+        factors[key] = conversion_factor(unit, sml_unit, ureg)
+        def update(cache):
+            cache.setdefault('conversion', {}).setdefault(version, {})[key] = factors[key]
+        _update_cache(update)
+    return factors[key]
+
+@lru_cache(maxsize=None)
+def sml_definition_version():
+    '''Hash of the SML definitions and unit definitions. Changes when a comparison using SMLs could
+    give a different result.
+
+    Returns
+    -------
+    str
+    '''
+    sha = hashlib.sha256(_unit_registry_version().encode('utf-8'))
+    for name, path in sorted(sml_paths.items()):
+        sha.update(f'{name}={path}\n'.encode('utf-8'))
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), path), 'rb') as infile:
+            sha.update(infile.read())
+    return sha.hexdigest()
+
+@lru_cache(maxsize=None)
+def _load_smallest_meaningful_level(names, ureg):
     for name in names:
         try:
             path = os.path.join(os.path.dirname(os.path.realpath(__file__)), sml_paths[name])
-            with open(path, 'rb') as infile:
-                sml = tomllib.load(infile)
-            for k, v in sml.items():
-                sml[k] = ureg(v)
-            return sml
+            with timings.phase('sml_load', name):
+                return _read_sml_file(path, ureg)
         except (KeyError, pint.UndefinedUnitError) as e:
             print(e)
     return {}
+
+def _read_sml_file(path, ureg):
+    if _CACHE_DIR is not None:
+        mtime = os.stat(path).st_mtime_ns
+        entry = _read_cache().get('sml', {}).get(path)
+        if entry is not None and entry['mtime'] == mtime:
+            return {
+                k : ureg.Quantity(magnitude, unit) for k, (magnitude, unit) in entry['sml'].items()
+            }
+    with open(path, 'rb') as infile:
+        sml = tomllib.load(infile)
+    for k, v in sml.items():
+        sml[k] = ureg(v)
+    if _CACHE_DIR is not None:
+        entry = {'mtime' : mtime, 'sml' : {k : (v.magnitude, str(v.units)) for k, v in sml.items()}}
+        _update_cache(lambda cache: cache.setdefault('sml', {}).update({path : entry}))
+    return sml
+
+@lru_cache(maxsize=None)
+def _unit_registry_version():
+    definitions = '\n'.join(unit_registry + [f'{k}={v}' for k, v in dlf_unit_redefinitions.items()])
+    return hashlib.sha256(definitions.encode('utf-8')).hexdigest()
+
+def _read_cache():
+    try:
+        with open(os.path.join(_CACHE_DIR, SML_CACHE_FILE_NAME), encoding='utf-8') as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+def _update_cache(update):
+    # Apply update to the current content and replace the file
+    cache = _read_cache()
+    update(cache)
+    with atomic_write(os.path.join(_CACHE_DIR, SML_CACHE_FILE_NAME)) as outfile:
+        json.dump(cache, outfile)
@@ -1,30 +1,38 @@
 '''Program for running daisy tests'''
 import argparse
+import contextlib
+import cProfile
+import csv
+import functools
+import importlib
+import json
 import os
-import shutil
+import resource
 import subprocess
 import sys
 import tempfile
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 #pylint: disable=import-error, no-name-in-module
-from daisypy.test.compare_dlf_files import compare_dlf_files
-from daisypy.test.compare_log_files import compare_log_files
-from daisypy.test.compare_gnuplot_files import compare_gnuplot_files
-from daisypy.test.compare_txt_files import compare_txt_files
+from daisypy.test.artifacts import artifact_policies, save_artifacts
+from daisypy.test.identity import files_identical
+from daisypy.test.result import ColumnStats, ComparisonResult
+from daisypy.test.timing import timings
 
 # Files where we only want to check that they exist without comparing their contents
 only_check_existence = {
     'SUCCESS', # Success indicator from spawn
 }
 
-# File types mapping to comparison functions.
-# File types that are not in this map are not compared
+# File types mapping to the modules and names of comparison functions.
+# File types that are not in this map are not compared. The modules are imported when a file type is
+# first compared, so we only import pandas and pint when they are needed.
 compare_functions = {
-    '.dlf' : compare_dlf_files,
-    '.log' : compare_log_files,
-    '.gnuplot' : compare_gnuplot_files,
-    '.txt' : compare_txt_files,
+    '.dlf' : ('daisypy.test.compare_dlf_files', 'compare_dlf_files'),
+    '.log' : ('daisypy.test.compare_log_files', 'compare_log_files'),
+    '.gnuplot' : ('daisypy.test.compare_gnuplot_files', 'compare_gnuplot_files'),
+    '.txt' : ('daisypy.test.compare_txt_files', 'compare_txt_files'),
 }
 
 def main():
@@ -37,109 +45,539 @@ def main():
     parser.add_argument('reference_dir', type=str, help='''Path to directory containing reference
     output files. All files in the directory will be compared against the generated log files''')
     parser.add_argument('out_dir', type=str, help='Output directory for errors')
+    add_comparison_arguments(parser)
+    args = parser.parse_args()
+
+    setup_warnings(args.no_warnings)
+    return run_test(args)
+
+def add_comparison_arguments(parser):
+    '''Add the arguments controlling how daisy is run and how output is compared'''
     parser.add_argument('--no-warnings', action='store_true',
                         help='If set do not emit warnings from SML comparisons')
+    parser.add_argument('--watch', action='store_true', help='''Compare dlf files while daisy
+    writes them and report files as soon as they are not similar''')
+    parser.add_argument('--watch-interval', type=float, default=5.0,
+                        help='Seconds between checks for new rows in watch mode')
+    parser.add_argument('--fail-fast', action='store_true', help='''Stop comparing at the first file
+    with errors or differences that are not similar. With --watch, stop daisy as soon as a dlf file
+    is not similar''')
+    parser.add_argument('--verdict-only', action='store_true', help='''Stop comparing a file at the
+    first difference that is not similar and only report that difference''')
     parser.add_argument('--sml-identity-threshold', type=float, default=0.001,
                         help='Consider two values identical if their difference is less than '
                         '`sml_identity_threshold` * sml')
     parser.add_argument('--default-float-epsilon', type=float, default=1e-8, help='''Pass numeric
     comparison if absolute difference is less than this value. Only used if no SML is defined''')
     parser.add_argument('--path', type=str, help='Add to path when running daisy', default='.')
-    args = parser.parse_args()
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Stop daisy if it runs for more than this many seconds')
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help='Limit the memory of the daisy process to this many bytes')
+    parser.add_argument('--align-time', action='store_true', help='''Match rows of dlf files on
+    their time instead of their position, so output covering different periods can be compared''')
+    parser.add_argument('--columns', type=str, nargs='+', default=None, help='''Only compare these
+    columns of dlf files. fnmatch patterns like "M @ *" are allowed''')
+    parser.add_argument('--sml-only', action='store_true',
+                        help='Only compare columns of dlf files that have an SML definition')
+    parser.add_argument('--artifacts', choices=artifact_policies, default='copy', help='''How
+    failing files and their references are stored in out_dir. "link" hard links them, "gzip" and
+    "zstd" compress them, and "diff" stores the header and the rows that differ of dlf files''')
+    parser.add_argument('--diff-report', choices=('csv', 'json'), default=None, help='''For each
+    column of a dlf file that is not similar, write the first row and the number of rows where it
+    is not similar and its largest difference to diff_<name>.csv or .json next to the copied
+    files''')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Compare dlf files in chunks of this many rows to bound memory use')
+    parser.add_argument('--max-diffs-per-file', type=int, default=1000, help='''Report at most this
+    many differences of each kind for a file. The largest differences are kept for dlf files and
+    the first ones for other files. Use -1 for no limit''')
+    parser.add_argument('--compare-jobs', type=int, default=1,
+                        help='Number of files to compare concurrently')
+    parser.add_argument('--compare-executor', choices=('thread', 'process'), default='thread',
+                        help='Compare files concurrently in threads or processes')
+    parser.add_argument('--server', type=str, default=None, help='''Compare files on the comparison
+    server listening on this Unix socket, see daisy_compare_server''')
+    parser.add_argument('--sml-cache-dir', type=str, default=None,
+                        help='Cache parsed SML definitions and unit conversions in this directory')
+    parser.add_argument('--dlf-cache-dir', type=str, default=None, help='''Store parsed reference
+    dlf files in a binary format in this directory, so they are not parsed again in later runs''')
+    parser.add_argument('--cache-dir', type=str, default=None, help='''Cache comparison results in
+    this directory. Files are only compared if their content or the comparison options changed''')
+    parser.add_argument('--cache-max-bytes', type=int, default=2**30,
+                        help='Maximum size of the result cache')
+    parser.add_argument('--run-cache-dir', type=str, default=None, help='''Cache daisy output in
+    this directory. Daisy is only run if the binary, the program or its input files changed''')
+    parser.add_argument('--run-cache-max-bytes', type=int, default=10 * 2**30,
+                        help='Maximum size of the run cache')
+    parser.add_argument('--run-cache-max-age-days', type=float, default=None,
+                        help='Evict cached daisy output that has not been used for this many days')
+    parser.add_argument('--drift-db', type=str, default=None, help='''Append the largest difference
+    in each column of the dlf files to this SQLite database, see daisy_drift''')
+    parser.add_argument('--drift-label', type=str, default=None,
+                        help='Label the run in the drift database, e.g. with the daisy version')
+    parser.add_argument('--timings-json', type=str, default=None, help='''Write wall time and CPU
+    time of each phase and the peak RSS of the process so far to this file''')
+    parser.add_argument('--profile', type=str, default=None, help='''Profile the comparison of each
+    file with cProfile and write the stats to <profile>/<file>.prof. With --compare-jobs, files are
+    compared in processes''')
 
-    if args.no_warnings:
+def setup_warnings(no_warnings, file=None):
+    '''Print warnings as "<category> <message>" to file (default stderr) or suppress them'''
+    if no_warnings:
         warnings.showwarning = lambda message, *args: message
     else:
         warnings.showwarning = lambda message, category, *args: \
-            print(category.__name__, message, file=sys.stderr)
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        daisy_args = [args.daisy_binary, '-q', '-d', tmpdir, '-D', args.path, args.program]
-        print(' '.join(daisy_args))
-        result = subprocess.run(daisy_args, check=False)
-        if result.returncode != 0:
-            print('ERROR: Daisy execution failed', file=sys.stderr)
+            print(category.__name__, message, file=sys.stderr if file is None else file)
+
+def run_test(args, out=None, err=None, capture_output=False):
+    '''Run args.program with daisy and compare the output against args.reference_dir
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+      Parsed arguments as defined in main
+
+    out, err: file-like
+      Where to print the report and error messages. Default is sys.stdout and sys.stderr
+
+    capture_output: bool
+      If True the output from daisy is captured and printed to out instead of being inherited
+
+    Returns
+    -------
+    Exit status. 1 if daisy failed or there are errors, +2 if something is not similar
+    '''
+    out = sys.stdout if out is None else out
+    err = sys.stderr if err is None else err
+    if args.artifacts == 'zstd':
+        # Fail before running daisy instead of when the first failing file is stored
+        try:
+            importlib.import_module('zstandard')
+        except ImportError:
+            print('ERROR: --artifacts zstd requires the zstandard package', file=err)
             return 1
-        errors, not_similar, not_identical = check_dir(args.reference_dir, None, tmpdir, args, [], [], [])
+    if args.sml_cache_dir is not None:
+        importlib.import_module('daisypy.test.sml').set_sml_cache_dir(args.sml_cache_dir)
+    if args.dlf_cache_dir is not None:
+        importlib.import_module('daisypy.test.dlf_cache').set_dlf_cache_dir(args.dlf_cache_dir)
+    if args.timings_json is not None:
+        timings.enable()
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_dir, stopped = run_daisy(args, tmpdir, out, capture_output, err)
+            if stopped is not None:
+                print('ERROR: Daisy was stopped at the first difference that is not similar',
+                      file=err)
+                for rel_path, _ in stopped:
+                    copy_artifacts(os.path.join(args.reference_dir, rel_path),
+                                   os.path.join(tmpdir, rel_path),
+                                   rel_path,
+                                   args.out_dir,
+                                   args.artifacts)
+                return print_report(*_report_lists(stopped), out)
+            if output_dir is None:
+                print('ERROR: Daisy execution failed', file=err)
+                return 1
+            results = None if args.drift_db is None else []
+            errors, not_similar, not_identical = check_dir(args.reference_dir, output_dir, args,
+                                                           results)
+            if results is not None:
+                with timings.phase('drift'):
+                    with importlib.import_module('daisypy.test.drift').DriftStore(
+                            args.drift_db
+                    ) as store:
+                        store.add_run(args.program, args.reference_dir, results, args.drift_label)
+            if args.fail_fast and (len(errors) > 0 or len(not_similar) > 0):
+                print('Stopped comparing at the first failing file', file=err)
+        return print_report(errors, not_similar, not_identical, out)
+    finally:
+        if args.timings_json is not None:
+            timings.write_json(args.timings_json,
+                               program=args.program,
+                               reference_dir=args.reference_dir)
+            timings.disable()
+
+def run_daisy(args, tmpdir, out, capture_output, err=None):
+    '''Run args.program with daisy, or reuse the output from an earlier run if args.run_cache_dir
+    is set and nothing changed since. Errors are printed to err, default sys.stderr.
+
+    Returns
+    -------
+    (output_dir, stopped)
+      output_dir: Directory with the output or None if daisy failed
+      stopped: None unless daisy was stopped in watch mode, see daisypy.test.watch.run_watched
+    '''
+    daisy_args = [args.daisy_binary, '-q', '-d', tmpdir, '-D', args.path, args.program]
+    cache, cache_key = None, None
+    if args.run_cache_dir is not None:
+        with timings.phase('run_cache'):
+            cache = importlib.import_module('daisypy.test.run_cache').RunCache(
+                args.run_cache_dir,
+                args.run_cache_max_bytes,
+                None if args.run_cache_max_age_days is None else args.run_cache_max_age_days * 86400
+            )
+            # The output directory changes between runs, so it is not part of the key
+            cache_key = cache.key(daisy_args[:2] + daisy_args[4:], args.program, args.path)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            output_dir, stdout, stderr = cached
+            print(f'Reusing output from {output_dir}', file=out, flush=True)
+            if capture_output and stdout is not None:
+                print(stdout, stderr, sep='', end='', file=out)
+            return output_dir, None
 
+    print(' '.join(daisy_args), file=out, flush=True)
+    stopped = None
+    with timings.phase('simulation') as record:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            if args.watch:
+                rel_paths = [p for p in collect_files(args.reference_dir) if p.endswith('.dlf')]
+                returncode, stdout, stderr, stopped = importlib.import_module(
+                    'daisypy.test.watch'
+                ).run_watched(daisy_args, args.reference_dir, tmpdir, rel_paths, args, out,
+                              capture_output)
+                result = subprocess.CompletedProcess(daisy_args, returncode, stdout, stderr)
+            else:
+                result = _run_in_session(daisy_args, capture_output, args.timeout,
+                                         args.memory_limit)
+        except subprocess.TimeoutExpired as e:
+            print(f'ERROR: Daisy was stopped after {args.timeout} s',
+                  file=sys.stderr if err is None else err)
+            if capture_output:
+                print(_text(e.stdout), _text(e.stderr), sep='', end='', file=out)
+            return None, None
+        if record is not None:
+            # Daisy runs in a child process, so its usage is not included in the phase
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record['children_cpu_s'] = (after.ru_utime + after.ru_stime
+                                        - children.ru_utime - children.ru_stime)
+            record['children_peak_rss_kib'] = after.ru_maxrss
+    if capture_output:
+        print(result.stdout, result.stderr, sep='', end='', file=out)
+    if stopped is not None:
+        return None, stopped
+    if result.returncode != 0:
+        return None, None
+    if cache is not None:
+        with timings.phase('run_cache_store'):
+            cache.put(cache_key, tmpdir, result.stdout, result.stderr)
+    return tmpdir, None
+
+def _run_in_session(daisy_args, capture_output, timeout, memory_limit):
+    # Like subprocess.run, but daisy runs in its own session, so processes it starts are killed
+    # with it on timeout. The memory limit is set after starting daisy, since a preexec_fn is unsafe
+    # when files are compared in threads
+    scheduler = importlib.import_module('daisypy.test.scheduler')
+    pipe = subprocess.PIPE if capture_output else None
+    with subprocess.Popen(daisy_args, stdout=pipe, stderr=pipe, text=True,
+                          start_new_session=True) as proc:
+        scheduler.limit_memory(proc.pid, memory_limit)
+        try:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            scheduler.kill_group(proc)
+            stdout, stderr = proc.communicate()
+            raise subprocess.TimeoutExpired(daisy_args, timeout, stdout, stderr) from None
+        except BaseException:
+            # Also stop daisy if we are interrupted, like subprocess.run does
+            scheduler.kill_group(proc)
+            raise
+    return subprocess.CompletedProcess(daisy_args, proc.returncode, stdout, stderr)
+
+def _text(output):
+    # Output attached to TimeoutExpired is bytes even when the process was run with text=True
+    if isinstance(output, bytes):
+        return output.decode(errors='replace')
+    return '' if output is None else output
+
+def print_report(errors, not_similar, not_identical, out=None):
+    '''Print the result of check_dir and return the exit status'''
+    out = sys.stdout if out is None else out
     status = 0
     if len(errors) > 0:
-        print('== Errors ==')
+        print('== Errors ==', file=out)
         for name, err in errors:
-            print(name, *errors, sep='\n\t', end='\n\n')
+            print(name, *_report_lines(err), sep='\n\t', end='\n\n', file=out)
         status += 1
 
     if len(not_similar) > 0:
-        print('== Not similar ==')
+        print('== Not similar ==', file=out)
         for name, not_sim in not_similar:
-            print(name, *not_sim, sep='\n\t', end='\n\n')
+            print(name, *_report_lines(not_sim), sep='\n\t', end='\n\n', file=out)
         status += 2
 
     if len(not_identical) > 0:
-        print('== Not identical ==')
+        print('== Not identical ==', file=out)
         for name, not_id in not_identical:
-            print(name, *not_id, sep='\n\t', end='\n\n')
+            print(name, *_report_lines(not_id), sep='\n\t', end='\n\n', file=out)
     return status
 
-def check_dir(path, rel_path, tmpdir, args, errors, not_similar, not_identical):
-    for entry in os.scandir(path):
-        if entry.is_dir():
-            if rel_path is None:
-                sub_rel_path = entry.name
-            else:
-                sub_rel_path = os.path.join(rel_path, entry.name)
-            errors, not_similar, not_identical = check_dir(entry.path, sub_rel_path, tmpdir, args, errors, not_similar, not_identical)
-        if entry.is_file():
-            errors, not_similar, not_identical = check_file_entry(entry, rel_path, tmpdir, args, errors, not_similar, not_identical)
-    return errors, not_similar, not_identical
+def _report_lines(messages):
+    # Messages followed by the number of messages that were dropped by a MessageList
+    yield from messages
+    dropped = getattr(messages, 'dropped', 0)
+    if dropped > 0:
+        yield f'... and {dropped} more'
 
+def check_dir(path, tmpdir, args, results=None):
+    '''Compare all files in path against the files with the same relative path in tmpdir.
 
-def check_file_entry(entry, rel_path, tmpdir, args, errors, not_similar, not_identical):
-    if rel_path is None:
-        rel_path = entry.name
-        out_dir = args.out_dir
-    else:
-        out_dir = os.path.join(args.out_dir, rel_path)
-        rel_path = os.path.join(rel_path, entry.name)
-    new_file_path = os.path.join(tmpdir, rel_path)
-    if not os.path.exists(new_file_path):
-        errors.append((rel_path, [f'{new_file_path} does not exist']))
+    Files are compared concurrently if args.compare_jobs > 1. Results are always in path order.
+    If args.fail_fast is set, files after the first failing file are not compared.
+
+    Parameters
+    ----------
+    path: str
+      Directory with reference files
+
+    tmpdir: str
+      Directory with generated files
+
+    args: argparse.Namespace
+      Parsed arguments as defined in main
+
+    results: list
+      If not None, (relative path, daisypy.test.result.ComparisonResult) of each compared file is
+      appended
+
+    Returns
+    -------
+    (errors, not_similar, not_identical)
+      Each a list of (relative path, list of messages) for the files with messages
+    '''
+    rel_paths = collect_files(path)
+    compared = []
+    if args.compare_jobs > 1 and len(rel_paths) > 1:
+        # Since Python 3.12 only one profiler can be active in a process, so profiled comparisons
+        # are always run in processes
+        in_process = args.compare_executor == 'process' or args.profile is not None
+        if in_process:
+            executor = ProcessPoolExecutor(max_workers=args.compare_jobs)
+            # Phases are recorded in the worker processes and sent back with the results
+            check = functools.partial(_check_file_in_process,
+                                      start=timings.start if timings.enabled else None)
+        else:
+            executor = ThreadPoolExecutor(max_workers=args.compare_jobs)
+            check = check_file
+        with executor:
+            futures = [
+                executor.submit(check, path, rel_path, tmpdir, args) for rel_path in rel_paths
+            ]
+            for rel_path, future in zip(rel_paths, futures):
+                result = future.result()
+                if in_process:
+                    result, records = result
+                    timings.extend(records)
+                compared.append((rel_path, result))
+                if args.fail_fast and _failing(compared[-1][1]):
+                    executor.shutdown(cancel_futures=True)
+                    break
     else:
-        if entry.name in only_check_existence:
-            return errors, not_similar, not_identical
-        file_type = os.path.splitext(entry.name)[-1]
-        if not file_type in compare_functions:
-            warnings.warn(f'Skipping file type {file_type}')
-            return errors, not_similar, not_identical
-        failed = False
-        try:
-            err, not_sim, not_id = compare_functions[file_type](
-                entry.path,
-                new_file_path,
-                precision=args.default_float_epsilon,
-                sml_identity_threshold=args.sml_identity_threshold
-            )
-        except Exception as e:
-            err = [f'Exception while comparing: {e}']
-            not_sim = []
-            not_id = []
-            failed = True
+        for rel_path in rel_paths:
+            compared.append((rel_path, check_file(path, rel_path, tmpdir, args)))
+            if args.fail_fast and _failing(compared[-1][1]):
+                break
+
+    if results is not None:
+        results += compared
+    return _report_lists(compared)
+
+def _failing(result):
+    err, not_sim, _ = result
+    return len(err) > 0 or len(not_sim) > 0
+
+def _report_lists(results):
+    # Split (relative path, (errors, not_similar, not_identical)) into lists of messages by kind
+    errors, not_similar, not_identical = [], [], []
+    for rel_path, (err, not_sim, not_id) in results:
         if len(err) > 0:
             errors.append((rel_path, err))
-            failed = True
         if len(not_sim) > 0:
             not_similar.append((rel_path, not_sim))
-            failed = True
         if len(not_id) > 0:
             not_identical.append((rel_path, not_id))
-            failed = True
-        if failed:
-            os.makedirs(out_dir, exist_ok=True)
-            error_file_path = os.path.join(out_dir, f'error_{entry.name}')
-            ref_file_path = os.path.join(out_dir, f'ref_{entry.name}')
-            shutil.copy(new_file_path, error_file_path)
-            shutil.copy(entry.path, ref_file_path)
     return errors, not_similar, not_identical
 
+def collect_files(path, rel_path=None):
+    '''Find all files below path
+
+    Returns
+    -------
+    Sorted list of paths relative to path
+    '''
+    files = []
+    for entry in os.scandir(path):
+        sub_rel_path = entry.name if rel_path is None else os.path.join(rel_path, entry.name)
+        if entry.is_dir():
+            files += collect_files(entry.path, sub_rel_path)
+        if entry.is_file():
+            files.append(sub_rel_path)
+    return sorted(files)
+
+def _check_file_in_process(path, rel_path, tmpdir, args, start):
+    # check_file in a worker process. Returns the result and the timing records of the file, which
+    # are empty unless start is the start of the enabled timings in the parent
+    if start is None:
+        # A forked worker inherits the state of the parent
+        timings.disable()
+        return check_file(path, rel_path, tmpdir, args), []
+    timings.enable(start)
+    try:
+        return check_file(path, rel_path, tmpdir, args), timings.records
+    finally:
+        timings.disable()
+
+def check_file(path, rel_path, tmpdir, args):
+    '''Compare a reference file against the generated file with the same relative path. If they
+    differ, both files are copied to the corresponding directory under args.out_dir.
+
+    Parameters
+    ----------
+    path: str
+      Directory with reference files
+
+    rel_path: str
+      Path of file relative to path
+
+    tmpdir: str
+      Directory with generated files
+
+    args: argparse.Namespace
+      Parsed arguments as defined in main
+
+    Returns
+    -------
+    daisypy.test.result.ComparisonResult, which unpacks to (errors, not_similar, not_identical)
+    '''
+    ref_file_path = os.path.join(path, rel_path)
+    new_file_path = os.path.join(tmpdir, rel_path)
+    name = os.path.basename(rel_path)
+    result = ComparisonResult()
+    if not os.path.exists(new_file_path):
+        result.errors.append(f'{new_file_path} does not exist')
+        return result
+    if name in only_check_existence:
+        return result
+    file_type = os.path.splitext(name)[-1]
+    if not file_type in compare_functions:
+        warnings.warn(f'Skipping file type {file_type}')
+        return result
+    with timings.phase('identity', rel_path):
+        identical = files_identical(ref_file_path, new_file_path, file_type)
+    if identical:
+        return result
+    options = {
+        'precision' : args.default_float_epsilon,
+        'sml_identity_threshold' : args.sml_identity_threshold,
+        'chunk_size' : args.chunk_size,
+        'max_messages' : None if args.max_diffs_per_file < 0 else args.max_diffs_per_file,
+        'verdict_only' : args.verdict_only,
+        'align_time' : args.align_time,
+        'columns' : args.columns,
+        'sml_only' : args.sml_only,
+        'locate_rows' : args.diff_report is not None,
+    }
+    cache, cache_key, cached = None, None, None
+    if args.cache_dir is not None:
+        with timings.phase('cache', rel_path):
+            cache, cache_key = _result_cache_key(args, ref_file_path, new_file_path, file_type,
+                                                 options)
+            cached = cache.get(cache_key)
+    if cached is not None:
+        result = cached
+    else:
+        profiler = contextlib.nullcontext() if args.profile is None else cProfile.Profile()
+        try:
+            if args.server is None:
+                compare = get_compare_function(file_type)
+            else:
+                compare = functools.partial(
+                    importlib.import_module('daisypy.test.client').compare_remote,
+                    args.server,
+                    file_type
+                )
+            with timings.phase('compare', rel_path), profiler:
+                result = compare(ref_file_path, new_file_path, **options)
+            if cache is not None and len(result.errors) == 0:
+                # Errors are not cached, because they are usually caused by the environment
+                cache.put(cache_key, *result, result.column_stats)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            result = ComparisonResult()
+            result.errors.append(f'Exception while comparing: {e}')
+    if args.profile is not None and cached is None:
+        profile_path = os.path.join(args.profile, f'{rel_path}.prof')
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        profiler.dump_stats(profile_path)
+    if any(len(messages) > 0 for messages in result):
+        copy_artifacts(ref_file_path, new_file_path, rel_path, args.out_dir, args.artifacts)
+        if args.diff_report is not None:
+            write_diff_report(result.column_stats, rel_path, args.out_dir, args.diff_report)
+    return result
+
+def copy_artifacts(ref_file_path, new_file_path, rel_path, out_dir, policy='copy'):
+    '''Store a generated file and its reference in the directory of rel_path under out_dir as
+    error_<name> and ref_<name>. policy is one of daisypy.test.artifacts.artifact_policies.'''
+    with timings.phase('copy', rel_path):
+        out_dir = os.path.join(out_dir, os.path.dirname(rel_path))
+        os.makedirs(out_dir, exist_ok=True)
+        save_artifacts(ref_file_path, new_file_path, out_dir, os.path.basename(rel_path), policy)
+
+def write_diff_report(column_stats, rel_path, out_dir, report_format):
+    '''Write the statistics of the columns that are not similar to the directory of rel_path under
+    out_dir as diff_<name>.csv or diff_<name>.json. Nothing is written if no column is not similar.
+
+    Parameters
+    ----------
+    column_stats: list of daisypy.test.result.ColumnStats
+      Statistics with located rows, see daisypy.test.compare_dlf_files.compare_dlf_files
+
+    rel_path: str
+      Path of the compared file relative to the reference directory
+
+    out_dir: str
+      Output directory for errors
+
+    report_format: str
+      'csv' or 'json'
+    '''
+    failing = [stats._asdict() for stats in column_stats if stats.not_similar_rows]
+    if len(failing) == 0:
+        return
+    name = os.path.basename(rel_path)
+    path = os.path.join(out_dir, os.path.dirname(rel_path), f'diff_{name}.{report_format}')
+    with timings.phase('report', rel_path):
+        with open(path, 'w', encoding='utf-8', newline='') as outfile:
+            if report_format == 'json':
+                json.dump(failing, outfile, indent=1)
+            else:
+                writer = csv.DictWriter(outfile, fieldnames=ColumnStats._fields)
+                writer.writeheader()
+                writer.writerows(failing)
+
+def _result_cache_key(args, ref_file_path, new_file_path, file_type, options):
+    # pylint: disable=too-many-arguments
+    cache = importlib.import_module('daisypy.test.result_cache').get_result_cache(
+        args.cache_dir, args.cache_max_bytes
+    )
+    # Only dlf comparisons use SMLs, so we avoid loading pint for other file types
+    if file_type == '.dlf':
+        sml_version = importlib.import_module('daisypy.test.sml').sml_definition_version()
+    else:
+        sml_version = ''
+    module, name = compare_functions[file_type]
+    key = cache.key(ref_file_path, new_file_path, f'{module}.{name}', options, sml_version)
+    return cache, key
+
+def get_compare_function(file_type):
+    '''Get the comparison function for a file type. Raises KeyError if the file type is unknown'''
+    module, name = compare_functions[file_type]
+    if module not in sys.modules:
+        with timings.phase('import', module):
+            importlib.import_module(module)
+    # import_module waits if another thread is importing the module
+    return getattr(importlib.import_module(module), name)
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -0,0 +1,220 @@
+'''Program for running a suite of daisy tests in parallel'''
+import argparse
+import copy
+import io
+import os
+import sys
+import time
+import tomllib
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.test_daisy import add_comparison_arguments, setup_warnings, run_test
+from daisypy.test.scheduler import DurationHistory
+
+__all__ = [
+    'load_suite',
+    'run_suite',
+]
+
+def main():
+    # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(
+        description='Run a suite of daisy programs and compare generated output against references'
+    )
+    parser.add_argument('daisy_binary', type=str, help='Name of or path to the daisy binary')
+    parser.add_argument('suite', type=str, help='''Path to a suite manifest (.toml) or a directory.
+    A directory is searched for .dai files, each one using the sibling directory with the same name
+    as reference, i.e. `<suite>/<name>.dai` is compared against `<suite>/<name>/`''')
+    parser.add_argument('out_dir', type=str, help='''Output directory for errors. Scenarios without
+    an explicit out_dir write to `<out_dir>/<name>`''')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of scenarios to run in parallel')
+    parser.add_argument('--report', type=str, default=None,
+                        help='Also write the full report, in suite order, to this file')
+    parser.add_argument('--durations', type=str, default=None, help='''Record the duration of each
+    scenario in this json file and start the scenarios that took longest in earlier runs first''')
+    add_comparison_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = load_suite(args.suite, args)
+    if len(scenarios) == 0:
+        print(f'ERROR: No scenarios found in {args.suite}', file=sys.stderr)
+        return 1
+    history = None if args.durations is None else DurationHistory(args.durations)
+    status = run_suite(scenarios, args.jobs, args.report, args.fail_fast, history)
+    if history is not None:
+        history.save()
+    return status
+
+def load_suite(path, args):
+    '''Load scenarios from a manifest file or a directory
+
+    A manifest is a toml file with a list of scenarios
+      [[scenario]]
+      program = "programs/test-N.dai"
+      reference_dir = "reference/test-N"
+      name = "test-N"          # Optional, defaults to the stem of program
+      out_dir = "errors/test-N" # Optional, defaults to <args.out_dir>/<name>
+      path = "programs"         # Optional, defaults to args.path
+    Relative paths are relative to the directory containing the manifest. Names are made unique by
+    adding -2, -3, ... to later scenarios with the same name.
+
+    Parameters
+    ----------
+    path: str
+      Path to manifest or directory
+
+    args: argparse.Namespace
+      Default arguments shared by all scenarios
+
+    Returns
+    -------
+    list of argparse.Namespace, one for each scenario
+    '''
+    if os.path.isdir(path):
+        entries = []
+        for entry in sorted(os.scandir(path), key=lambda e: e.name):
+            name, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext == '.dai' and os.path.isdir(os.path.join(path, name)):
+                entries.append({'program' : entry.name, 'reference_dir' : name})
+    else:
+        with open(path, 'rb') as infile:
+            entries = tomllib.load(infile).get('scenario', [])
+        path = os.path.dirname(path)
+
+    scenarios = []
+    names = set()
+    for entry in entries:
+        scenario = copy.copy(args)
+        scenario.program = os.path.join(path, entry['program'])
+        scenario.reference_dir = os.path.join(path, entry['reference_dir'])
+        scenario.name = _unique_name(
+            entry.get('name', os.path.splitext(os.path.basename(entry['program']))[0]), names
+        )
+        if 'out_dir' in entry:
+            scenario.out_dir = os.path.join(path, entry['out_dir'])
+        else:
+            scenario.out_dir = os.path.join(args.out_dir, scenario.name)
+        if 'path' in entry:
+            scenario.path = os.path.join(path, entry['path'])
+        if args.timings_json is not None:
+            root, ext = os.path.splitext(args.timings_json)
+            scenario.timings_json = f'{root}-{scenario.name}{ext}'
+        if args.profile is not None:
+            scenario.profile = os.path.join(args.profile, scenario.name)
+        scenarios.append(scenario)
+    return scenarios
+
+def _unique_name(name, names):
+    # The name is used for output paths, so scenarios must not share it, e.g. when programs in
+    # different directories have the same stem
+    unique, i = name, 1
+    while unique in names:
+        i += 1
+        unique = f'{name}-{i}'
+    names.add(unique)
+    return unique
+
+def run_suite(scenarios, jobs, report_path=None, fail_fast=False, history=None):
+    '''Run scenarios on a pool of jobs processes. Results are printed as scenarios finish.
+
+    Parameters
+    ----------
+    scenarios: list of argparse.Namespace
+      Scenarios as returned by load_suite
+
+    jobs: int
+      Maximum number of scenarios to run at the same time
+
+    report_path: str
+      If not None, write the report for all scenarios in suite order to this file
+
+    fail_fast: bool
+      If True, scenarios that have not started when a scenario fails are not run
+
+    history: daisypy.test.scheduler.DurationHistory
+      If not None, scenarios are started in order of expected duration, longest first, and the
+      durations are recorded. The caller must save the history.
+
+    Returns
+    -------
+    Exit status. Bitwise or of the exit status of all scenarios
+    '''
+    # pylint: disable=too-many-locals
+    order = list(range(len(scenarios)))
+    if history is not None:
+        order = history.order(order, key=lambda i: _duration_key(scenarios[i]))
+    results = {}
+    # Scenarios are submitted as workers become free, because the pool moves submitted work to its
+    # workers before it starts, and such work can not be cancelled when failing fast
+    waiting = iter(order)
+    futures = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        def submit_next():
+            i = next(waiting, None)
+            if i is not None:
+                futures[executor.submit(run_scenario, scenarios[i])] = i
+        for _ in range(jobs):
+            submit_next()
+        while len(futures) > 0:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                try:
+                    status, report, seconds = future.result()
+                    if history is not None:
+                        history.record(_duration_key(scenarios[i]), seconds)
+                except Exception as e: # pylint: disable=broad-exception-caught
+                    status, report = 1, f'ERROR: Exception while running scenario: {e}\n'
+                results[i] = (status, report)
+                verdict = 'FAILED' if status != 0 else 'OK'
+                print(f'==== {scenarios[i].name}: {verdict} ====', report, sep='\n', flush=True)
+                if fail_fast and status != 0:
+                    waiting = iter(())
+                submit_next()
+
+    status = 0
+    failed = []
+    for i, scenario in enumerate(scenarios):
+        if i not in results:
+            continue
+        scenario_status = results[i][0]
+        status |= scenario_status
+        if scenario_status != 0:
+            failed.append(scenario.name)
+    passed = len(results) - len(failed)
+    print(f'==== {passed} of {len(scenarios)} scenarios passed ====')
+    if len(failed) > 0:
+        print('Failed:', *failed, sep='\n\t')
+    not_run = [scenario.name for i, scenario in enumerate(scenarios) if i not in results]
+    if len(not_run) > 0:
+        print('Not run:', *not_run, sep='\n\t')
+
+    if report_path is not None:
+        with open(report_path, 'w', encoding='utf-8') as outfile:
+            for i, scenario in enumerate(scenarios):
+                if i not in results:
+                    continue
+                scenario_status, report = results[i]
+                print(f'==== {scenario.name}: status {scenario_status} ====', report, sep='\n',
+                      file=outfile)
+    return status
+
+def run_scenario(args):
+    '''Run a single scenario and return the exit status, the report as a string and the wall time
+    in seconds'''
+    out = io.StringIO()
+    start = time.monotonic()
+    with warnings.catch_warnings():
+        setup_warnings(args.no_warnings, out)
+        status = run_test(args, out=out, err=out, capture_output=True)
+    return status, out.getvalue(), time.monotonic() - start
+
+def _duration_key(scenario):
+    # A program can be used in several scenarios with different references
+    return f'{os.path.abspath(scenario.program)}:{os.path.abspath(scenario.reference_dir)}'
+
+if __name__ == '__main__':
+    sys.exit(main())
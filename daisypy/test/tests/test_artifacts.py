@@ -0,0 +1,76 @@
+'''Tests of daisypy.test.artifacts'''
+import gzip
+import os
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.artifacts import save_artifacts
+
+HEADER = 'dlf-0.0 -- test\n\n--------------------\nyear\tx\n\tkg/ha\n'
+
+@pytest.fixture(name='files')
+def fixture_files(tmp_path):
+    '''A reference dlf file and a generated file where row 2 differs and row 5 is missing'''
+    rows = [f'{2000 + i}\t{i}.0\n' for i in range(6)]
+    ref = tmp_path / 'ref.dlf'
+    new = tmp_path / 'new.dlf'
+    ref.write_text(HEADER + ''.join(rows), encoding='utf-8')
+    new.write_text(HEADER + ''.join(rows[:2] + ['2002\t2.5\n'] + rows[3:5]), encoding='utf-8')
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    return ref, new, out_dir
+
+@pytest.mark.parametrize('policy', ['copy', 'link'])
+def test_copy_and_link(files, policy):
+    '''Both files are stored with their content, and links share the original file'''
+    ref, new, out_dir = files
+    ref_path, error_path = save_artifacts(ref, new, out_dir, 'a.dlf', policy)
+    assert (ref_path, error_path) == (str(out_dir / 'ref_a.dlf'), str(out_dir / 'error_a.dlf'))
+    with open(ref_path, 'rb') as ref_file, open(error_path, 'rb') as error_file:
+        assert (ref_file.read(), error_file.read()) == (ref.read_bytes(), new.read_bytes())
+    assert os.path.samefile(ref_path, ref) == (policy == 'link')
+
+def test_link_replaced_not_written_through(files):
+    '''Storing again replaces an earlier link instead of overwriting the file it links to'''
+    ref, new, out_dir = files
+    save_artifacts(ref, new, out_dir, 'a.dlf', 'link')
+    content = ref.read_bytes()
+    save_artifacts(new, new, out_dir, 'a.dlf', 'copy')
+    assert ref.read_bytes() == content
+    assert (out_dir / 'ref_a.dlf').read_bytes() == new.read_bytes()
+
+def test_gzip(files):
+    '''Compressed files get a .gz suffix and decompress to the original content'''
+    ref, new, out_dir = files
+    ref_path, error_path = save_artifacts(ref, new, out_dir, 'a.dlf', 'gzip')
+    assert error_path == str(out_dir / 'error_a.dlf.gz')
+    with gzip.open(ref_path, 'rb') as ref_file, gzip.open(error_path, 'rb') as error_file:
+        assert (ref_file.read(), error_file.read()) == (ref.read_bytes(), new.read_bytes())
+
+def test_diff(files):
+    '''Only the header and the rows that differ of dlf files are stored'''
+    ref, new, out_dir = files
+    ref_path, error_path = save_artifacts(ref, new, out_dir, 'a.dlf', 'diff')
+    with open(ref_path, encoding='utf-8') as ref_file:
+        assert ref_file.read() == HEADER + '2002\t2.0\n2005\t5.0\n'
+    with open(error_path, encoding='utf-8') as error_file:
+        assert error_file.read() == HEADER + '2002\t2.5\n'
+
+def test_diff_copies_other_files(tmp_path):
+    '''Files that are not dlf files are copied with the diff policy'''
+    ref, new = tmp_path / 'ref.log', tmp_path / 'new.log'
+    ref.write_text('a\n', encoding='utf-8')
+    new.write_text('b\n', encoding='utf-8')
+    _, error_path = save_artifacts(ref, new, tmp_path, 'daisy.log', 'diff')
+    with open(error_path, encoding='utf-8') as error_file:
+        assert error_file.read() == 'b\n'
+
+def test_zstd(files):
+    '''Files compressed with zstd get a .zst suffix and decompress to the original content'''
+    zstandard = pytest.importorskip('zstandard')
+    ref, new, out_dir = files
+    _, error_path = save_artifacts(ref, new, out_dir, 'a.dlf', 'zstd')
+    assert error_path == str(out_dir / 'error_a.dlf.zst')
+    with open(error_path, 'rb') as error_file:
+        assert zstandard.ZstdDecompressor().stream_reader(error_file).read() == new.read_bytes()
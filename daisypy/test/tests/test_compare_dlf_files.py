@@ -0,0 +1,114 @@
+'''Tests of daisypy.test.compare_dlf_files on synthetic dlf files'''
+import pandas as pd
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench.synthetic import write_dlf
+from daisypy.test.compare_dlf_files import _time_keys, compare_dlf_files
+
+def _messages(result):
+    return [list(messages) for messages in result]
+
+def _swap_columns(path, i, j):
+    '''Swap column i and j in the body of a dlf file, including names and units'''
+    with open(path, encoding='utf-8') as infile:
+        lines = infile.read().split('\n')
+    start = lines.index('--------------------') + 1
+    for k in range(start, len(lines)):
+        if len(lines[k]) > 0:
+            fields = lines[k].split('\t')
+            fields[i], fields[j] = fields[j], fields[i]
+            lines[k] = '\t'.join(fields)
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write('\n'.join(lines))
+
+@pytest.fixture(name='dlf_pair')
+def fixture_dlf_pair(tmp_path):
+    '''A reference dlf file and a file with a few differences that are not similar'''
+    ref = tmp_path / 'ref.dlf'
+    new = tmp_path / 'new.dlf'
+    write_dlf(ref, 200, columns=12, seed=0, change_every=10)
+    write_dlf(new, 200, columns=12, seed=1, change_every=10)
+    return str(ref), str(new)
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1000])
+def test_chunked_equals_full(dlf_pair, chunk_size):
+    '''Comparing in chunks gives the same messages and statistics as comparing full bodies'''
+    full = compare_dlf_files(*dlf_pair, locate_rows=True)
+    chunked = compare_dlf_files(*dlf_pair, chunk_size=chunk_size, locate_rows=True)
+    assert len(full.not_similar) > 0
+    assert _messages(chunked) == _messages(full)
+    assert chunked.column_stats == full.column_stats
+
+@pytest.mark.parametrize('chunk_size', [None, 7, 1000])
+def test_reordered_columns(dlf_pair, chunk_size):
+    '''Columns with the same unit in another order are an error, not differences in values'''
+    ref, new = dlf_pair
+    # In-Matrix and In-Biopores, which both have unit g/ha
+    _swap_columns(new, 4, 5)
+    result = compare_dlf_files(ref, new, chunk_size=chunk_size)
+    errors, not_similar, not_identical = result
+    assert list(errors) == ['Columns in different order. Column 4: In-Matrix != In-Biopores']
+    assert len(not_similar) == 0
+    assert len(not_identical) == 0
+
+@pytest.mark.parametrize('chunk_size', [None, 7])
+def test_no_columns_selected(dlf_pair, chunk_size):
+    '''A selection that matches no columns is an error, so a misspelled pattern does not pass'''
+    ref, new = dlf_pair
+    errors, _, _ = compare_dlf_files(ref, new, chunk_size=chunk_size, columns=['In-Matrx*'])
+    assert list(errors) == [f'No columns selected in {ref}']
+
+def _drop_rows(path, rows):
+    '''Remove rows of the body of a dlf file'''
+    with open(path, encoding='utf-8') as infile:
+        lines = infile.read().split('\n')
+    # The body starts after the separator and the lines with names and units
+    start = lines.index('--------------------') + 3
+    lines = [line for i, line in enumerate(lines) if i < start or i - start not in rows]
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write('\n'.join(lines))
+
+def test_aligned_missing_time_ranges(tmp_path):
+    '''Rows only in one file are reported as time ranges and the other rows are compared on time'''
+    ref = tmp_path / 'ref.dlf'
+    new = tmp_path / 'new.dlf'
+    write_dlf(ref, 110, columns=5, seed=0, change_every=0)
+    # Row 0 of new is not similar in In-Matrix
+    write_dlf(new, 110, columns=5, seed=1, change_every=50)
+    _drop_rows(ref, range(100, 110))
+    _drop_rows(new, range(10, 15))
+    errors, _, _ = compare_dlf_files(ref, new)
+    assert len(errors) == 1
+    result = compare_dlf_files(ref, new, align_time=True, locate_rows=True)
+    assert _messages(result) == [
+        [],
+        ['Only in first file: 2000-01-01T10 to 2000-01-01T14 (5 rows)',
+         'Only in second file: 2000-01-05T04 to 2000-01-05T13 (10 rows)',
+         '[In-Matrix]: 0.0 | 1000.0 | 1000.0 gram / hectare | 1.0 gram / hectare'],
+        [],
+    ]
+    (stats,) = result.column_stats
+    assert (stats.column, stats.row, stats.not_similar_rows) == ('In-Matrix', 0, 1)
+
+def test_aligned_verdict_only(tmp_path):
+    '''In verdict only mode the comparison stops at the missing time ranges'''
+    ref = tmp_path / 'ref.dlf'
+    new = tmp_path / 'new.dlf'
+    write_dlf(ref, 48, columns=5, seed=0, change_every=0)
+    write_dlf(new, 48, columns=5, seed=1, change_every=50)
+    _drop_rows(new, [47])
+    _, not_similar, _ = compare_dlf_files(ref, new, align_time=True, verdict_only=True)
+    assert list(not_similar) == ['Only in first file: 2000-01-02T23 to 2000-01-02T23 (1 row)']
+
+def test_time_keys():
+    '''Keys are ordered like the times, and invalid or unordered times are rejected'''
+    body = pd.DataFrame({'year' : [2000, 2000, 2001], 'month' : [1, 12, 1], 'mday' : [31, 1, 1]})
+    keys = _time_keys(body, ['year', 'month', 'mday'])
+    assert list(keys) == sorted(keys) and len(set(keys)) == 3
+    for invalid, message in [({'month' : [1, 13, 1]}, 'out of range'),
+                             ({'mday' : [1.5, 1, 1]}, 'must be integers'),
+                             ({'year' : [2000, 2000, 2000], 'month' : [1, 1, 1],
+                               'mday' : [1, 2, 2]}, 'not ordered')]:
+        with pytest.raises(ValueError, match=message):
+            _time_keys(body.assign(**invalid), ['year', 'month', 'mday'])
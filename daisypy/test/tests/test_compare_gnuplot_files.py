@@ -0,0 +1,31 @@
+'''Tests of daisypy.test.compare_gnuplot_files'''
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.compare_gnuplot_files import compare_gnuplot_files
+
+@pytest.mark.parametrize('text, terminator', [
+    ("plot '-' using 1:2\n1 2\n3 4\n", 'e'),
+    ('$d << EOD\n1 2\n3 4\n', 'EOD'),
+])
+def test_missing_terminator(tmp_path, text, terminator):
+    '''A data block that is not terminated is not similar to one that is'''
+    ref = tmp_path / 'ref.gnuplot'
+    new = tmp_path / 'new.gnuplot'
+    ref.write_text(f'{text}{terminator}\n', encoding='utf-8')
+    new.write_text(text, encoding='utf-8')
+    _, not_similar, _ = compare_gnuplot_files(ref, new)
+    assert f'terminator: {terminator} != None' in list(not_similar)[0]
+    _, not_similar, _ = compare_gnuplot_files(ref, ref)
+    assert len(not_similar) == 0
+
+def test_terminator_with_trailing_whitespace(tmp_path):
+    '''A terminator with trailing whitespace ends its block, also when an exact terminator
+    follows'''
+    text = '$a << EOD\n1 2\nEOD \n$b << EOD\n3 {}\nEOD\nplot $a, $b\n'
+    ref = tmp_path / 'ref.gnuplot'
+    new = tmp_path / 'new.gnuplot'
+    ref.write_text(text.format(4), encoding='utf-8')
+    new.write_text(text.format(5), encoding='utf-8')
+    _, not_similar, _ = compare_gnuplot_files(ref, new)
+    assert list(not_similar) == ['$b (line 5) column 2 row 0: 4.0 | 5.0 | 1.0 | 4.01e-06']
@@ -0,0 +1,55 @@
+'''Tests of daisypy.test.dlf_cache'''
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from daisypy.io.dlf import read_dlf
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench.synthetic import write_dlf
+from daisypy.test.dlf_cache import read_dlf_cached, set_dlf_cache_dir
+
+def _memory_mapped(array):
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+@pytest.fixture(name='cache_dir')
+def fixture_cache_dir(tmp_path):
+    '''Enable the cache in a temporary directory and disable it after the test'''
+    cache_dir = tmp_path / 'cache'
+    set_dlf_cache_dir(cache_dir)
+    yield cache_dir
+    set_dlf_cache_dir(None)
+
+def test_cached_equals_parsed(tmp_path, cache_dir):
+    '''The first read stores the file and later reads memory map the same body'''
+    path = tmp_path / 'ref.dlf'
+    write_dlf(path, 50, columns=6)
+    expected = read_dlf(path)
+    first = read_dlf_cached(path)
+    assert len(os.listdir(cache_dir)) == 2
+    second = read_dlf_cached(path)
+    assert _memory_mapped(second.body['In-Matrix'].to_numpy())
+    for dlf in (first, second):
+        assert dlf.header == expected.header and dlf.units == expected.units
+        pd.testing.assert_frame_equal(dlf.body, expected.body)
+    selected = read_dlf_cached(path, ['In-Matrix', 'year'])
+    assert list(selected.body.columns) == ['year', 'In-Matrix']
+
+def test_invalidated_when_source_changes(tmp_path, cache_dir):
+    '''A changed file is parsed again instead of read from the cache'''
+    # pylint: disable=unused-argument
+    path = tmp_path / 'ref.dlf'
+    write_dlf(path, 50, columns=6, seed=0)
+    before = read_dlf_cached(path)
+    stat = os.stat(path)
+    # The files may have the same size, so make sure the modification time differs
+    write_dlf(path, 50, columns=6, seed=2, change_every=10)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    after = read_dlf_cached(path)
+    pd.testing.assert_frame_equal(after.body, read_dlf(path).body)
+    assert not after.body.equals(before.body)
@@ -0,0 +1,57 @@
+'''Tests of daisypy.test.drift'''
+import io
+import os
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.drift import DriftStore, print_trends
+from daisypy.test.result import ColumnStats, ComparisonResult
+
+def _result(not_similar=(), column_stats=()):
+    result = ComparisonResult()
+    result.not_similar.extend(not_similar)
+    result.column_stats = list(column_stats)
+    return result
+
+def test_round_trip(tmp_path):
+    '''Column statistics of each run are returned as trends across the runs of a program'''
+    db = tmp_path / 'drift.db'
+    with DriftStore(db) as store:
+        first = store.add_run('test.dai', 'ref', [
+            ('a.dlf', _result(['x'], [ColumnStats('x', 2.0, 'g/ha', 2.0, '1 g/ha', 7),
+                                      ColumnStats('y', 0.5, 'mm', None, None, 3)])),
+            ('b.dlf', _result()),
+        ], label='7.0.1')
+    # Reopening appends to the same database
+    with DriftStore(db) as store:
+        second = store.add_run('test.dai', 'ref', [
+            ('a.dlf', _result([], [ColumnStats('x', 0.1, 'g/ha', 0.1, '1 g/ha', 1)])),
+        ])
+        store.add_run('other.dai', 'ref', [('c.dlf', _result())])
+        trends = list(store.trends(program='*test.dai'))
+    assert second > first
+    ((program, runs, columns),) = trends
+    assert program == os.path.abspath('test.dai')
+    assert [(run, label) for run, _, label in runs] == [(first, '7.0.1'), (second, None)]
+    assert columns == {
+        ('a.dlf', 'x [SML 1 g/ha]') : [2.0, 0.1],
+        ('a.dlf', 'y [mm]') : [0.5, 0],
+    }
+
+    out = io.StringIO()
+    print_trends(program, runs, columns, out)
+    assert '\tx [SML 1 g/ha]: 2 | 0.1\n' in out.getvalue()
+
+def test_trends_filters(tmp_path):
+    '''Trends can be limited to matching files and columns and the last runs, and files that were
+    not compared in a run have no value'''
+    with DriftStore(tmp_path / 'drift.db') as store:
+        for i in range(3):
+            results = [('a.dlf', _result([], [ColumnStats('x', float(i), 'mm', None, None, 0)]))]
+            if i != 1:
+                results.append(('b.dlf', _result([], [ColumnStats('z', 1.0, 'mm', None, None, 0)])))
+            store.add_run('test.dai', 'ref', results)
+        ((_, runs, columns),) = store.trends(max_runs=2)
+        assert len(runs) == 2
+        assert columns == {('a.dlf', 'x [mm]') : [1.0, 2.0], ('b.dlf', 'z [mm]') : [None, 1.0]}
+        ((_, _, columns),) = store.trends(file='b*', column='z')
+        assert list(columns) == [('b.dlf', 'z [mm]')]
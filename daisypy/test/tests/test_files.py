@@ -0,0 +1,41 @@
+'''Tests of daisypy.test.files'''
+import time
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.files import atomic_write, evict_least_recently_used
+
+def test_atomic_write_replaces(tmp_path):
+    '''The file is replaced when the block exits and no temporary files are left'''
+    path = tmp_path / 'out.json'
+    path.write_text('old', encoding='utf-8')
+    with atomic_write(path) as outfile:
+        outfile.write('new')
+        assert path.read_text(encoding='utf-8') == 'old'
+    assert path.read_text(encoding='utf-8') == 'new'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.json']
+
+def test_atomic_write_removes_on_error(tmp_path):
+    '''If writing fails the file is unchanged and the temporary file is deleted'''
+    path = tmp_path / 'out.npy'
+    path.write_bytes(b'old')
+    with pytest.raises(RuntimeError):
+        with atomic_write(path, 'wb', suffix='.npy') as outfile:
+            outfile.write(b'partial')
+            raise RuntimeError('dump failed')
+    assert path.read_bytes() == b'old'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.npy']
+
+def test_evict_least_recently_used():
+    '''The least recently used and too old entries are removed until below 90% of the limit'''
+    now = time.time()
+    entries = [('a', 40, now - 10), ('b', 40, now - 1), ('c', 40, now - 5), ('d', 1, now - 100)]
+    removed = []
+    size = evict_least_recently_used(entries, 100, removed.append)
+    # b and c fit in 90 bytes, a does not, and d is older than a
+    assert size == 80
+    assert sorted(removed) == ['a', 'd']
+    removed = []
+    assert evict_least_recently_used(entries, 1000, removed.append, max_age_s=50) == 120
+    assert removed == ['d']
@@ -0,0 +1,47 @@
+'''Tests of daisypy.test.result'''
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ComparisonResult, MessageList
+
+def test_message_list_keeps_first():
+    '''Without priorities the first messages are kept and the rest are counted'''
+    messages = MessageList(3)
+    messages.extend(f'm{i}' for i in range(10))
+    assert list(messages) == ['m0', 'm1', 'm2']
+    assert len(messages) == 10
+    assert messages.dropped == 7
+
+def test_message_list_keeps_largest():
+    '''The messages with the highest priority are kept, in the order they were appended'''
+    messages = MessageList(2)
+    for name, priority in [('a', 1.0), ('b', 5.0), ('c', 2.0), ('d', 7.0), ('e', 5.0)]:
+        messages.append(name, priority)
+    assert list(messages) == ['b', 'd']
+    assert messages.dropped == 3
+    assert not messages.accepts(5.0)
+    assert messages.accepts(6.0)
+
+def test_message_list_zero_and_unbounded():
+    '''A list with max_messages 0 keeps nothing and None keeps everything'''
+    empty = MessageList(0)
+    unbounded = MessageList()
+    for i in range(5):
+        empty.append(i, float(i))
+        unbounded.append(i, float(i))
+    empty.drop()
+    assert not empty.accepts(100.0)
+    assert not list(empty) and len(empty) == 6 and empty.dropped == 6
+    assert list(unbounded) == [0, 1, 2, 3, 4] and unbounded.dropped == 0
+
+def test_message_list_from_messages():
+    '''A list restored from kept messages and a count reports the same dropped count'''
+    messages = MessageList.from_messages(['a', 'b'], count=5)
+    assert list(messages) == ['a', 'b']
+    assert messages.dropped == 3
+
+def test_comparison_result_unpacks():
+    '''A result unpacks to (errors, not_similar, not_identical) sharing max_messages'''
+    result = ComparisonResult(1)
+    result.not_similar.extend(['x', 'y'])
+    errors, not_similar, not_identical = result
+    assert len(errors) == 0 and len(not_identical) == 0
+    assert list(not_similar) == ['x'] and not_similar.dropped == 1
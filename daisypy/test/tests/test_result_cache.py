@@ -0,0 +1,65 @@
+'''Tests of daisypy.test.result_cache'''
+import os
+import time
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.result import ColumnStats, MessageList
+from daisypy.test.result_cache import ResultCache
+
+def _files(tmp_path, text1, text2):
+    path1, path2 = tmp_path / 'ref.txt', tmp_path / 'new.txt'
+    path1.write_text(text1, encoding='utf-8')
+    path2.write_text(text2, encoding='utf-8')
+    return path1, path2
+
+def test_hit_and_miss(tmp_path):
+    '''A stored result is found again, and changing a file or an option gives another key'''
+    cache = ResultCache(tmp_path / 'cache', 2**20)
+    path1, path2 = _files(tmp_path, 'a\n', 'b\n')
+    key = cache.key(path1, path2, 'compare', {'precision' : 1e-8}, '')
+    assert cache.get(key) is None
+    not_similar = MessageList(1)
+    not_similar.extend(['a != b', 'dropped'])
+    stats = [ColumnStats('x', 1.0, 'kg/ha', 1.0, '1 kg/ha', 0)]
+    cache.put(key, [], not_similar, [], stats)
+
+    cached = cache.get(key)
+    assert cached is not None
+    assert list(cached.not_similar) == ['a != b'] and len(cached.not_similar) == 2
+    assert len(cached.errors) == 0 and len(cached.not_identical) == 0
+    assert cached.column_stats == stats
+
+    assert cache.key(path1, path2, 'compare', {'precision' : 1e-8}, '') == key
+    assert cache.key(path1, path2, 'compare', {'precision' : 1e-6}, '') != key
+    assert cache.key(path1, path2, 'compare', {'precision' : 1e-8}, 'sml-2') != key
+    path2.write_text('c\n', encoding='utf-8')
+    assert cache.key(path1, path2, 'compare', {'precision' : 1e-8}, '') != key
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    '''A result that cannot be read is treated as not cached'''
+    cache = ResultCache(tmp_path / 'cache', 2**20)
+    key = cache.key(*_files(tmp_path, 'a\n', 'b\n'), 'compare', {}, '')
+    cache.put(key, [], ['a != b'], [])
+    # pylint: disable=protected-access
+    with open(cache._path(key), 'w', encoding='utf-8') as outfile:
+        outfile.write('{"errors"')
+    assert cache.get(key) is None
+
+def test_eviction(tmp_path):
+    '''When the cache grows beyond its limit the least recently used results are evicted'''
+    # pylint: disable=protected-access
+    cache = ResultCache(tmp_path / 'cache', 2000)
+    path1, path2 = _files(tmp_path, 'a\n', 'b\n')
+    keys = [cache.key(path1, path2, 'compare', {'run' : i}, '') for i in range(10)]
+    # Results are marked as used at increasing times in the past, with the first result always
+    # the most recently used
+    start = time.time() - 1000
+    for i, key in enumerate(keys):
+        cache.put(key, [], ['x' * 300], [])
+        os.utime(cache._path(key), (start + 2 * i, start + 2 * i))
+        if i > 0:
+            os.utime(cache._path(keys[0]), (start + 2 * i + 1, start + 2 * i + 1))
+    kept = [key for key in keys if os.path.exists(cache._path(key))]
+    assert kept == [keys[0]] + keys[-len(kept) + 1:]
+    assert 1 < len(kept) < len(keys)
+    assert sum(os.path.getsize(cache._path(key)) for key in kept) <= 2000
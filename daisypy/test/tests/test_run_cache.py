@@ -0,0 +1,68 @@
+'''Tests of daisypy.test.run_cache'''
+import os
+import time
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.run_cache import RunCache, program_inputs
+
+@pytest.fixture(name='program')
+def fixture_program(tmp_path, monkeypatch):
+    '''A daisy program that includes a file from the daisy path, which reads a weather file'''
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'lib').mkdir()
+    (tmp_path / 'daisy').write_bytes(b'binary')
+    (tmp_path / 'test.dai').write_text('(input file "common.dai")\n(run "not a file")\n',
+                                       encoding='utf-8')
+    (tmp_path / 'lib' / 'common.dai').write_text('(weather default "weather.dwf")\n',
+                                                 encoding='utf-8')
+    (tmp_path / 'weather.dwf').write_text('1 2 3\n', encoding='utf-8')
+    return 'test.dai'
+
+def _output(tmp_path, name, size):
+    output_dir = tmp_path / name
+    output_dir.mkdir()
+    (output_dir / 'daisy.log').write_bytes(b'x' * size)
+    return output_dir
+
+def test_program_inputs(program):
+    '''Included files are found in the daisy path and searched for more files'''
+    assert program_inputs(program, 'lib') == [os.path.join('lib', 'common.dai'), 'test.dai',
+                                              'weather.dwf']
+
+def test_hit_and_miss(tmp_path, program):
+    '''Output is reused until the binary, the program or an input changes'''
+    cache = RunCache(tmp_path / 'cache', 2**20)
+    args = ['./daisy', '-q', '-D', 'lib', program]
+    key = cache.key(args, program, 'lib')
+    assert cache.get(key) is None
+    cache.put(key, _output(tmp_path, 'out', 10), 'stdout', 'stderr')
+    output_dir, stdout, stderr = cache.get(key)
+    assert os.listdir(output_dir) == ['daisy.log']
+    assert (stdout, stderr) == ('stdout', 'stderr')
+    assert cache.key(args, program, 'lib') == key
+
+    (tmp_path / 'weather.dwf').write_text('1 2 4\n', encoding='utf-8')
+    assert cache.key(args, program, 'lib') != key
+    (tmp_path / 'weather.dwf').write_text('1 2 3\n', encoding='utf-8')
+    (tmp_path / 'daisy').write_bytes(b'new binary')
+    assert cache.key(args, program, 'lib') != key
+
+def test_eviction(tmp_path, program):
+    '''Outputs beyond the size limit or older than the age limit are evicted'''
+    # pylint: disable=protected-access
+    cache = RunCache(tmp_path / 'cache', 2500, max_age_s=3600)
+    args = ['./daisy', '-q', '-D', 'lib', program]
+    keys = [cache.key(args + [str(i)], program, 'lib') for i in range(4)]
+    start = time.time() - 1000
+    for i, key in enumerate(keys):
+        cache.put(key, _output(tmp_path, f'out{i}', 1000))
+        os.utime(cache._path(key), (start + i, start + i))
+    # Two outputs fit below 90% of the limit
+    assert [cache.get(key) is not None for key in keys] == [False, False, True, True]
+
+    # get marked keys[2] and keys[3] as used now. Make keys[3] older than the age limit
+    os.utime(cache._path(keys[3]), (start - 7200, start - 7200))
+    cache.put(keys[0], _output(tmp_path, 'out', 1000))
+    assert [os.path.exists(cache._path(key)) for key in keys] == [True, False, True, False]
@@ -0,0 +1,75 @@
+'''Tests of daisypy.test.scheduler'''
+import json
+import resource
+import signal
+import sys
+import time
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.scheduler import DurationHistory, run_programs
+
+def _fake_daisy(tmp_path, body):
+    '''Write an executable that is run like daisy, i.e. with the program as the last argument'''
+    path = tmp_path / 'daisy'
+    path.write_text(f'#!{sys.executable}\nimport sys, time\nprogram = sys.argv[-1]\n' + body,
+                    encoding='utf-8')
+    path.chmod(0o755)
+    return str(path)
+
+def test_duration_history(tmp_path):
+    '''Programs without a duration come first, then the longest, and saving keeps durations
+    recorded by others'''
+    path = tmp_path / 'durations.json'
+    path.write_text(json.dumps({'/a.dai' : 1.0, '/b.dai' : 5.0}), encoding='utf-8')
+    history = DurationHistory(path)
+    assert history.order(['/a.dai', '/b.dai', '/c.dai', '/d.dai']) == \
+        ['/c.dai', '/d.dai', '/b.dai', '/a.dai']
+    history.record('/c.dai', 2.0)
+    path.write_text(json.dumps({'/a.dai' : 1.0, '/b.dai' : 5.0, '/d.dai' : 3.0}),
+                    encoding='utf-8')
+    history.save()
+    assert json.loads(path.read_text(encoding='utf-8')) == \
+        {'/a.dai' : 1.0, '/b.dai' : 5.0, '/c.dai' : 2.0, '/d.dai' : 3.0}
+
+def test_run_programs(tmp_path):
+    '''Results are in the order of the programs, with the memory limit applied to each run'''
+    daisy = _fake_daisy(tmp_path, '''import resource
+print(program, resource.getrlimit(resource.RLIMIT_AS)[0])
+sys.exit(program == 'b.dai')
+''')
+    done = []
+    runs = run_programs(daisy, ['a.dai', 'b.dai'], jobs=2, memory_limit=2**32,
+                        on_done=lambda run: done.append(run.program))
+    assert sorted(done) == ['a.dai', 'b.dai']
+    assert [(run.program, run.returncode, run.stdout, run.timed_out) for run in runs] == [
+        ('a.dai', 0, f'a.dai {2**32}\n', False),
+        ('b.dai', 1, f'b.dai {2**32}\n', False),
+    ]
+    # The limit is not set on the process running the tests
+    assert resource.getrlimit(resource.RLIMIT_AS)[0] != 2**32
+
+def test_run_programs_timeout(tmp_path):
+    '''On timeout daisy and the processes it started are killed'''
+    pid_file = tmp_path / 'child.pid'
+    daisy = _fake_daisy(tmp_path, f'''import subprocess
+child = subprocess.Popen(['sleep', '60'])
+with open({str(pid_file)!r}, 'w') as outfile:
+    outfile.write(str(child.pid))
+child.wait()
+''')
+    (run,) = run_programs(daisy, ['a.dai'], timeout=1)
+    assert run.timed_out and run.returncode == -signal.SIGKILL
+    child = int(pid_file.read_text(encoding='utf-8'))
+    # The killed child is not waited for by its killed parent, so it can be left as a zombie
+    for _ in range(100):
+        try:
+            with open(f'/proc/{child}/stat', encoding='utf-8') as infile:
+                if infile.read().split()[2] == 'Z':
+                    break
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('The child of daisy was not killed')
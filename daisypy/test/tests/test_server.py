@@ -0,0 +1,56 @@
+'''Tests of daisypy.test.server and daisypy.test.client'''
+import os
+import subprocess
+import sys
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench.synthetic import write_dlf
+from daisypy.test.client import compare_remote, request
+from daisypy.test.compare_dlf_files import compare_dlf_files
+
+@pytest.fixture(name='server')
+def fixture_server(tmp_path):
+    '''A server process listening on a socket in a temporary directory'''
+    socket_path = str(tmp_path / 'compare.sock')
+    with subprocess.Popen([sys.executable, '-m', 'daisypy.test.server', socket_path],
+                          stdout=subprocess.PIPE, text=True) as proc:
+        try:
+            # Printed when the server is warm and listening
+            assert proc.stdout.readline() == f'Listening on {socket_path}\n'
+            yield socket_path, proc
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+def test_round_trip(tmp_path, server):
+    '''Results from the server are the same as from comparing in the calling process'''
+    socket_path, _ = server
+    ref, new = tmp_path / 'ref.dlf', tmp_path / 'new.dlf'
+    write_dlf(ref, 100, columns=6, seed=0, change_every=10)
+    write_dlf(new, 100, columns=6, seed=1, change_every=10)
+    options = {'max_messages' : 2, 'locate_rows' : True}
+    remote = compare_remote(socket_path, '.dlf', ref, new, **options)
+    local = compare_dlf_files(ref, new, **options)
+    assert [(list(r), len(r)) for r in remote] == [(list(l), len(l)) for l in local]
+    assert len(local.not_similar) > 0
+    assert remote.column_stats == local.column_stats
+
+    txt1, txt2 = tmp_path / 'a.txt', tmp_path / 'b.txt'
+    txt1.write_text('a\n', encoding='utf-8')
+    txt2.write_text('b\n', encoding='utf-8')
+    assert list(compare_remote(socket_path, '.txt', txt1, txt2).not_similar) == ['a\n != b\n']
+
+def test_errors_and_shutdown(server):
+    '''Bad requests are reported to the client, and a shutdown request stops the server'''
+    socket_path, proc = server
+    assert request(socket_path, {'op' : 'ping'}) == {'ok' : True}
+    with pytest.raises(RuntimeError, match='Unknown op'):
+        request(socket_path, {'op' : 'unknown'})
+    with pytest.raises(RuntimeError, match='KeyError'):
+        request(socket_path, {'op' : 'compare', 'file_type' : '.xyz', 'path1' : '/a',
+                              'path2' : '/b', 'options' : {}})
+    request(socket_path, {'op' : 'shutdown'})
+    assert proc.wait(timeout=60) == 0
+    assert not os.path.exists(socket_path)
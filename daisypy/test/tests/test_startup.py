@@ -0,0 +1,17 @@
+'''Tests that the test programs start without importing heavy modules'''
+import subprocess
+import sys
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench.startup import import_budgets
+
+@pytest.mark.parametrize('module', sorted(import_budgets))
+def test_no_heavy_imports(module):
+    '''pandas and pint are only imported when a file is compared, see bench_daisy startup'''
+    # A fresh interpreter, since the test process may already have imported them
+    code = f'import sys, {module}; print(*sorted(set(sys.modules) & {{"pandas", "pint"}}))'
+    imported = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                              check=True).stdout.split()
+    assert not imported
@@ -0,0 +1,85 @@
+'''Tests of daisypy.test.test_daisy without running daisy'''
+import argparse
+import io
+import json
+import sys
+import time
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.test_daisy import add_comparison_arguments, check_dir, run_test
+from daisypy.test.timing import timings
+
+def _parse_args(*argv):
+    parser = argparse.ArgumentParser()
+    add_comparison_arguments(parser)
+    return parser.parse_args(argv)
+
+@pytest.fixture(name='dirs')
+def fixture_dirs(tmp_path):
+    '''Reference and generated directories with three txt files, one of which differs'''
+    ref, new = tmp_path / 'ref', tmp_path / 'new'
+    for name, ref_text, new_text in [('a.txt', 'a\n', 'a\n'),
+                                     ('b.txt', 'b\n', 'B\n'),
+                                     ('sub/c.txt', 'c\n', 'c\n')]:
+        for directory, text in [(ref, ref_text), (new, new_text)]:
+            (directory / name).parent.mkdir(parents=True, exist_ok=True)
+            (directory / name).write_text(text, encoding='utf-8')
+    return ref, new, tmp_path / 'out'
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_check_dir_timings(dirs, executor):
+    '''Phases recorded by the workers are in the timings, also when files are compared in
+    processes'''
+    ref, new, out = dirs
+    args = _parse_args('--compare-jobs', '3', '--compare-executor', executor)
+    args.out_dir = str(out)
+    timings.enable()
+    try:
+        errors, not_similar, not_identical = check_dir(str(ref), str(new), args)
+        timings.write_json(out / 'timings.json')
+    finally:
+        timings.disable()
+    assert errors == [] and not_identical == []
+    assert [(rel_path, list(messages)) for rel_path, messages in not_similar] == \
+        [('b.txt', ['b\n != B\n'])]
+    with open(out / 'timings.json', encoding='utf-8') as infile:
+        phases = {(record['phase'], record['file']) for record in json.load(infile)['phases']}
+    assert {('identity', 'a.txt'), ('identity', 'b.txt'), ('identity', 'sub/c.txt'),
+            ('compare', 'b.txt'), ('copy', 'b.txt')} <= phases
+
+def test_timeout_kills_group(tmp_path):
+    '''On timeout daisy and the processes it started are stopped and the error goes to err'''
+    pid_file = tmp_path / 'child.pid'
+    daisy = tmp_path / 'daisy'
+    daisy.write_text(f'''#!{sys.executable}
+import subprocess
+child = subprocess.Popen(['sleep', '60'])
+with open({str(pid_file)!r}, 'w') as outfile:
+    outfile.write(str(child.pid))
+child.wait()
+''', encoding='utf-8')
+    daisy.chmod(0o755)
+    (tmp_path / 'ref').mkdir()
+    args = _parse_args('--timeout', '1')
+    args.daisy_binary, args.program = str(daisy), 'test.dai'
+    args.reference_dir, args.out_dir = str(tmp_path / 'ref'), str(tmp_path / 'out')
+    out, err = io.StringIO(), io.StringIO()
+    start = time.monotonic()
+    assert run_test(args, out, err, capture_output=True) == 1
+    assert time.monotonic() - start < 30
+    assert err.getvalue() == ('ERROR: Daisy was stopped after 1.0 s\n'
+                              'ERROR: Daisy execution failed\n')
+    child = int(pid_file.read_text(encoding='utf-8'))
+    # The killed child is not waited for by its killed parent, so it can be left as a zombie
+    for _ in range(100):
+        try:
+            with open(f'/proc/{child}/stat', encoding='utf-8') as infile:
+                if infile.read().split()[2] == 'Z':
+                    break
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('The child of daisy was not stopped')
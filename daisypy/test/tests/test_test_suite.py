@@ -0,0 +1,42 @@
+'''Tests of daisypy.test.test_suite without running daisy'''
+import argparse
+import os
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.test_daisy import add_comparison_arguments
+from daisypy.test.test_suite import load_suite
+
+def test_same_program_stem(tmp_path):
+    '''Scenarios with programs of the same name in different directories get their own output
+    paths'''
+    manifest = tmp_path / 'suite.toml'
+    manifest.write_text('''
+[[scenario]]
+program = "a/test.dai"
+reference_dir = "a/test"
+
+[[scenario]]
+program = "b/test.dai"
+reference_dir = "b/test"
+
+[[scenario]]
+program = "c.dai"
+reference_dir = "c"
+name = "test"
+''', encoding='utf-8')
+    parser = argparse.ArgumentParser()
+    add_comparison_arguments(parser)
+    args = parser.parse_args(['--timings-json', 'timings.json', '--profile', 'prof'])
+    args.out_dir = 'out'
+    scenarios = load_suite(str(manifest), args)
+    assert [scenario.program for scenario in scenarios] == \
+        [os.path.join(tmp_path, 'a/test.dai'), os.path.join(tmp_path, 'b/test.dai'),
+         os.path.join(tmp_path, 'c.dai')]
+    assert [(scenario.name, scenario.out_dir, scenario.timings_json, scenario.profile)
+            for scenario in scenarios] == [
+        ('test', os.path.join('out', 'test'), 'timings-test.json', os.path.join('prof', 'test')),
+        ('test-2', os.path.join('out', 'test-2'), 'timings-test-2.json',
+         os.path.join('prof', 'test-2')),
+        ('test-3', os.path.join('out', 'test-3'), 'timings-test-3.json',
+         os.path.join('prof', 'test-3')),
+    ]
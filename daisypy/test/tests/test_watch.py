@@ -0,0 +1,121 @@
+'''Tests of daisypy.test.watch and incremental dlf comparison'''
+import argparse
+import io
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.bench.synthetic import write_dlf
+from daisypy.test.compare_dlf_files import IncrementalDlfComparison, compare_dlf_files
+from daisypy.test.test_daisy import add_comparison_arguments
+from daisypy.test.watch import DlfTail, run_watched
+
+def test_dlf_tail(tmp_path):
+    '''Rows are returned once their line is complete, and nothing before the header is complete'''
+    path = tmp_path / 'new.dlf'
+    tail = DlfTail(path)
+    assert tail.read() is None
+    header = 'dlf-0.0 -- test\n\n--------------------\nyear\tx\n\tkg/ha\n'
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write(header[:-4])
+        outfile.flush()
+        assert tail.read() is None
+        outfile.write(header[-4:] + '2000\t1.')
+        outfile.flush()
+        assert len(tail.read()) == 0
+        assert (tail.columns, tail.units) == (['year', 'x'], {'year' : '', 'x' : 'kg/ha'})
+        outfile.write('5\n2001\t2.5\n2002')
+        outfile.flush()
+        rows = tail.read()
+        assert rows.to_dict('list') == {'year' : [2000, 2001], 'x' : [1.5, 2.5]}
+        outfile.write('\t3.5\n')
+        outfile.flush()
+        assert tail.read().to_dict('list') == {'year' : [2002], 'x' : [3.5]}
+
+def test_incremental_equals_full(tmp_path):
+    '''Comparing rows as they are written gives the same messages as comparing the full files'''
+    ref, new = tmp_path / 'ref.dlf', tmp_path / 'new.dlf'
+    write_dlf(ref, 200, columns=8, seed=0, change_every=10)
+    write_dlf(new, 200, columns=8, seed=1, change_every=10)
+    comparison = IncrementalDlfComparison(ref)
+    tail = DlfTail(new)
+    rows = tail.read()
+    comparison.set_header(tail.header, tail.units)
+    # Row 0 is not similar
+    comparison.add_rows(rows.iloc[:1])
+    assert comparison.failing()
+    for start in range(1, len(rows), 37):
+        comparison.add_rows(rows.iloc[start:start + 37])
+    full = compare_dlf_files(ref, new)
+    incremental = comparison.comparison_result()
+    assert [list(messages) for messages in incremental] == [list(messages) for messages in full]
+
+def _fake_daisy(tmp_path, body):
+    '''Write an executable that is run like daisy, i.e. with the output directory after -d'''
+    path = tmp_path / 'daisy'
+    path.write_text(f'#!{sys.executable}\nimport os, sys, time\n'
+                    "out_dir = sys.argv[sys.argv.index('-d') + 1]\n" + body, encoding='utf-8')
+    path.chmod(0o755)
+    return str(path)
+
+def _args(*argv):
+    parser = argparse.ArgumentParser()
+    add_comparison_arguments(parser)
+    return parser.parse_args(['--watch-interval', '0.05', *argv])
+
+def test_run_watched_fail_fast(tmp_path):
+    '''Daisy is stopped soon after a watched file is not similar'''
+    (tmp_path / 'ref').mkdir()
+    (tmp_path / 'out').mkdir()
+    write_dlf(tmp_path / 'ref' / 'a.dlf', 200, columns=4, seed=0, change_every=10)
+    write_dlf(tmp_path / 'new.dlf', 200, columns=4, seed=1, change_every=10)
+    # Writes a row every 50 ms, so writing all rows takes 10 s
+    daisy = _fake_daisy(tmp_path, f'''
+outfile = open(os.path.join(out_dir, 'a.dlf'), 'w')
+with open({str(tmp_path / 'new.dlf')!r}) as infile:
+    for line in infile:
+        outfile.write(line)
+        outfile.flush()
+        if line[0].isdigit():
+            time.sleep(0.05)
+''')
+    out = io.StringIO()
+    start = time.monotonic()
+    returncode, _, _, stopped = run_watched([daisy, '-d', str(tmp_path / 'out')],
+                                            tmp_path / 'ref', tmp_path / 'out', ['a.dlf'],
+                                            _args('--fail-fast'), out, capture_output=True)
+    assert time.monotonic() - start < 5
+    assert returncode == -signal.SIGTERM
+    ((rel_path, result),) = stopped
+    assert rel_path == 'a.dlf' and len(result.not_similar) > 0
+    assert out.getvalue().startswith('a.dlf: not similar after ')
+
+def test_run_watched_timeout_kills_group(tmp_path):
+    '''On timeout daisy and the processes it started are killed'''
+    pid_file = tmp_path / 'child.pid'
+    daisy = _fake_daisy(tmp_path, f'''
+import subprocess
+child = subprocess.Popen(['sleep', '60'])
+with open({str(pid_file)!r}, 'w') as outfile:
+    outfile.write(str(child.pid))
+child.wait()
+''')
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_watched([daisy, '-d', str(tmp_path)], tmp_path, tmp_path, [], _args('--timeout', '1'),
+                    io.StringIO(), capture_output=True)
+    child = int(pid_file.read_text(encoding='utf-8'))
+    # The child is killed, but not waited for by its killed parent, so it can be a zombie
+    for _ in range(100):
+        try:
+            with open(f'/proc/{child}/stat', encoding='utf-8') as infile:
+                if infile.read().split()[2] == 'Z':
+                    break
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('The child of daisy was not killed')
@@ -0,0 +1,102 @@
+'''Timing of the phases of a test run
+
+The module level recorder `timings` is disabled by default, in which case recording a phase costs a
+function call. When enabled it records the wall time and CPU time of each phase, e.g. running daisy,
+comparing a file or loading SML definitions, and the peak resident set size (RSS) of the process at
+the end of the phase. The peak RSS is the largest RSS the process has had so far, so a phase after a
+memory heavy phase shows the peak of that phase. It only shows the use of a phase when it grows.
+'''
+import contextlib
+import json
+import resource
+import threading
+import time
+
+__all__ = [
+    'Timings',
+    'timings',
+]
+
+class Timings:
+    '''Recorder of phase timings'''
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self, start=None):
+        '''Start recording phases. Previous records are discarded.
+
+        Parameters
+        ----------
+        start: float
+          time.perf_counter() that start_s of the records is relative to. Default is now. Worker
+          processes pass the start of the parent, so their records can be merged with its records.
+        '''
+        with self._lock:
+            self.enabled = True
+            self.records = []
+            self.start = time.perf_counter() if start is None else start
+
+    def disable(self):
+        '''Stop recording phases'''
+        self.enabled = False
+
+    @contextlib.contextmanager
+    def phase(self, name, file=None):
+        '''Record a phase.
+
+        Parameters
+        ----------
+        name: str
+          Name of phase, e.g. 'compare'
+
+        file: str
+          File the phase is working on, if any
+
+        Yields
+        ------
+        dict that is stored as the record of the phase. Callers can add extra information to it.
+        The record is None if timings are disabled.
+        '''
+        if not self.enabled:
+            yield None
+            return
+        record = {'phase' : name, 'file' : file}
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['start_s'] = wall - self.start
+            record['wall_s'] = time.perf_counter() - wall
+            # CPU time of the current thread, so concurrent phases do not count each other
+            record['cpu_s'] = time.thread_time() - cpu
+            # Peak RSS of the process so far, not of the phase. On Linux ru_maxrss is in KiB
+            record['process_peak_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            with self._lock:
+                self.records.append(record)
+
+    def extend(self, records):
+        '''Add records from another recorder, e.g. one in a worker process'''
+        with self._lock:
+            self.records += records
+
+    def write_json(self, path, **info):
+        '''Write records to a json file
+
+        Parameters
+        ----------
+        path: str
+          Path to write to
+
+        info: dict
+          Extra information to store with the records, e.g. the program that was run
+        '''
+        with self._lock:
+            report = dict(info, phases=list(self.records))
+        with open(path, 'w', encoding='utf-8') as outfile:
+            json.dump(report, outfile, indent=2)
+
+timings = Timings()
@@ -2,13 +2,16 @@
 
  The default registry is quite large and takes around 0.5s to load. We only need a small part of
  those units, so we just copy the relevant parts from pint/default_en.txt
+ Even the minimal registry takes a noticeable time to build, so it is constructed on first use.
 '''
-from functools import reduce
+from functools import lru_cache, reduce
 import pint
 
 __all__ = [
-    'daisy_ureg',
-    'dlf_unit_to_pint_unit'
+    'daisy_ureg', # pylint: disable=undefined-all-variable # Provided by __getattr__
+    'get_daisy_ureg',
+    'dlf_unit_to_pint_unit',
+    'conversion_factor',
 ]
 
 unit_registry = [
@@ -42,13 +45,37 @@ unit_registry = [
     'joule = newton * meter = J',
 ]
 
-daisy_ureg = pint.UnitRegistry(unit_registry)
+@lru_cache(maxsize=None)
+def get_daisy_ureg():
+    '''Get the unit registry defined by unit_registry. The registry is constructed on first call.
 
+    Returns
+    -------
+    pint.UnitRegistry
+    '''
+    return pint.UnitRegistry(unit_registry)
+
+def __getattr__(name):
+    if name == 'daisy_ureg':
+        return get_daisy_ureg()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+# Parts of dlf units that pint does not understand
+dlf_unit_redefinitions = {
+    ' DM/ha' : '/ha',
+    ' N/ha' : '/ha',
+    ' C/ha' : '/ha',
+    'ppm dry soil' : 'ppm',
+}
+
+@lru_cache(maxsize=None)
 def dlf_unit_to_pint_unit(unit, ureg):
     '''Convert a unit from a dlf file to a pint unit. Units in dlf files can for example be given as
       kg N/ha = kg nitrogen per hectare
     pint does not understand the nitrogen part, so we need to strip it
 
+    Results are cached, so the returned quantity must not be modified in place.
+
     Parameters
     ----------
     unit: str
@@ -61,14 +88,28 @@ def dlf_unit_to_pint_unit(unit, ureg):
     '''
     if unit in {'', 'DS'}:
         return ureg('dimensionless')
-    redefine = {
-        ' DM/ha' : '/ha',
-        ' N/ha' : '/ha',
-        ' C/ha' : '/ha',
-        'ppm dry soil' : 'ppm',
-    }
     # Apply all redefinitions to the unit
-    redefined_unit = reduce(lambda s, kv: s.replace(kv[0], kv[1]), redefine.items(), unit)
+    redefined_unit = reduce(lambda s, kv: s.replace(kv[0], kv[1]),
+                            dlf_unit_redefinitions.items(),
+                            unit)
 
     # Convert to pint unit
     return ureg(redefined_unit)
+
+@lru_cache(maxsize=None)
+def conversion_factor(unit, to_unit, ureg):
+    '''Find the factor that converts values in a dlf unit to another unit
+
+    Parameters
+    ----------
+    unit: str
+      dlf unit specification
+
+    to_unit: str
+      pint unit specification
+
+    Returns
+    -------
+    float
+    '''
+    return dlf_unit_to_pint_unit(unit, ureg).to(to_unit).magnitude
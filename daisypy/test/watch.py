@@ -0,0 +1,180 @@
+'''Compare dlf files while daisy is writing them
+
+Daisy writes rows to dlf files during the simulation. In watch mode the output directory is polled
+while daisy runs, new rows are compared against the reference with the usual SML rules, and daisy
+can be stopped at the first difference that is not similar. The files are compared in full when
+daisy finishes, so watching only makes failures known earlier.
+'''
+import io
+import locale
+import os
+import signal
+import subprocess
+import time
+
+import pandas as pd
+
+#pylint: disable=import-error, no-name-in-module
+from daisypy.test.dlf_reader import HEADER_BODY_SEP, read_dlf_header
+from daisypy.test.compare_dlf_files import IncrementalDlfComparison
+from daisypy.test.scheduler import kill_group, limit_memory
+
+__all__ = [
+    'DlfTail',
+    'run_watched',
+]
+
+class DlfTail:
+    '''Read the rows appended to a dlf file since the last read
+
+    Parameters
+    ----------
+    path: str
+      Path to a dlf file that is being written
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.header = None
+        self.columns = None
+        self.units = None
+        self._offset = 0
+        self._pending = b''
+
+    def read(self):
+        '''Read complete lines written since the last call
+
+        Returns
+        -------
+        pandas.DataFrame with the new rows, or None if the file or the end of its header has not
+        been written yet
+        '''
+        try:
+            with open(self.path, 'rb') as infile:
+                infile.seek(self._offset)
+                data = self._pending + infile.read()
+        except FileNotFoundError:
+            return None
+        self._offset += len(data) - len(self._pending)
+        if self.columns is None:
+            data = self._read_header(data)
+            if data is None:
+                return None
+        end = data.rfind(b'\n') + 1
+        self._pending = data[end:]
+        if end == 0:
+            return pd.DataFrame(columns=self.columns)
+        return pd.read_csv(io.BytesIO(data[:end]), sep='\t', names=self.columns,
+                           encoding=locale.getencoding())
+
+    def _read_header(self, data):
+        # Parse the header if it is complete, i.e. the separator and the lines with column names and
+        # units are written. Returns the data after the header or None
+        lines = data.split(b'\n')
+        sep = HEADER_BODY_SEP.encode()
+        # The last element is an incomplete line
+        for i, line in enumerate(lines[:-1]):
+            if line.startswith(sep):
+                if i + 2 >= len(lines) - 1:
+                    break
+                header_length = sum(len(row) + 1 for row in lines[:i + 3])
+                text = data[:header_length].decode(locale.getencoding())
+                self.header, self.columns, self.units = read_dlf_header(io.StringIO(text))
+                return data[header_length:]
+        self._pending = data
+        return None
+
+def run_watched(daisy_args, reference_dir, output_dir, rel_paths, args, out,
+                capture_output=False):
+    '''Run daisy and compare dlf files while they are written
+
+    Parameters
+    ----------
+    daisy_args: list of str
+      Command line to run
+
+    reference_dir: str
+      Directory with reference files
+
+    output_dir: str
+      Directory daisy writes output to
+
+    rel_paths: list of str
+      Paths of the dlf files to watch, relative to reference_dir and output_dir
+
+    args: argparse.Namespace
+      Parsed arguments as defined in daisypy.test.test_daisy.main. Uses watch_interval, fail_fast,
+      timeout, memory_limit, default_float_epsilon, sml_identity_threshold, columns, sml_only and
+      max_diffs_per_file.
+
+    out: file-like
+      Where to report files as they start failing
+
+    capture_output: bool
+      If True the output from daisy is captured instead of being inherited
+
+    Returns
+    -------
+    (returncode, stdout, stderr, stopped)
+      stopped is None if daisy ran to completion. If daisy was stopped because args.fail_fast is
+      set, it is a list of (relative path, daisypy.test.result.ComparisonResult) of the failing
+      files.
+
+    Raises
+    ------
+    subprocess.TimeoutExpired if daisy runs for more than args.timeout seconds. Daisy and the
+    processes it started are killed.
+    '''
+    # pylint: disable=too-many-arguments, too-many-locals
+    pipe = subprocess.PIPE if capture_output else None
+    watched = {rel_path : (DlfTail(os.path.join(output_dir, rel_path)), None)
+               for rel_path in rel_paths}
+    failing = []
+    deadline = None if args.timeout is None else time.monotonic() + args.timeout
+    # Comparisons may run in threads of this process, so daisy is not started with a preexec_fn.
+    # It runs in its own process group, so processes it spawns are stopped with it.
+    with subprocess.Popen(daisy_args, stdout=pipe, stderr=pipe, text=True,
+                          start_new_session=True) as proc:
+        limit_memory(proc.pid, args.memory_limit)
+        while True:
+            interval = args.watch_interval
+            if deadline is not None:
+                interval = max(0, min(interval, deadline - time.monotonic()))
+            try:
+                stdout, stderr = proc.communicate(timeout=interval)
+                return proc.returncode, stdout, stderr, None
+            except subprocess.TimeoutExpired:
+                pass
+            if deadline is not None and time.monotonic() >= deadline:
+                kill_group(proc)
+                stdout, stderr = proc.communicate()
+                raise subprocess.TimeoutExpired(daisy_args, args.timeout, stdout, stderr)
+            for rel_path, (tail, comparison) in watched.items():
+                if rel_path in failing:
+                    continue
+                rows = tail.read()
+                if rows is None:
+                    continue
+                if comparison is None:
+                    comparison = IncrementalDlfComparison(
+                        os.path.join(reference_dir, rel_path),
+                        precision=args.default_float_epsilon,
+                        sml_identity_threshold=args.sml_identity_threshold,
+                        columns=args.columns,
+                        sml_only=args.sml_only
+                    )
+                    comparison.set_header(tail.header, tail.units)
+                    watched[rel_path] = (tail, comparison)
+                comparison.add_rows(rows)
+                if comparison.failing():
+                    print(f'{rel_path}: not similar after {comparison.rows} rows', file=out,
+                          flush=True)
+                    failing.append(rel_path)
+            if args.fail_fast and len(failing) > 0:
+                kill_group(proc, signal.SIGTERM)
+                stdout, stderr = proc.communicate()
+                max_messages = None if args.max_diffs_per_file < 0 else args.max_diffs_per_file
+                stopped = [
+                    (rel_path, watched[rel_path][1].comparison_result(max_messages))
+                    for rel_path in sorted(failing)
+                ]
+                return proc.returncode, stdout, stderr, stopped